@@ -46,34 +46,59 @@ function updatePerfCard(baseId, stats) {
     }
 }
 
-function renderEquityChart(equityCurveAll) {
-    const container = document.getElementById("equity-chart-container");
-    const canvas = document.getElementById("equity-chart");
-    const noDataEl = document.getElementById("equity-no-data");
-
-    if (!container || !canvas) return;
-
-    if (!equityCurveAll || typeof equityCurveAll !== "object") {
-        container.classList.add("hidden");
-        if (noDataEl) noDataEl.classList.remove("hidden");
-        return;
+// Courbes d'equity -> { dates: axe commun, series: { courbe: [valeur ou null, ...] } }
+// - format "compact" : axe déjà commun, encodé en écarts de jours depuis `start`
+// - format complet   : une liste de dates par courbe, réalignées sur l'union des dates
+function decodeEquityCurves(equityCurveAll) {
+    if (!equityCurveAll || typeof equityCurveAll !== "object") return null;
+
+    if (equityCurveAll.format === "compact") {
+        const dates = [];
+        if (equityCurveAll.start && Array.isArray(equityCurveAll.days)) {
+            const day = new Date(equityCurveAll.start + "T00:00:00Z");
+            equityCurveAll.days.forEach((delta) => {
+                day.setUTCDate(day.getUTCDate() + delta);
+                dates.push(day.toISOString().slice(0, 10));
+            });
+        }
+        return { dates, series: equityCurveAll.equity_pct || {} };
     }
 
-    const curves = {
-        "sp500_phoenix": equityCurveAll.sp500_phoenix,
-        "sp500_pullback": equityCurveAll.sp500_pullback,
-        "crypto_phoenix": equityCurveAll.crypto_phoenix,
-        "crypto_pullback": equityCurveAll.crypto_pullback,
-    };
-
     const dateSet = new Set();
-    Object.values(curves).forEach((curve) => {
+    Object.values(equityCurveAll).forEach((curve) => {
         if (curve && Array.isArray(curve.dates)) {
             curve.dates.forEach((d) => dateSet.add(d));
         }
     });
+    const dates = Array.from(dateSet).sort();
+
+    const series = {};
+    Object.entries(equityCurveAll).forEach(([key, curve]) => {
+        if (!curve || !Array.isArray(curve.dates) || !Array.isArray(curve.equity_pct)) return;
+        const dateToValue = {};
+        curve.dates.forEach((d, idx) => {
+            dateToValue[d] = curve.equity_pct[idx];
+        });
+        series[key] = dates.map((d) =>
+            Object.prototype.hasOwnProperty.call(dateToValue, d) ? dateToValue[d] : null
+        );
+    });
+    return { dates, series };
+}
+
+function hasValues(serie) {
+    return Array.isArray(serie) && serie.some((v) => v !== null && v !== undefined);
+}
+
+function renderEquityChart(equityCurveAll) {
+    const container = document.getElementById("equity-chart-container");
+    const canvas = document.getElementById("equity-chart");
+    const noDataEl = document.getElementById("equity-no-data");
 
-    const allDates = Array.from(dateSet).sort();
+    if (!container || !canvas) return;
+
+    const decoded = decodeEquityCurves(equityCurveAll);
+    const allDates = decoded ? decoded.dates : [];
 
     if (allDates.length === 0) {
         container.classList.add("hidden");
@@ -111,20 +136,11 @@ function renderEquityChart(equityCurveAll) {
     const datasets = [];
 
     datasetsMeta.forEach((meta) => {
-        const curve = curves[meta.key];
-        if (!curve || !Array.isArray(curve.dates) || curve.dates.length === 0) {
+        const serie = decoded.series[meta.key];
+        if (!hasValues(serie)) {
             return;
         }
 
-        const dateToValue = {};
-        curve.dates.forEach((d, idx) => {
-            dateToValue[d] = curve.equity_pct[idx];
-        });
-
-        const serie = allDates.map((d) =>
-            Object.prototype.hasOwnProperty.call(dateToValue, d) ? dateToValue[d] : null
-        );
-
         datasets.push({
             label: meta.label,
             data: serie,
@@ -426,9 +442,10 @@ async function loadBacktestSummary() {
             setText("backtest-last-update", data.last_update);
         }
 
+        const decoded = decodeEquityCurves(data.equity_curve);
         const globalCurve =
-            data.equity_curve && typeof data.equity_curve === "object"
-                ? data.equity_curve.global
+            decoded && hasValues(decoded.series.global)
+                ? { dates: decoded.dates, equity_pct: decoded.series.global }
                 : null;
 
         renderBacktestEquityChart(globalCurve);
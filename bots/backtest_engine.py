@@ -0,0 +1,336 @@
+# bots/backtest_engine.py
+
+import os
+import sys
+import logging
+import argparse
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import market_data
+import bot_sp500_pro
+import bot_crypto_pro
+from panel import Panel, build_panel, patch_gapped
+from generate_backtest_signals_from_csv import iter_log_entries, write_json_stream
+
+# =========================
+# CONFIG
+# =========================
+
+# Log de signaux produit (même format que generate_backtest_signals_from_csv.py)
+OUT_PATH = "data/signals_log_backtest.json"
+
+# Fenêtre des signaux émis (None = tout l'historique disponible). Les indicateurs
+# sont calculés sur tout l'historique : les bougies avant START_DATE servent de warmup.
+START_DATE: Optional[str] = None
+END_DATE: Optional[str] = None
+
+UNIVERSES = ("sp500", "crypto")
+
+# Même taille d'univers crypto que le scanner
+CRYPTO_UNIVERSE_SIZE = 150
+
+# Nombre de pullbacks S&P 500 retenus par jour (comme le scanner)
+SP500_PULLBACK_TOP = 5
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("backtest_engine")
+
+# Le moteur rejoue, pour chaque date, exactement les règles du scanner du jour :
+# indicateurs (compute_indicators_panel), filtres stricts, fallback et scores (score_universe)
+# des bots. Tout l'historique est traité en une passe sur le panel dates × tickers.
+#
+# Limites connues (différences avec un run live) :
+# - l'univers est celui d'aujourd'hui (biais de survivant) ;
+# - côté crypto, le scanner calcule EMA et RSI (lissage exponentiel) sur ses 200 dernières
+#   bougies alors que le moteur les lisse sur tout l'historique : écarts négligeables
+#   une fois la mémoire de l'EMA dissipée ;
+# - le signal du jour D porte sur la bougie D clôturée ; l'entrée se fait à l'open suivant.
+
+
+# =========================
+# HISTORIQUE
+# =========================
+
+def load_frames(universe: str, tickers: List[str]) -> Dict[str, pd.DataFrame]:
+    """Tout l'historique disponible (store local + top-up) de chaque ticker."""
+    market_data.prefetch(universe, tickers)
+
+    frames: Dict[str, pd.DataFrame] = {}
+    for ticker in tickers:
+        df = market_data.get_history(universe, ticker)
+        if df is not None and not df.empty:
+            frames[ticker] = df
+
+    logger.info(f"{universe}: {len(frames)}/{len(tickers)} historiques chargés.")
+    return frames
+
+
+# =========================
+# PANEL -> TABLE (date, ticker)
+# =========================
+
+def previous_bars(panel: Panel) -> Panel:
+    """Valeurs de la bougie précédente de chaque ticker (équivalent de df.iloc[-2] au jour D)."""
+    return {name: frame.ffill().shift(1).where(frame.notna()) for name, frame in panel.items()}
+
+
+def stack(panel: Panel, present: pd.DataFrame) -> pd.DataFrame:
+    """Panel -> table longue indexée (date, ticker), limitée aux bougies existantes."""
+    mask = present.to_numpy()
+    rows, cols = np.nonzero(mask)
+    index = pd.MultiIndex.from_arrays(
+        [present.index[rows], present.columns[cols]], names=["date", "ticker"]
+    )
+    data = {name: frame.to_numpy()[rows, cols] for name, frame in panel.items()}
+    return pd.DataFrame(data, index=index)
+
+
+def scored_table(
+    frames: Dict[str, pd.DataFrame],
+    compute_panel,
+    score_universe,
+    min_candles: int,
+) -> pd.DataFrame:
+    """
+    Indicateurs + score_universe pour chaque (date, ticker) en une passe.
+    Une ligne n'existe que si le ticker cote ce jour-là avec au moins `min_candles` bougies.
+    Les tickers à historique troué sont calculés sur leurs propres bougies, comme le scanner.
+    """
+    pn = build_panel(frames)
+    ind = patch_gapped(compute_panel(pn), pn, frames, compute_panel)
+
+    present = pn["Close"].notna()
+    present &= present.cumsum() >= min_candles
+
+    curr = stack(ind, present)
+    prev = stack(previous_bars(pn), present)
+    table = score_universe(curr, prev)
+
+    # ordre des tickers = ordre de l'univers (départage des scores égaux comme le scanner)
+    order = {ticker: i for i, ticker in enumerate(frames)}
+    table["rank_in_universe"] = table.index.get_level_values("ticker").map(order)
+    return table
+
+
+def crypto_indicators_panel(panel: Panel) -> Panel:
+    """
+    compute_indicators_panel du bot crypto, avec le choix SMA 200 / SMA 90 fait date par date :
+    le scanner prend SMA 200 dès que sa fenêtre de HISTORY_LIMIT bougies en contient 200.
+    """
+    ind = bot_crypto_pro.compute_indicators_panel(panel)
+    close = panel["Close"]
+    nobs = close.notna().cumsum()
+    sma_200 = bot_crypto_pro.calculate_sma(close, 200)
+    sma_90 = bot_crypto_pro.calculate_sma(close, 90)
+    ind["SMA_200"] = sma_200.where(nobs >= 200, sma_90).where(close.notna())
+    return ind
+
+
+# =========================
+# SÉLECTION DES PICKS
+# =========================
+
+def top_per_date(rows: pd.DataFrame, score_col: str, n: Optional[int], decimals: Optional[int]) -> pd.DataFrame:
+    """
+    Par date : lignes triées par score décroissant (arrondi à `decimals`, tri stable
+    sur l'ordre de l'univers), limitées aux `n` premières. Même règle que ranked() + head().
+    """
+    if rows.empty:
+        return rows
+    key = rows[score_col] if decimals is None else rows[score_col].map(lambda s: round(float(s), decimals))
+    ordered = rows.assign(_key=key, _date=rows.index.get_level_values("date")).sort_values(
+        ["_date", "_key", "rank_in_universe"], ascending=[True, False, True], kind="mergesort"
+    )
+    if n is not None:
+        ordered = ordered[ordered.groupby("_date").cumcount() < n]
+    return ordered.drop(columns=["_key", "_date"])
+
+
+def to_signals(rows: pd.DataFrame, universe: str, strategy: str, stop_col: str, decimals: Optional[int]) -> pd.DataFrame:
+    """Picks -> colonnes du log de signaux (entry_price / stop_loss comme dans les JSON de picks)."""
+    price = rows["price"].astype("float64")
+    stop = rows[stop_col].astype("float64")
+    if decimals is not None:
+        price = price.round(decimals)
+        stop = stop.round(decimals)
+
+    out = pd.DataFrame(
+        {
+            "date_signal": rows.index.get_level_values("date").strftime("%Y-%m-%d"),
+            "universe": universe,
+            "strategy": strategy,
+            "ticker": rows.index.get_level_values("ticker"),
+            "entry_price": price.to_numpy(),
+            "stop_loss": stop.to_numpy(),
+        }
+    )
+    return out[np.isfinite(out["entry_price"]) & np.isfinite(out["stop_loss"])]
+
+
+def in_window(table: pd.DataFrame, start: Optional[str], end: Optional[str]) -> pd.DataFrame:
+    dates = table.index.get_level_values("date")
+    keep = np.ones(len(table), dtype=bool)
+    if start is not None:
+        keep &= dates >= pd.Timestamp(start)
+    if end is not None:
+        keep &= dates <= pd.Timestamp(end)
+    return table[keep]
+
+
+def backtest_sp500(frames: Dict[str, pd.DataFrame], start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+    table = scored_table(
+        frames, bot_sp500_pro.compute_indicators_panel, bot_sp500_pro.score_universe, bot_sp500_pro.MIN_CANDLES
+    )
+    table = in_window(table, start, end)
+
+    breakout = top_per_date(table[table["breakout"]], "score_breakout", None, 2)
+    pullback = top_per_date(table[table["pullback"]], "score_pullback", SP500_PULLBACK_TOP, 2)
+
+    logger.info(f"sp500: {len(breakout)} breakouts | {len(pullback)} pullbacks")
+    return pd.concat(
+        [
+            to_signals(breakout, "sp500", "phoenix", "stop_breakout", 2),
+            to_signals(pullback, "sp500", "pullback", "stop_pullback", 2),
+        ],
+        ignore_index=True,
+    )
+
+
+def _with_fallback(table: pd.DataFrame, strict_col: str, fallback_col: str, score_col: str, n: int) -> pd.DataFrame:
+    """Signaux stricts du jour, sinon les `n` meilleurs candidats fallback (score brut)."""
+    strict = table[table[strict_col]]
+    dates_with_strict = strict.index.get_level_values("date").unique()
+
+    candidates = table[table[fallback_col]]
+    candidates = candidates[~candidates.index.get_level_values("date").isin(dates_with_strict)]
+    fallback = top_per_date(candidates, score_col, n, None)
+
+    return pd.concat([strict, fallback])
+
+
+def backtest_crypto(frames: Dict[str, pd.DataFrame], start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+    table = scored_table(
+        frames, crypto_indicators_panel, bot_crypto_pro.score_universe, bot_crypto_pro.MIN_CANDLES
+    )
+    table = in_window(table, start, end)
+
+    breakout = _with_fallback(
+        table, "breakout", "fallback_breakout", "score_breakout", bot_crypto_pro.FALLBACK_MAX_BREAKOUT
+    )
+    pullback = _with_fallback(
+        table, "pullback", "fallback_pullback", "score_pullback", bot_crypto_pro.FALLBACK_MAX_PULLBACK
+    )
+
+    logger.info(f"crypto: {len(breakout)} breakouts | {len(pullback)} pullbacks")
+    return pd.concat(
+        [
+            to_signals(breakout, "crypto", "phoenix", "stop_breakout", None),
+            to_signals(pullback, "crypto", "pullback", "stop_pullback", None),
+        ],
+        ignore_index=True,
+    )
+
+
+def run_backtest(
+    universes=UNIVERSES,
+    start: Optional[str] = START_DATE,
+    end: Optional[str] = END_DATE,
+    tickers: Optional[Dict[str, List[str]]] = None,
+) -> pd.DataFrame:
+    """
+    Signaux historiques de tous les univers, triés comme le log
+    (date / univers / stratégie / ticker). `tickers` : univers explicite par marché,
+    sinon l'univers courant des scanners.
+    """
+    parts = []
+    for universe in universes:
+        if tickers and universe in tickers:
+            symbols = tickers[universe]
+        elif universe == "sp500":
+            symbols = list(bot_sp500_pro.get_sp500_tickers())
+        else:
+            symbols = bot_crypto_pro.get_top_cryptos(CRYPTO_UNIVERSE_SIZE)
+
+        frames = load_frames(universe, symbols)
+        if not frames:
+            continue
+
+        if universe == "sp500":
+            parts.append(backtest_sp500(frames, start, end))
+        else:
+            parts.append(backtest_crypto(frames, start, end))
+
+    columns = ["date_signal", "universe", "strategy", "ticker", "entry_price", "stop_loss"]
+    if not parts:
+        return pd.DataFrame(columns=columns)
+
+    signals = pd.concat(parts, ignore_index=True)[columns]
+    return signals.sort_values(["date_signal", "universe", "strategy", "ticker"], kind="mergesort", ignore_index=True)
+
+
+def verify_gapped(n_tickers: int = 20, gap_at: int = 300) -> int:
+    """
+    Non-régression sur un univers synthétique : un ticker privé d'une bougie en milieu
+    d'historique doit avoir, date par date, les mêmes filtres / scores / stops que le calcul
+    par ticker (compute_indicators sur ses seules bougies). Renvoie le nombre d'écarts.
+    """
+    from benchmark import synthetic_universe
+
+    frames = synthetic_universe("sp500", n_tickers)
+    ticker = next(iter(frames))
+    df = frames[ticker]
+    frames[ticker] = df.drop(df.index[gap_at])
+
+    table = scored_table(
+        frames, bot_sp500_pro.compute_indicators_panel, bot_sp500_pro.score_universe, bot_sp500_pro.MIN_CANDLES
+    )
+    got = table.xs(ticker, level="ticker")
+
+    # Référence : calcul par ticker, bougie précédente = df.iloc[-2] du scanner
+    own = frames[ticker]
+    ind = bot_sp500_pro.compute_indicators(own)
+    start = bot_sp500_pro.MIN_CANDLES - 1
+    expected = bot_sp500_pro.score_universe(ind.iloc[start:], own.shift(1).iloc[start:])
+
+    errors = 0
+    if not got.index.equals(expected.index):
+        logger.error(f"{ticker}: dates différentes ({len(got)} lignes vs {len(expected)})")
+        return 1
+    for col in expected.columns:
+        a = got[col].to_numpy()
+        b = expected[col].to_numpy()
+        if a.dtype == bool:
+            same = a == b
+        else:
+            same = np.isclose(a.astype(float), b.astype(float), rtol=1e-9, atol=1e-12, equal_nan=True)
+        if not same.all():
+            errors += 1
+            logger.error(f"{ticker}.{col}: {int((~same).sum())} dates en écart avec le calcul par ticker")
+    signals = int(expected["breakout"].sum() + expected["pullback"].sum())
+    logger.info(f"Ticker troué {ticker} : {len(got)} dates, {signals} signaux, {errors} colonne(s) en écart.")
+    return errors
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Log de signaux historiques rejouant les règles des scanners.")
+    parser.add_argument(
+        "--verify-gaps", action="store_true",
+        help="vérifie sur données synthétiques qu'un ticker troué donne les signaux du calcul par ticker",
+    )
+    args = parser.parse_args(argv)
+    if args.verify_gaps:
+        sys.exit(1 if verify_gapped() else 0)
+
+    signals = run_backtest()
+
+    os.makedirs(os.path.dirname(OUT_PATH), exist_ok=True)
+    count = write_json_stream(iter_log_entries(signals), OUT_PATH)
+
+    logger.info(f"✅ Backtest log généré : {OUT_PATH} ({count} signaux)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+# bots/benchmark.py
+
+import io
+import os
+import csv
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import fixtures
+import indicator_state
+import market_data
+import bot_sp500_pro
+import bot_crypto_pro
+import log_signals
+import perf_summary
+import trade_results
+import trade_stats
+import generate_backtest_signals_from_csv as backtest_csv
+
+# =========================
+# CONFIG
+# =========================
+
+# Tailles balayées : univers (scanners) et nombre de signaux (log, simulation, agrégation)
+UNIVERSE_SIZES = [50, 150, 500]
+LOG_SIZES = [1_000, 10_000, 100_000]
+
+# Bougies synthétiques par série (>= MIN_CANDLES des deux scanners)
+SP500_BARS = 520
+CRYPTO_BARS = 200
+
+# Mesures de temps par point (on garde la meilleure), puis une passe tracemalloc
+REPEAT = 3
+SEED = 42
+
+STAGES = ["sp500_scan", "crypto_scan", "log_signals", "simulate_trade", "equity_curve", "trade_stats", "backtest_log"]
+
+logger = logging.getLogger("benchmark")
+
+# Aucun appel réseau : univers et historiques sont synthétiques, injectés dans un provider
+# market_data en mémoire seule, ou rejoués depuis des fixtures enregistrées (--fixtures) ;
+# les fichiers sont écrits dans un dossier temporaire.
+
+
+# =========================
+# FIXTURES SYNTHÉTIQUES
+# =========================
+
+def synthetic_ohlcv(rng: np.random.Generator, index: pd.DatetimeIndex, base_volume: float) -> pd.DataFrame:
+    """Marche aléatoire log-normale avec High/Low cohérents et volume bruité."""
+    n = len(index)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, n)))
+    open_ = close * np.exp(rng.normal(0.0, 0.01, n))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0.0, 0.01, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0.0, 0.01, n)))
+    volume = base_volume * np.exp(rng.normal(0.0, 0.5, n))
+    return pd.DataFrame({"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume}, index=index)
+
+
+def synthetic_universe(universe: str, n_tickers: int, seed: int = SEED) -> Dict[str, pd.DataFrame]:
+    """{ticker: OHLCV} se terminant aujourd'hui (aucune série n'est écartée comme périmée)."""
+    rng = np.random.default_rng(seed)
+    today = pd.Timestamp.now().normalize()
+    if universe == "sp500":
+        index = pd.bdate_range(end=today, periods=SP500_BARS)
+        return {f"T{i:04d}": synthetic_ohlcv(rng, index, 1e6) for i in range(n_tickers)}
+    index = pd.date_range(end=today, periods=CRYPTO_BARS, freq="D")
+    return {f"C{i:04d}": synthetic_ohlcv(rng, index, 1e5) for i in range(n_tickers)}
+
+
+def synthetic_signals(n_signals: int, n_tickers: int = 100, seed: int = SEED) -> pd.DataFrame:
+    """Signaux colonnaires (date, univers, stratégie, ticker, prix, stop) sur les 2 dernières années."""
+    rng = np.random.default_rng(seed)
+    days = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=SP500_BARS)
+    entry_price = rng.uniform(20.0, 500.0, n_signals)
+    return pd.DataFrame(
+        {
+            "date_signal": days[rng.integers(0, len(days), n_signals)].strftime("%Y-%m-%d"),
+            "universe": rng.choice(["sp500", "crypto"], n_signals),
+            "strategy": rng.choice(["phoenix", "pullback"], n_signals),
+            "ticker": [f"T{i:04d}" for i in rng.integers(0, n_tickers, n_signals)],
+            "entry_price": entry_price,
+            "stop_loss": entry_price * rng.uniform(0.85, 0.97, n_signals),
+        }
+    )
+
+
+@contextmanager
+def offline_market(universe_frames: Dict[str, Dict[str, pd.DataFrame]], workdir: str) -> Iterator[None]:
+    """
+    Provider market_data en mémoire seule pré-rempli avec les séries synthétiques,
+    univers des scanners (Wikipédia, CoinGecko) remplacés par leurs tickers et
+    états d'indicateurs écrits dans `workdir`.
+    """
+    provider = market_data.MarketData(store=None, memory_budget=1 << 40)
+    for universe, frames in universe_frames.items():
+        for ticker, df in frames.items():
+            provider._cache_put((universe, ticker), df)
+
+    saved = (
+        market_data._default,
+        bot_sp500_pro.get_sp500_tickers,
+        bot_crypto_pro.get_top_cryptos,
+        indicator_state.STORE_DIR,
+    )
+    market_data._default = provider
+    indicator_state.STORE_DIR = os.path.join(workdir, "indicators")
+    bot_sp500_pro.get_sp500_tickers = lambda: {t: f"Company {t}" for t in universe_frames.get("sp500", {})}
+    bot_crypto_pro.get_top_cryptos = lambda limit=150: list(universe_frames.get("crypto", {}))
+    try:
+        yield
+    finally:
+        (
+            market_data._default,
+            bot_sp500_pro.get_sp500_tickers,
+            bot_crypto_pro.get_top_cryptos,
+            indicator_state.STORE_DIR,
+        ) = saved
+
+
+# =========================
+# MESURE
+# =========================
+
+def measure(fn: Callable[[], object], repeat: int = REPEAT) -> Dict[str, float]:
+    """
+    Meilleur temps sur `repeat` appels, puis pic mémoire Python (tracemalloc) d'un appel.
+    Les print des scripts mesurés sont absorbés.
+    """
+    best = float("inf")
+    with redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {"seconds": best, "peak_mb": peak / (1024 * 1024)}
+
+
+# =========================
+# ÉTAPES
+# =========================
+
+def bench_scan(bot, universe: str, sizes: List[int], repeat: int, workdir: str) -> List[Dict]:
+    """
+    Scan complet sur un univers synthétique. Avec les indicateurs incrémentaux, le 1er appel
+    construit les états : le meilleur temps est celui d'un run de routine (aucune bougie nouvelle).
+    """
+    rows = []
+    for size in sizes:
+        with offline_market({universe: synthetic_universe(universe, size)}, os.path.join(workdir, f"{universe}_{size}")):
+            stats = measure(bot.analyze_market, repeat)
+        rows.append({"stage": f"{universe}_scan", "size": size, **stats})
+    return rows
+
+
+def bench_scan_replay(bot, universe: str, root: str, repeat: int) -> List[Dict]:
+    """
+    Scan complet rejoué depuis les fixtures de `root` (univers et OHLCV enregistrés),
+    provider vidé à chaque appel : la taille est celle de l'univers enregistré.
+    """
+    def run():
+        market_data._default = market_data.MarketData(store=None)
+        return bot.analyze_market()
+
+    saved = market_data._default
+    try:
+        with fixtures.session("replay", root):
+            if universe == "sp500":
+                size = len(bot.get_sp500_tickers())
+            else:
+                size = len(bot.get_top_cryptos(150))
+            stats = measure(run, repeat)
+    finally:
+        market_data._default = saved
+    return [{"stage": f"{universe}_scan_replay", "size": size, **stats}]
+
+
+def bench_log_signals(sizes: List[int], repeat: int, workdir: str) -> List[Dict]:
+    """log_signals.main sur un log vide avec `size` picks répartis sur les 4 fichiers de scan."""
+    rows = []
+    saved = (log_signals.LOG_PATH, log_signals.SOURCES)
+    try:
+        for size in sizes:
+            sources = []
+            for k, (universe, strategy) in enumerate(backtest_csv.CSV_CONFIG):
+                picks = {
+                    f"{universe[0].upper()}{i:06d}": {"entry_price": 100.0 + i % 50, "stop_loss": 95.0}
+                    for i in range(k, size, 4)
+                }
+                path = os.path.join(workdir, f"scan_{universe}_{strategy}_{size}.json")
+                with open(path, "w") as f:
+                    json.dump({"date_mise_a_jour": "05/12/2025", "picks": picks}, f)
+                sources.append((path, universe, strategy))
+
+            log_signals.SOURCES = sources
+            log_path = os.path.join(workdir, f"signals_log_{size}")
+
+            def run():
+                shutil.rmtree(log_path, ignore_errors=True)
+                log_signals.LOG_PATH = log_path
+                log_signals.main()
+
+            rows.append({"stage": "log_signals", "size": size, **measure(run, repeat)})
+    finally:
+        log_signals.LOG_PATH, log_signals.SOURCES = saved
+    return rows
+
+
+def bench_simulate_trade(sizes: List[int], repeat: int) -> List[Dict]:
+    """
+    `size` signaux sur 100 sous-jacents : simulate_trade signal par signal
+    et simulate_trades groupé par ticker (une simulation vectorisée par historique).
+    """
+    frames = synthetic_universe("sp500", 100)
+    rows = []
+    for size in sizes:
+        signals = synthetic_signals(size)
+        dates = pd.to_datetime(signals["date_signal"]).tolist()
+        items = list(zip(signals["ticker"], dates, signals["stop_loss"].tolist()))
+        by_ticker: Dict[str, List[tuple]] = {}
+        for ticker, date_signal, stop in items:
+            by_ticker.setdefault(ticker, []).append((date_signal, stop))
+
+        def per_signal():
+            for ticker, date_signal, stop in items:
+                perf_summary.simulate_trade(frames[ticker], date_signal, stop)
+
+        def grouped():
+            for ticker, group in by_ticker.items():
+                perf_summary.simulate_trades(frames[ticker], [d for d, _ in group], [s for _, s in group])
+
+        rows.append({"stage": "simulate_trade", "size": size, **measure(per_signal, repeat)})
+        rows.append({"stage": "simulate_trades", "size": size, **measure(grouped, repeat)})
+    return rows
+
+
+def bench_equity_curve(sizes: List[int], repeat: int) -> List[Dict]:
+    rng = np.random.default_rng(SEED)
+    rows = []
+    for size in sizes:
+        signals = synthetic_signals(size)
+        trades = [
+            {"exit_date": d, "perf_pct": float(p)}
+            for d, p in zip(signals["date_signal"], rng.normal(0.5, 5.0, size))
+        ]
+        curve = perf_summary.build_equity_curve(trades)
+        rows.append({"stage": "equity_curve", "size": size, **measure(lambda: perf_summary.build_equity_curve(trades), repeat)})
+        rows.append({
+            "stage": "equity_compact",
+            "size": size,
+            **measure(lambda: perf_summary.compact_equity_curves({"global": curve}), repeat),
+        })
+    return rows
+
+
+def bench_trade_stats(sizes: List[int], repeat: int) -> List[Dict]:
+    """Stats par stratégie (trade_stats) sur une table de `size` trades clôturés."""
+    rng = np.random.default_rng(SEED)
+    rows = []
+    for size in sizes:
+        signals = synthetic_signals(size)
+        R = rng.normal(0.1, 1.2, size)
+        table = trade_results.build(
+            [
+                {"universe": u, "strategy": s, "exit_date": d, "R": r, "exit_reason": reason}
+                for u, s, d, r, reason in zip(
+                    signals["universe"], signals["strategy"], signals["date_signal"], R,
+                    rng.choice(["SL", "BE", "TIME"], size),
+                )
+            ]
+        )
+        rows.append({
+            "stage": "trade_stats",
+            "size": size,
+            **measure(lambda: trade_stats.strategy_stats(table, perf_summary.STRATEGY_KEYS), repeat),
+        })
+    return rows
+
+
+def bench_backtest_log(sizes: List[int], repeat: int, workdir: str) -> List[Dict]:
+    """build_backtest_log sur 4 CSV synthétiques totalisant `size` signaux."""
+    rows = []
+    saved = backtest_csv.CSV_CONFIG
+    try:
+        for size in sizes:
+            signals = synthetic_signals(size)
+            config = {}
+            for (universe, strategy), group in signals.groupby(["universe", "strategy"]):
+                path = os.path.join(workdir, f"backtest_{universe}_{strategy}_{size}.csv")
+                group[["date_signal", "ticker", "entry_price", "stop_loss"]].to_csv(path, index=False)
+                config[(universe, strategy)] = path
+            backtest_csv.CSV_CONFIG = config
+            rows.append({"stage": "backtest_log", "size": size, **measure(backtest_csv.build_backtest_log, repeat)})
+    finally:
+        backtest_csv.CSV_CONFIG = saved
+    return rows
+
+
+def run_benchmarks(
+    stages: List[str] = STAGES,
+    universe_sizes: List[int] = UNIVERSE_SIZES,
+    log_sizes: List[int] = LOG_SIZES,
+    repeat: int = REPEAT,
+    fixtures_dir: Optional[str] = None,
+) -> List[Dict]:
+    """
+    Lance les étapes demandées ; une ligne {stage, size, seconds, peak_mb} par point mesuré.
+    Avec `fixtures_dir`, les scanners rejouent les fixtures enregistrées au lieu des séries synthétiques.
+    """
+    rows: List[Dict] = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for stage in stages:
+            logger.info(f"Benchmark {stage}...")
+            if stage == "sp500_scan":
+                if fixtures_dir:
+                    rows += bench_scan_replay(bot_sp500_pro, "sp500", fixtures_dir, repeat)
+                else:
+                    rows += bench_scan(bot_sp500_pro, "sp500", universe_sizes, repeat, workdir)
+            elif stage == "crypto_scan":
+                if fixtures_dir:
+                    rows += bench_scan_replay(bot_crypto_pro, "crypto", fixtures_dir, repeat)
+                else:
+                    rows += bench_scan(bot_crypto_pro, "crypto", universe_sizes, repeat, workdir)
+            elif stage == "log_signals":
+                rows += bench_log_signals(log_sizes, repeat, workdir)
+            elif stage == "simulate_trade":
+                rows += bench_simulate_trade(log_sizes, repeat)
+            elif stage == "equity_curve":
+                rows += bench_equity_curve(log_sizes, repeat)
+            elif stage == "trade_stats":
+                rows += bench_trade_stats(log_sizes, repeat)
+            elif stage == "backtest_log":
+                rows += bench_backtest_log(log_sizes, repeat, workdir)
+    return rows
+
+
+def print_report(rows: List[Dict]):
+    print(f"{'stage':<22}{'size':>10}{'seconds':>12}{'peak MB':>12}")
+    for row in rows:
+        print(f"{row['stage']:<22}{row['size']:>10}{row['seconds']:>12.4f}{row['peak_mb']:>12.1f}")
+
+
+def save_report(rows: List[Dict], path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["stage", "size", "seconds", "peak_mb"])
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_sizes(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark hors réseau des étapes du pipeline nocturne.")
+    parser.add_argument("--stage", action="append", choices=STAGES, help="étape à mesurer (répétable ; défaut toutes)")
+    parser.add_argument("--universe-sizes", type=parse_sizes, default=UNIVERSE_SIZES, help="ex. 50,150,500")
+    parser.add_argument("--log-sizes", type=parse_sizes, default=LOG_SIZES, help="ex. 1000,10000")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="mesures de temps par point")
+    parser.add_argument("--fixtures", metavar="DIR", help="scanners rejoués depuis ces fixtures enregistrées")
+    parser.add_argument("--out", help="écrit aussi le rapport en CSV")
+    args = parser.parse_args(argv)
+
+    # Les scanners loguent chaque étape en INFO : on ne garde que le benchmark
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    rows = run_benchmarks(
+        args.stage or STAGES, args.universe_sizes, args.log_sizes, max(1, args.repeat), args.fixtures
+    )
+    print_report(rows)
+    if args.out:
+        save_report(rows, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
-import ccxt
+import numpy as np
 import pandas as pd
 import json
-import time
 import requests
 import logging
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
+
+import fixtures
+import indicator_state
+import market_data
+import metrics
+import universe_store
+from ohlcv_store import index_to_ns
+from panel import Panel, indicator_cross_sections, ranked
 
 # =========================
 # CONFIGURATION
@@ -27,7 +34,21 @@ EXCLUDED_NAME_KEYWORDS = [
 
 MIN_CANDLES = 90                # mini historique
 MIN_DOLLAR_VOL = 1_000_000      # 1M$ de vol moyen 20j
-SLEEP_BETWEEN_CALLS = 0.2       # pour l'API
+
+# Fetch concurrent Binance (rate limit et ré-essais gérés par market_data)
+MAX_WORKERS = 8                 # requêtes OHLCV en vol simultanément
+HISTORY_LIMIT = 200             # bougies analysées
+
+# Indicateurs mis à jour bougie par bougie depuis l'état persisté (indicator_state) : EMA / RSI
+# de Wilder ré-ancrés sur la 1re des HISTORY_LIMIT dernières bougies, en accord avec le calcul
+# complet à la tolérance de indicator_state.VERIFY_RTOL près, mais pas au bit près. Les stops
+# crypto sont publiés non arrondis (puis repris dans stop_loss_technical et le R) : désactivé
+# par défaut pour garder le calcul complet, reproductible par le replay. Ignoré en mode fixtures.
+INCREMENTAL_INDICATORS = False
+
+# Top market cap : snapshot local réutilisé pendant UNIVERSE_TTL secondes
+UNIVERSE_TTL = 3 * 24 * 3600
+FALLBACK_SYMBOLS = ["BTC", "ETH", "SOL", "BNB", "PEPE", "DOGE", "RNDR", "FET", "INJ", "SUI", "SEI", "TIA"]
 
 # Fallback : nombre max d'actifs si les conditions strictes donnent 0
 FALLBACK_MAX_BREAKOUT = 10
@@ -39,8 +60,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger("crypto_scanner")
 
-exchange_binance = ccxt.binance({"enableRateLimit": True})
-
 # =========================
 # FONCTIONS TECHNIQUES
 # =========================
@@ -66,12 +85,32 @@ def normalize(value: float, min_val: float, max_val: float, clip: bool = True) -
         x = max(0.0, min(1.0, x))
     return x
 
-def get_top_cryptos(limit: int = 150):
+def normalize_array(values, min_val: float, max_val: float, clip: bool = True) -> np.ndarray:
+    """
+    normalize élément par élément, mêmes résultats au bit près
+    (y compris NaN -> 1.0 et -0.0 -> 0.0, comme max(0.0, min(1.0, x))).
+    """
+    values = np.asarray(values, dtype="float64")
+    if max_val == min_val:
+        return np.zeros_like(values)
+    x = (values - min_val) / (max_val - min_val)
+    if clip:
+        x = np.where(x < 1.0, x, 1.0)
+        x = np.where(x > 0.0, x, 0.0)
+    return x
+
+def _get_json(url: str, params: Dict) -> list:
+    response = requests.get(url, params=params, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+def fetch_top_cryptos() -> List[str]:
     """
-    Top market cap CoinGecko, filtré :
+    Top market cap CoinGecko (200 premiers), filtré :
     - stablecoins
     - tokens blacklistés (XAUT, PAXG, BDX, etc.)
     - noms "gold-like"
+    Lève en cas d'échec.
     """
     url = "https://api.coingecko.com/api/v3/coins/markets"
     params = {
@@ -82,70 +121,92 @@ def get_top_cryptos(limit: int = 150):
         "sparkline": "false"
     }
 
-    try:
-        logger.info("Récupération liste CoinGecko...")
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-
-        symbols = []
-        for coin in data:
-            sym = coin["symbol"].upper()
-            name = coin.get("name", "").upper()
-
-            # Stablecoins
-            if sym in STABLECOINS:
-                continue
-
-            # Blacklist symbol
-            if sym in EXCLUDED_SYMBOLS:
-                continue
-
-            # Noms "gold-like"
-            if any(keyword in name for keyword in EXCLUDED_NAME_KEYWORDS):
-                continue
-
-            # Wrappers à exclure
-            if sym.startswith("W") and sym in ["WBTC", "WETH", "WBNB"]:
-                continue
-            if "STETH" in sym:
-                continue
-
-            symbols.append(sym)
-
-        logger.info(f"{len(symbols)} actifs retenus après filtre univers.")
-        return symbols[:limit]
-    except Exception as e:
-        logger.warning(f"Erreur CoinGecko: {e}. Fallback liste réduite.")
-        return ["BTC", "ETH", "SOL", "BNB", "PEPE", "DOGE", "RNDR", "FET", "INJ", "SUI", "SEI", "TIA"]
+    logger.info("Récupération liste CoinGecko...")
+    data = fixtures.recorded("coingecko", {"url": url, **params}, lambda: _get_json(url, params))
+
+    symbols = []
+    for coin in data:
+        sym = coin["symbol"].upper()
+        name = coin.get("name", "").upper()
+
+        # Stablecoins
+        if sym in STABLECOINS:
+            continue
+
+        # Blacklist symbol
+        if sym in EXCLUDED_SYMBOLS:
+            continue
+
+        # Noms "gold-like"
+        if any(keyword in name for keyword in EXCLUDED_NAME_KEYWORDS):
+            continue
+
+        # Wrappers à exclure
+        if sym.startswith("W") and sym in ["WBTC", "WETH", "WBNB"]:
+            continue
+        if "STETH" in sym:
+            continue
+
+        symbols.append(sym)
+
+    logger.info(f"{len(symbols)} actifs retenus après filtre univers.")
+    return symbols
+
+def get_top_cryptos(limit: int = 150):
+    """
+    Les `limit` premiers actifs du snapshot local (rafraîchi tous les UNIVERSE_TTL) ;
+    CoinGecko en panne => dernier snapshot valide, puis liste de secours.
+    """
+    return universe_store.resolve("crypto", fetch_top_cryptos, UNIVERSE_TTL, FALLBACK_SYMBOLS)[:limit]
 
 def fetch_ohlcv(symbol: str) -> pd.DataFrame | None:
     """
-    OHLCV daily sur Binance.
+    OHLCV daily sur Binance (les HISTORY_LIMIT dernières bougies), via market_data.
     On filtre les actifs avec données trop vieilles.
     """
-    pair = f"{symbol}/USDT"
-
     try:
-        ohlcv = exchange_binance.fetch_ohlcv(pair, timeframe="1d", limit=200)
-        if not ohlcv:
+        hist = market_data.get_history("crypto", symbol, HISTORY_LIMIT)
+        if hist is None or hist.empty:
+            metrics.incr("crypto.rejected.no_data")
             return None
 
-        df = pd.DataFrame(ohlcv, columns=["timestamp", "Open", "High", "Low", "Close", "Volume"])
+        df = pd.DataFrame({"timestamp": index_to_ns(hist.index) // 1_000_000})
+        for col in ["Open", "High", "Low", "Close", "Volume"]:
+            df[col] = hist[col].to_numpy()
+
         last_timestamp = df.iloc[-1]["timestamp"]
-        current_timestamp = int(time.time() * 1000)
+        current_timestamp = int(fixtures.time_now() * 1000)
 
         # Données > 48h => on jette
         if (current_timestamp - last_timestamp) > 172800000:
+            metrics.incr("crypto.rejected.stale")
             return None
 
         if len(df) >= MIN_CANDLES:
             return df
     except Exception:
+        metrics.incr("crypto.rejected.error")
         return None
 
+    metrics.incr("crypto.rejected.short")
     return None
 
+def fetch_ohlcv_many(symbols: List[str], max_workers: int = MAX_WORKERS) -> Dict[str, pd.DataFrame]:
+    """
+    Fetch concurrent (pool de threads borné à max_workers) de l'OHLCV de tous les symboles.
+    Renvoie {symbol: df} pour les séries valides, dans l'ordre de `symbols`.
+    """
+    market_data.prefetch("crypto", symbols, max_workers=max_workers)
+
+    frames = {}
+    for symbol in symbols:
+        df = fetch_ohlcv(symbol)
+        if df is not None:
+            frames[symbol] = df
+
+    logger.info(f"OHLCV Binance : {len(frames)}/{len(symbols)} séries valides.")
+    return frames
+
 # =========================
 # INDICATEURS
 # =========================
@@ -167,6 +228,31 @@ def compute_indicators(df: pd.DataFrame) -> pd.DataFrame:
     df["High_20"] = df["High"].rolling(20).max()
     return df
 
+def compute_indicators_panel(panel: Panel) -> Panel:
+    """
+    compute_indicators pour tout l'univers en une passe (DataFrames dates × tickers).
+    Valeurs identiques au calcul par ticker pour tout historique contigu sur l'axe des dates.
+    """
+    close, high, volume = panel["Close"], panel["High"], panel["Volume"]
+    present = close.notna()
+
+    # SMA_200 sur 90 bougies pour les historiques courts (même règle que len(df) >= 200)
+    long_hist = present.sum() >= 200
+    sma_200 = calculate_sma(close, 200)
+    sma_90 = calculate_sma(close, 90)
+
+    ind = dict(panel)
+    ind["SMA_200"] = sma_200.where(np.broadcast_to(long_hist.to_numpy(), close.shape), sma_90)
+    ind["EMA_13"] = calculate_ema(close, 13)
+    ind["EMA_21"] = calculate_ema(close, 21)
+    ind["EMA_50"] = calculate_ema(close, 50)
+    ind["RSI"] = calculate_rsi(close, 14)
+    ind["Vol_Avg"] = calculate_sma(volume, 20)
+    ind["DollarVol"] = close * volume
+    ind["DollarVol_Avg20"] = calculate_sma(ind["DollarVol"], 20)
+    ind["High_20"] = high.rolling(20).max()
+    return {name: frame.where(present) for name, frame in ind.items()}
+
 def phoenix_breakout_score(curr: pd.Series, prev: pd.Series) -> float:
     price = curr["Close"]
     sma200 = curr["SMA_200"]
@@ -205,169 +291,199 @@ def pullback_score(curr: pd.Series) -> float:
     score = (0.4 * trend_score + 0.4 * position_score + 0.2 * rsi_score)
     return score * 100
 
+# =========================
+# SCORING VECTORISÉ (toute la coupe transversale d'un coup)
+# =========================
+
+def _col(cs: pd.DataFrame, name: str) -> np.ndarray:
+    if name not in cs:
+        return np.full(len(cs), np.nan)
+    return cs[name].to_numpy(dtype="float64")
+
+def phoenix_breakout_score_vec(curr: pd.DataFrame) -> np.ndarray:
+    """phoenix_breakout_score pour chaque ligne de `curr` (symboles × indicateurs)."""
+    price, sma200, rsi = _col(curr, "Close"), _col(curr, "SMA_200"), _col(curr, "RSI")
+    volume, vol_avg, high_20 = _col(curr, "Volume"), _col(curr, "Vol_Avg"), _col(curr, "High_20")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vol_ratio = np.where(vol_avg > 0, volume / vol_avg, 0.0)
+        trend_pct = (price - sma200) / sma200
+        dist = (high_20 - price) / high_20
+
+    trend_score = normalize_array(trend_pct, 0.0, 0.5)
+    vol_score = normalize_array(vol_ratio, 1.2, 4.0)
+    rsi_score = normalize_array(rsi, 50, 75)
+    high_score = np.where(np.isnan(high_20) | (high_20 == 0), 0.0, normalize_array(1 - dist, 0.85, 1.0))
+
+    score = (0.35 * trend_score + 0.35 * vol_score + 0.15 * rsi_score + 0.15 * high_score)
+    return score * 100
+
+def pullback_score_vec(curr: pd.DataFrame) -> np.ndarray:
+    """pullback_score pour chaque ligne de `curr` (symboles × indicateurs)."""
+    price, sma200, ema50, rsi = _col(curr, "Close"), _col(curr, "SMA_200"), _col(curr, "EMA_50"), _col(curr, "RSI")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trend_strength = (price - sma200) / sma200
+        dist_ema50 = (price - ema50) / ema50
+
+    position_score = normalize_array(1 - np.abs(dist_ema50), 0.95, 1.0)
+    trend_score = normalize_array(trend_strength, 0.0, 0.5)
+    rsi_score = normalize_array(rsi, 40, 60)
+
+    score = (0.4 * trend_score + 0.4 * position_score + 0.2 * rsi_score)
+    return score * 100
+
+def score_universe(curr: pd.DataFrame, prev: pd.DataFrame) -> pd.DataFrame:
+    """
+    Filtres stricts, candidats fallback, scores et stops de tout l'univers en une passe
+    (une ligne par symbole). Mêmes règles et mêmes valeurs que l'ancienne boucle ligne par ligne.
+    """
+    price, open_, sma200 = _col(curr, "Close"), _col(curr, "Open"), _col(curr, "SMA_200")
+    ema13, ema50, rsi = _col(curr, "EMA_13"), _col(curr, "EMA_50"), _col(curr, "RSI")
+    volume, vol_avg, vol_usd = _col(curr, "Volume"), _col(curr, "Vol_Avg"), _col(curr, "DollarVol_Avg20")
+    prev_close, prev_low = _col(prev, "Close"), _col(prev, "Low")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trend_strength = (price - sma200) / sma200
+        vol_ratio = np.where(vol_avg > 0, volume / vol_avg, 0.0)
+
+    eligible = ~np.isnan(sma200) & ~(price <= 0)
+    # Filtre stablecoin "proche de 1"
+    eligible &= ~((0.98 <= price) & (price <= 1.02))
+    eligible &= ~np.isnan(vol_usd) & ~(vol_usd < MIN_DOLLAR_VOL)
+
+    is_green = (price > open_) | (price > prev_close)
+    in_trend = price > sma200
+
+    # Candidats fallback (larges, pour garantir du flux)
+    fallback_breakout = eligible & (trend_strength > -0.2) & (rsi < 80)
+    fallback_pullback = eligible & (trend_strength > -0.3) & (rsi < 75)
+
+    # Conditions strictes (signaux "propres")
+    breakout = eligible & in_trend & is_green & (vol_ratio > 1.2)
+    is_pulling_back = price < ema13
+    is_holding_support = price > ema50 * 0.98
+    pullback = eligible & (trend_strength > 0) & is_pulling_back & is_holding_support & (rsi < 60)
+
+    return pd.DataFrame(
+        {
+            "price": price,
+            "rsi": rsi,
+            "trend": trend_strength,
+            "vol_ratio": vol_ratio,
+            "dollar_vol_avg20": vol_usd,
+            "eligible": eligible,
+            "breakout": breakout,
+            "pullback": pullback,
+            "fallback_breakout": fallback_breakout,
+            "fallback_pullback": fallback_pullback,
+            "score_breakout": phoenix_breakout_score_vec(curr),
+            "score_pullback": pullback_score_vec(curr),
+            # min(prev_low, price * 0.90) avec la sémantique de min() (NaN compris)
+            "stop_breakout": np.where(price * 0.90 < prev_low, price * 0.90, prev_low),
+            "stop_pullback": ema50 * 0.90,
+        },
+        index=curr.index,
+    )
+
+def _breakout_pick(symbol: str, row: pd.Series, history: list) -> Dict:
+    return {
+        "name": symbol,
+        "score": round(float(row["score_breakout"]), 2),
+        "entry_price": float(row["price"]),
+        "stop_loss": float(row["stop_breakout"]),
+        "vol_ratio": round(float(row["vol_ratio"]), 2),
+        "rsi": round(float(row["rsi"]), 1),
+        "trend_pct": round(float(row["trend"] * 100), 2),
+        "dollar_vol_avg20": round(float(row["dollar_vol_avg20"]), 0),
+        "history": history
+    }
+
+def _pullback_pick(symbol: str, row: pd.Series, history: list) -> Dict:
+    return {
+        "name": symbol,
+        "score": round(float(row["score_pullback"]), 2),
+        "entry_price": float(row["price"]),
+        "stop_loss": float(row["stop_pullback"]),
+        "rsi": round(float(row["rsi"]), 1),
+        "trend_pct": round(float(row["trend"] * 100), 2),
+        "dollar_vol_avg20": round(float(row["dollar_vol_avg20"]), 0),
+        "history": history
+    }
+
 # =========================
 # LOGIQUE D'ANALYSE + FALLBACK
 # =========================
 
 def analyze_market() -> Tuple[Dict, Dict]:
-    SYMBOLS = get_top_cryptos(150)
+    with metrics.stage("universe"):
+        SYMBOLS = get_top_cryptos(150)
+    metrics.incr("crypto.universe", len(SYMBOLS))
 
     pullback_picks: Dict[str, Dict] = {}
     breakout_picks: Dict[str, Dict] = {}
 
-    fallback_breakout_candidates = []
-    fallback_pullback_candidates = []
+    logger.info(f"🚀 Analyse crypto sur {len(SYMBOLS)} actifs...")
 
-    nb_processed = 0
+    with metrics.stage("fetch"):
+        frames = fetch_ohlcv_many(SYMBOLS)
+    metrics.incr("crypto.valid_series", len(frames))
 
-    logger.info(f"🚀 Analyse crypto sur {len(SYMBOLS)} actifs...")
+    # Indicateurs : état incrémental par symbole, ou tout l'univers en une passe (panel dates × symboles)
+    with metrics.stage("indicators"):
+        if INCREMENTAL_INDICATORS and not fixtures.active():
+            last_bars, prev_bars = indicator_state.cross_sections(
+                "crypto", frames, compute_indicators, index_col="timestamp", window_bars=HISTORY_LIMIT
+            )
+        else:
+            last_bars, prev_bars = indicator_cross_sections(
+                frames, compute_indicators_panel, compute_indicators, index_col="timestamp"
+            )
 
-    for i, symbol in enumerate(SYMBOLS):
-        if i % 10 == 0:
-            time.sleep(SLEEP_BETWEEN_CALLS)
+    # Filtres, candidats et scores de tout l'univers en une passe
+    with metrics.stage("scoring"):
+        table = score_universe(last_bars, prev_bars)
 
-        df = fetch_ohlcv(symbol)
-        if df is None or df.empty:
-            continue
+    def history(symbol: str) -> list:
+        return frames[symbol]["Close"].tail(30).round(6).tolist()
 
-        try:
-            df = compute_indicators(df)
-            curr = df.iloc[-1]
-            prev = df.iloc[-2]
-            price = curr["Close"]
-
-            if pd.isna(curr["SMA_200"]) or price <= 0:
-                continue
-            # Filtre stablecoin "proche de 1"
-            if 0.98 <= price <= 1.02:
-                continue
-
-            vol_usd = curr.get("DollarVol_Avg20", 0)
-            if pd.isna(vol_usd) or vol_usd < MIN_DOLLAR_VOL:
-                continue
-
-            nb_processed += 1
-
-            trend_strength = (price - curr["SMA_200"]) / curr["SMA_200"]
-            vol_ratio = curr["Volume"] / curr["Vol_Avg"] if curr["Vol_Avg"] > 0 else 0
-            is_green = (price > curr["Open"]) or (price > prev["Close"])
-            in_trend = price > curr["SMA_200"]
-
-            phoenix_score_val = phoenix_breakout_score(curr, prev)
-            pullback_score_val = pullback_score(curr)
-
-            # --- CANDIDATS FALLBACK (larges, pour garantir du flux) ---
-
-            # Candidat breakout : tendance pas dégueu, liquidité OK
-            if trend_strength > -0.2 and curr["RSI"] < 80:
-                fallback_breakout_candidates.append({
-                    "symbol": symbol,
-                    "score": phoenix_score_val,
-                    "price": price,
-                    "rsi": float(curr["RSI"]),
-                    "trend_pct": float(trend_strength * 100),
-                    "vol_ratio": float(vol_ratio),
-                    "dollar_vol_avg20": float(vol_usd),
-                    "stop_loss": min(prev["Low"], price * 0.90),
-                    "history": df["Close"].tail(30).round(6).tolist()
-                })
-
-            # Candidat pullback : tendance pas catastrophique, RSI pas en délire
-            if trend_strength > -0.3 and curr["RSI"] < 75:
-                fallback_pullback_candidates.append({
-                    "symbol": symbol,
-                    "score": pullback_score_val,
-                    "price": price,
-                    "rsi": float(curr["RSI"]),
-                    "trend_pct": float(trend_strength * 100),
-                    "dollar_vol_avg20": float(vol_usd),
-                    "stop_loss": float(curr["EMA_50"] * 0.9),
-                    "history": df["Close"].tail(30).round(6).tolist()
-                })
-
-            # --- CONDITIONS STRICTES (signaux "propres") ---
-
-            # PHOENIX STRICT
-            if in_trend and is_green and (vol_ratio > 1.2):
-                score = phoenix_score_val
-                stop_loss = min(prev["Low"], price * 0.90)
-
-                breakout_picks[symbol] = {
-                    "name": symbol,
-                    "score": round(score, 2),
-                    "entry_price": price,
-                    "stop_loss": stop_loss,
-                    "vol_ratio": round(vol_ratio, 2),
-                    "rsi": round(curr["RSI"], 1),
-                    "trend_pct": round(trend_strength * 100, 2),
-                    "dollar_vol_avg20": round(vol_usd, 0),
-                    "history": df["Close"].tail(30).round(6).tolist()
-                }
-
-            # PULLBACK STRICT
-            is_pulling_back = (price < curr["EMA_13"])
-            is_holding_support = (price > curr["EMA_50"] * 0.98)
-
-            if (trend_strength > 0) and is_pulling_back and is_holding_support and (curr["RSI"] < 60):
-                score_pb = pullback_score_val
-                stop_loss_pb = curr["EMA_50"] * 0.90
-
-                pullback_picks[symbol] = {
-                    "name": symbol,
-                    "score": round(score_pb, 2),
-                    "entry_price": price,
-                    "stop_loss": stop_loss_pb,
-                    "rsi": round(curr["RSI"], 1),
-                    "trend_pct": round(trend_strength * 100, 2),
-                    "dollar_vol_avg20": round(vol_usd, 0),
-                    "history": df["Close"].tail(30).round(6).tolist()
-                }
-
-        except Exception:
-            continue
+    # --- CONDITIONS STRICTES (signaux "propres") ---
+    for symbol, row in table[table["breakout"]].iterrows():
+        breakout_picks[symbol] = _breakout_pick(symbol, row, history(symbol))
+
+    for symbol, row in table[table["pullback"]].iterrows():
+        pullback_picks[symbol] = _pullback_pick(symbol, row, history(symbol))
+
+    nb_processed = int(table["eligible"].sum())
+    nb_fallback_breakout = int(table["fallback_breakout"].sum())
+    nb_fallback_pullback = int(table["fallback_pullback"].sum())
 
     logger.info(f"Actifs analysés (liquidité & data OK) : {nb_processed}")
-    logger.info(f"Candidats fallback : {len(fallback_breakout_candidates)} breakouts potentiels, {len(fallback_pullback_candidates)} pullbacks potentiels.")
+    logger.info(f"Candidats fallback : {nb_fallback_breakout} breakouts potentiels, {nb_fallback_pullback} pullbacks potentiels.")
     logger.info(f"Signaux stricts : {len(breakout_picks)} breakouts, {len(pullback_picks)} pullbacks.")
 
     # ================
     # FALLBACK
     # ================
 
-    if not breakout_picks and fallback_breakout_candidates:
+    if not breakout_picks and nb_fallback_breakout:
         logger.info("⚠️ Aucun breakout strict. On utilise le fallback (top breakouts relatifs).")
-        fallback_breakout_candidates.sort(key=lambda x: x["score"], reverse=True)
-        for cand in fallback_breakout_candidates[:FALLBACK_MAX_BREAKOUT]:
-            breakout_picks[cand["symbol"]] = {
-                "name": cand["symbol"],
-                "score": round(cand["score"], 2),
-                "entry_price": cand["price"],
-                "stop_loss": cand["stop_loss"],
-                "vol_ratio": round(cand["vol_ratio"], 2),
-                "rsi": round(cand["rsi"], 1),
-                "trend_pct": round(cand["trend_pct"], 2),
-                "dollar_vol_avg20": round(cand["dollar_vol_avg20"], 0),
-                "history": cand["history"]
-            }
-
-    if not pullback_picks and fallback_pullback_candidates:
+        top = ranked(table, "fallback_breakout", "score_breakout", decimals=None)
+        for symbol, row in top.head(FALLBACK_MAX_BREAKOUT).iterrows():
+            breakout_picks[symbol] = _breakout_pick(symbol, row, history(symbol))
+
+    if not pullback_picks and nb_fallback_pullback:
         logger.info("⚠️ Aucun pullback strict. On utilise le fallback (top pullbacks relatifs).")
-        fallback_pullback_candidates.sort(key=lambda x: x["score"], reverse=True)
-        for cand in fallback_pullback_candidates[:FALLBACK_MAX_PULLBACK]:
-            pullback_picks[cand["symbol"]] = {
-                "name": cand["symbol"],
-                "score": round(cand["score"], 2),
-                "entry_price": cand["price"],
-                "stop_loss": cand["stop_loss"],
-                "rsi": round(cand["rsi"], 1),
-                "trend_pct": round(cand["trend_pct"], 2),
-                "dollar_vol_avg20": round(cand["dollar_vol_avg20"], 0),
-                "history": cand["history"]
-            }
+        top = ranked(table, "fallback_pullback", "score_pullback", decimals=None)
+        for symbol, row in top.head(FALLBACK_MAX_PULLBACK).iterrows():
+            pullback_picks[symbol] = _pullback_pick(symbol, row, history(symbol))
 
     breakout_sorted = dict(sorted(breakout_picks.items(), key=lambda x: x[1]["score"], reverse=True))
     pullback_sorted = dict(sorted(pullback_picks.items(), key=lambda x: x[1]["score"], reverse=True))
 
+    metrics.incr("crypto.eligible", nb_processed)
+    metrics.incr("crypto.picks.breakout", len(breakout_sorted))
+    metrics.incr("crypto.picks.pullback", len(pullback_sorted))
     logger.info(f"✅ RÉSULTAT FINAL : {len(breakout_sorted)} Breakouts | {len(pullback_sorted)} Pullbacks")
     return pullback_sorted, breakout_sorted
 
@@ -377,7 +493,7 @@ def analyze_market() -> Tuple[Dict, Dict]:
 
 if __name__ == "__main__":
     pullback_data, breakout_data = analyze_market()
-    today = pd.Timestamp.now().strftime("%d/%m/%Y")
+    today = fixtures.now().strftime("%d/%m/%Y")
 
     print(f"Nb breakouts crypto : {len(breakout_data)}")
     print(f"Nb pullbacks crypto : {len(pullback_data)}")
@@ -388,3 +504,4 @@ if __name__ == "__main__":
         json.dump({"date_mise_a_jour": today, "picks": breakout_data}, f, indent=4)
 
     print("💾 Fichiers Crypto sauvegardés.")
+    metrics.save("crypto_scanner")
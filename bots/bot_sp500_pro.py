@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import io
 import os
 import json
 import time
@@ -7,8 +8,15 @@ import logging
 import requests
 from typing import Dict, Tuple, List
 
+import numpy as np
 import pandas as pd
-import yfinance as yf
+
+import fixtures
+import indicator_state
+import market_data
+import metrics
+import universe_store
+from panel import Panel, indicator_cross_sections, ranked
 
 # =========================
 # CONFIG GLOBALE
@@ -18,6 +26,40 @@ MIN_CANDLES = 220
 MIN_DOLLAR_VOL = 5_000_000    
 SLEEP_BETWEEN_CALLS = 0.05    
 
+# Téléchargement groupé : un seul yf.download pour BATCH_SIZE tickers
+USE_BATCH_DOWNLOAD = True
+BATCH_SIZE = 100
+
+# Historique analysé (servi par market_data : mémoire, store disque, puis réseau)
+HISTORY_YEARS = 2
+MAX_STALE_DAYS = 5            # dernière bougie plus vieille => ticker ignoré (délisté, fetch raté)
+
+# Indicateurs mis à jour bougie par bougie depuis l'état persisté (indicator_state)
+# au lieu d'être recalculés sur tout l'historique (ignoré en mode fixtures)
+INCREMENTAL_INDICATORS = True
+
+# Seuils des règles vectorisées (score_universe), surchargeables par param_sweep.py
+SCORING_PARAMS = {
+    "breakout_vol_ratio": 2.0,          # volume / moyenne 20j minimum
+    "breakout_trend_range": (0.03, 0.4),
+    "breakout_vol_range": (2.0, 5.0),
+    "breakout_rsi_range": (55, 70),
+    "breakout_stop_factor": 0.95,       # stop = min(low J-1, close * facteur)
+    "pullback_trend_min": 0.05,
+    "pullback_band": 0.03,              # distance max à la SMA50
+    "pullback_rsi_max": 60,
+    "pullback_trend_range": (0.05, 0.4),
+    "pullback_rsi_range": (45, 60),
+    "pullback_stop_factor": 0.95,       # stop = SMA50 * facteur
+}
+
+# Composition du S&P 500 : snapshot local réutilisé pendant UNIVERSE_TTL secondes
+UNIVERSE_TTL = 7 * 24 * 3600
+FALLBACK_TICKERS = {
+    "AAPL": "Apple Inc.", "MSFT": "Microsoft", "GOOGL": "Alphabet", 
+    "AMZN": "Amazon", "NVDA": "Nvidia", "TSLA": "Tesla", "META": "Meta Platforms"
+}
+
 DATA_DIR = "data"
 PULLBACK_FILE = os.path.join(DATA_DIR, "sp500_pullback_pro.json")
 BREAKOUT_FILE = os.path.join(DATA_DIR, "sp500_breakout_pro.json")
@@ -50,14 +92,32 @@ def normalize(value: float, min_val: float, max_val: float, clip: bool = True) -
     if clip: x = max(0.0, min(1.0, x))
     return x
 
+def normalize_array(values, min_val: float, max_val: float, clip: bool = True) -> np.ndarray:
+    """
+    normalize élément par élément, mêmes résultats au bit près
+    (y compris NaN -> 1.0 et -0.0 -> 0.0, comme max(0.0, min(1.0, x))).
+    """
+    values = np.asarray(values, dtype="float64")
+    if max_val == min_val: return np.zeros_like(values)
+    x = (values - min_val) / (max_val - min_val)
+    if clip:
+        x = np.where(x < 1.0, x, 1.0)
+        x = np.where(x > 0.0, x, 0.0)
+    return x
+
 
 # =========================
 # RÉCUPÉRATION TICKERS & NOMS
 # =========================
 
-def get_sp500_tickers() -> Dict[str, str]:
+def _get_text(url: str, headers: Dict[str, str]) -> str:
+    response = requests.get(url, headers=headers, timeout=10)
+    response.raise_for_status()
+    return response.text
+
+def scrape_sp500_tickers() -> Dict[str, str]:
     """
-    Récupère un dictionnaire {Ticker: Nom de la société} depuis Wikipédia.
+    Récupère un dictionnaire {Ticker: Nom de la société} depuis Wikipédia (lève en cas d'échec).
     """
     url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
     
@@ -66,60 +126,80 @@ def get_sp500_tickers() -> Dict[str, str]:
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     }
 
-    try:
-        logger.info("Récupération S&P 500 (Tickers + Noms)...")
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        tables = pd.read_html(response.text)
-        df = tables[0]
-        
-        # On crée un mapping Ticker -> Nom de la boite
-        # Ex: "NVDA" -> "Nvidia"
-        tickers_map = {}
-        for index, row in df.iterrows():
-            ticker = row["Symbol"].replace(".", "-")
-            name = row["Security"]
-            tickers_map[ticker] = name
-
-        logger.info(f"✅ {len(tickers_map)} sociétés récupérées.")
-        return tickers_map
+    logger.info("Récupération S&P 500 (Tickers + Noms)...")
+    html = fixtures.recorded("wikipedia", {"url": url}, lambda: _get_text(url, headers))
+    
+    tables = pd.read_html(io.StringIO(html))
+    df = tables[0]
+    
+    # On crée un mapping Ticker -> Nom de la boite
+    # Ex: "NVDA" -> "Nvidia"
+    tickers = df["Symbol"].astype(str).str.replace(".", "-", regex=False)
+    tickers_map = dict(zip(tickers, df["Security"]))
 
-    except Exception as e:
-        logger.warning(f"⚠️ Échec Wikipédia: {e}. Fallback.")
-        return {
-            "AAPL": "Apple Inc.", "MSFT": "Microsoft", "GOOGL": "Alphabet", 
-            "AMZN": "Amazon", "NVDA": "Nvidia", "TSLA": "Tesla", "META": "Meta Platforms"
-        }
+    logger.info(f"✅ {len(tickers_map)} sociétés récupérées.")
+    return tickers_map
+
+def get_sp500_tickers() -> Dict[str, str]:
+    """
+    {Ticker: Nom} depuis le snapshot local (rafraîchi tous les UNIVERSE_TTL) ;
+    Wikipédia en panne => dernier snapshot valide, puis liste de secours.
+    """
+    return universe_store.resolve("sp500", scrape_sp500_tickers, UNIVERSE_TTL, FALLBACK_TICKERS)
 
 
 # =========================
 # DATA YFINANCE
 # =========================
 
-def fetch_ohlcv_yf(ticker: str) -> pd.DataFrame | None:
-    try:
-        df = yf.download(
-            ticker, period="2y", interval="1d", auto_adjust=False, progress=False, threads=False
-        )
-
-        if df is None or df.empty: return None
+def _clean_ohlcv(df: pd.DataFrame | None) -> pd.DataFrame | None:
+    """
+    Validation commune (mode unitaire et mode groupé) :
+    colonnes OHLCV présentes et au moins MIN_CANDLES bougies.
+    """
+    if df is None or df.empty: return None
 
-        if isinstance(df.columns, pd.MultiIndex):
-            try: df.columns = df.columns.get_level_values(0)
-            except: pass
+    required = ['Open', 'High', 'Low', 'Close', 'Volume']
+    if not all(col in df.columns for col in required): return None
+    if len(df) < MIN_CANDLES: return None
 
-        if 'Close' not in df.columns and 'Adj Close' in df.columns:
-            df['Close'] = df['Adj Close']
+    return df
 
-        required = ['Open', 'High', 'Low', 'Close', 'Volume']
-        if not all(col in df.columns for col in required): return None
-        if len(df) < MIN_CANDLES: return None
+def _is_stale(df: pd.DataFrame) -> bool:
+    age = fixtures.now().normalize() - df.index[-1].normalize()
+    return age > pd.Timedelta(days=MAX_STALE_DAYS)
 
+def fetch_ohlcv_yf(ticker: str) -> pd.DataFrame | None:
+    try:
+        df = market_data.get_history("sp500", ticker, pd.DateOffset(years=HISTORY_YEARS))
+        if df is None or df.empty:
+            metrics.incr("sp500.rejected.no_data"); return None
+        if _is_stale(df):
+            metrics.incr("sp500.rejected.stale"); return None
+        df = _clean_ohlcv(df)
+        if df is None: metrics.incr("sp500.rejected.short_or_incomplete")
         return df
     except Exception as e:
+        metrics.incr("sp500.rejected.error")
         return None
 
+def fetch_ohlcv_yf_batch(tickers: List[str], chunk_size: int = BATCH_SIZE) -> Dict[str, pd.DataFrame]:
+    """
+    Précharge l'univers par paquets de `chunk_size` tickers (un appel yf.download
+    multi-tickers par paquet, seulement les bougies récentes pour les tickers déjà stockés)
+    et renvoie {ticker: OHLCV} pour les séries valides.
+    """
+    market_data.prefetch("sp500", tickers, chunk_size=chunk_size)
+
+    frames: Dict[str, pd.DataFrame] = {}
+    for ticker in tickers:
+        df = fetch_ohlcv_yf(ticker)
+        if df is not None:
+            frames[ticker] = df
+
+    logger.info(f"Download groupé : {len(frames)}/{len(tickers)} séries valides.")
+    return frames
+
 
 # =========================
 # INDICATEURS
@@ -136,6 +216,27 @@ def compute_indicators(df: pd.DataFrame) -> pd.DataFrame:
     df["High_20"] = df["High"].rolling(20).max()
     return df
 
+def compute_indicators_panel(panel: Panel) -> Panel:
+    """
+    compute_indicators pour tout l'univers en une passe (DataFrames dates × tickers).
+    Valeurs identiques au calcul par ticker pour tout historique contigu sur l'axe des dates.
+    """
+    close, high, volume = panel["Close"], panel["High"], panel["Volume"]
+    present = close.notna()
+    nobs = present.cumsum()
+
+    ind = dict(panel)
+    ind["SMA_200"] = calculate_sma(close, 200)
+    ind["SMA_50"] = calculate_sma(close, 50)
+    # les dates sans cotation donnent delta=0 (comme la 1re bougie d'un ticker) :
+    # on masque les RSI dont la fenêtre déborde avant le début du ticker
+    ind["RSI"] = calculate_rsi(close, 14).where(nobs >= 14)
+    ind["Vol_Avg"] = calculate_sma(volume, 20)
+    ind["DollarVol"] = close * volume
+    ind["DollarVol_Avg20"] = calculate_sma(ind["DollarVol"], 20)
+    ind["High_20"] = high.rolling(20).max()
+    return {name: frame.where(present) for name, frame in ind.items()}
+
 def liquidity_filter(curr: pd.Series) -> bool:
     if pd.isna(curr.get("DollarVol_Avg20", None)): return False
     return curr["DollarVol_Avg20"] >= MIN_DOLLAR_VOL
@@ -185,76 +286,155 @@ def pullback_score(curr: pd.Series) -> float:
     return score * 100.0
 
 
+# =========================
+# SCORING VECTORISÉ (toute la coupe transversale d'un coup)
+# =========================
+
+def _col(cs: pd.DataFrame, name: str) -> np.ndarray:
+    if name not in cs: return np.full(len(cs), np.nan)
+    return cs[name].to_numpy(dtype="float64")
+
+def phoenix_breakout_score_vec(curr: pd.DataFrame, params: Dict = SCORING_PARAMS) -> np.ndarray:
+    """phoenix_breakout_score pour chaque ligne de `curr` (tickers × indicateurs)."""
+    price, sma200, rsi = _col(curr, "Close"), _col(curr, "SMA_200"), _col(curr, "RSI")
+    volume, vol_avg, high_20 = _col(curr, "Volume"), _col(curr, "Vol_Avg"), _col(curr, "High_20")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vol_ratio = np.where(vol_avg > 0, volume / vol_avg, 0.0)
+        trend_pct = (price - sma200) / sma200
+        dist = (high_20 - price) / high_20
+
+    trend_score = normalize_array(trend_pct, *params["breakout_trend_range"])
+    vol_score = normalize_array(vol_ratio, *params["breakout_vol_range"])
+    rsi_score = normalize_array(rsi, *params["breakout_rsi_range"])
+    high_score = np.where(np.isnan(high_20) | (high_20 == 0), 0.0, normalize_array(1 - dist, 0.8, 1.0))
+
+    score = (0.40 * trend_score + 0.30 * vol_score + 0.20 * rsi_score + 0.10 * high_score)
+    return score * 100.0
+
+def pullback_score_vec(curr: pd.DataFrame, params: Dict = SCORING_PARAMS) -> np.ndarray:
+    """pullback_score pour chaque ligne de `curr` (tickers × indicateurs)."""
+    price, sma200, sma50, rsi = _col(curr, "Close"), _col(curr, "SMA_200"), _col(curr, "SMA_50"), _col(curr, "RSI")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        trend_strength = (price - sma200) / sma200
+        dist = np.abs((price - sma50) / sma50)
+
+    band = params["pullback_band"]
+    trend_score = normalize_array(trend_strength, *params["pullback_trend_range"])
+    pb_score = np.where((sma50 == 0) | np.isnan(sma50), 0.0, normalize_array(band - dist, 0.0, band))
+    rsi_score = normalize_array(rsi, *params["pullback_rsi_range"])
+
+    score = (0.5 * trend_score + 0.3 * pb_score + 0.2 * rsi_score)
+    return score * 100.0
+
+def score_universe(curr: pd.DataFrame, prev: pd.DataFrame, params: Dict = SCORING_PARAMS) -> pd.DataFrame:
+    """
+    Filtres, scores et stops de tout l'univers en une passe (une ligne par ticker).
+    Mêmes règles et mêmes valeurs que l'ancienne boucle ligne par ligne avec SCORING_PARAMS.
+    """
+    price, sma200, sma50 = _col(curr, "Close"), _col(curr, "SMA_200"), _col(curr, "SMA_50")
+    rsi, dollar_vol = _col(curr, "RSI"), _col(curr, "DollarVol_Avg20")
+    volume, vol_avg = _col(curr, "Volume"), _col(curr, "Vol_Avg")
+    prev_close, prev_low = _col(prev, "Close"), _col(prev, "Low")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vol_ratio = np.where(vol_avg > 0, volume / vol_avg, 0.0)
+        trend = (price - sma200) / sma200
+        dist_sma50 = np.abs((price - sma50) / sma50)
+
+    eligible = ~np.isnan(sma200) & ~(price <= 0)
+    eligible &= ~np.isnan(dollar_vol) & (dollar_vol >= MIN_DOLLAR_VOL)   # liquidity_filter
+
+    breakout = eligible & (price > sma200) & (price > prev_close) & (vol_ratio > params["breakout_vol_ratio"])
+    near_sma50 = ~np.isnan(sma50) & (dist_sma50 <= params["pullback_band"])
+    pullback = eligible & (trend > params["pullback_trend_min"]) & near_sma50 & (rsi < params["pullback_rsi_max"])
+
+    # min(prev_low, price * 0.95) avec la sémantique de min() (NaN compris)
+    stop_price = price * params["breakout_stop_factor"]
+    stop_breakout = np.where(stop_price < prev_low, stop_price, prev_low)
+    # STOP LOSS AJUSTÉ : 5% sous la SMA50 pour laisser de la marge de respiration
+    stop_pullback = sma50 * params["pullback_stop_factor"]
+
+    return pd.DataFrame(
+        {
+            "price": price,
+            "rsi": rsi,
+            "trend": trend,
+            "vol_ratio": vol_ratio,
+            "eligible": eligible,
+            "breakout": breakout,
+            "pullback": pullback,
+            "score_breakout": phoenix_breakout_score_vec(curr, params),
+            "score_pullback": pullback_score_vec(curr, params),
+            "stop_breakout": stop_breakout,
+            "stop_pullback": stop_pullback,
+        },
+        index=curr.index,
+    )
+
+
 # =========================
 # ANALYSE
 # =========================
 
 def analyze_market() -> Tuple[Dict, Dict]:
-    tickers_map = get_sp500_tickers() # Récupère {Ticker: Nom}
+    with metrics.stage("universe"):
+        tickers_map = get_sp500_tickers() # Récupère {Ticker: Nom}
+    metrics.incr("sp500.universe", len(tickers_map))
     
     pullback_picks = {}
     breakout_picks = {}
 
     logger.info(f"Analyse S&P 500 sur {len(tickers_map)} sociétés...")
 
-    for i, (ticker, company_name) in enumerate(tickers_map.items(), 1):
-        if i % 20 == 0: time.sleep(SLEEP_BETWEEN_CALLS)
+    with metrics.stage("fetch"):
+        if USE_BATCH_DOWNLOAD:
+            frames = fetch_ohlcv_yf_batch(list(tickers_map))
+        else:
+            frames = {}
+            for i, ticker in enumerate(tickers_map, 1):
+                if i % 20 == 0: time.sleep(SLEEP_BETWEEN_CALLS)
+                df = fetch_ohlcv_yf(ticker)
+                if df is not None: frames[ticker] = df
+    metrics.incr("sp500.valid_series", len(frames))
+
+    # Indicateurs : état incrémental par ticker, ou tout l'univers en une passe (panel dates × tickers)
+    with metrics.stage("indicators"):
+        if INCREMENTAL_INDICATORS and not fixtures.active():
+            last_bars, prev_bars = indicator_state.cross_sections("sp500", frames, compute_indicators)
+        else:
+            last_bars, prev_bars = indicator_cross_sections(frames, compute_indicators_panel, compute_indicators)
+
+    with metrics.stage("scoring"):
+        table = score_universe(last_bars, prev_bars)
+
+    # --- BREAKOUT ---
+    for ticker, row in ranked(table, "breakout", "score_breakout").iterrows():
+        breakout_picks[ticker] = {
+            "name": tickers_map[ticker], # Nom complet ici
+            "ticker": ticker,            # Ticker séparé
+            "score": round(float(row["score_breakout"]), 2),
+            "entry_price": round(float(row["price"]), 2),
+            "stop_loss": round(float(row["stop_breakout"]), 2),
+            "vol_ratio": round(float(row["vol_ratio"]), 2),
+            "rsi": round(float(row["rsi"]), 1),
+            "trend_pct": round(float(row["trend"])*100, 2),
+            "history": frames[ticker]["Close"].tail(30).round(2).tolist(),
+        }
 
-        df = fetch_ohlcv_yf(ticker)
-        if df is None: continue
-
-        try:
-            df = compute_indicators(df)
-            curr = df.iloc[-1]
-            prev = df.iloc[-2]
-            price = float(curr["Close"])
-
-            if pd.isna(curr["SMA_200"]) or price <= 0: continue
-            if not liquidity_filter(curr): continue
-
-            # --- BREAKOUT ---
-            vol_ratio = curr["Volume"] / curr["Vol_Avg"] if curr["Vol_Avg"] > 0 else 0
-            if (price > curr["SMA_200"]) and (price > float(prev["Close"])) and (vol_ratio > 2.0):
-                score_br = phoenix_breakout_score(curr, prev)
-                stop_loss = min(float(prev["Low"]), price * 0.95)
-
-                breakout_picks[ticker] = {
-                    "name": company_name, # Nom complet ici
-                    "ticker": ticker,     # Ticker séparé
-                    "score": round(score_br, 2),
-                    "entry_price": round(price, 2),
-                    "stop_loss": round(stop_loss, 2),
-                    "vol_ratio": round(vol_ratio, 2),
-                    "rsi": round(float(curr["RSI"]), 1),
-                    "trend_pct": round(((price - curr["SMA_200"])/curr["SMA_200"])*100, 2),
-                    "history": df["Close"].tail(30).round(2).tolist(),
-                }
-
-            # --- PULLBACK ---
-            sma50 = curr["SMA_50"]
-            trend = (price - curr["SMA_200"]) / curr["SMA_200"]
-            near_sma50 = (not pd.isna(sma50) and abs((price - sma50) / sma50) <= 0.03)
-
-            if trend > 0.05 and near_sma50 and curr["RSI"] < 60:
-                score_pb = pullback_score(curr)
-                
-                # STOP LOSS AJUSTÉ : On baisse à 5% sous la SMA50 (au lieu de 3%)
-                # Pour laisser plus de marge de respiration
-                stop_loss = sma50 * 0.95 
-
-                pullback_picks[ticker] = {
-                    "name": company_name, # Nom complet
-                    "ticker": ticker,     # Ticker séparé
-                    "score": round(score_pb, 2),
-                    "entry_price": round(price, 2),
-                    "stop_loss": round(stop_loss, 2),
-                    "rsi": round(float(curr["RSI"]), 1),
-                    "trend_pct": round(trend*100, 2),
-                    "history": df["Close"].tail(30).round(2).tolist(),
-                }
-
-        except Exception:
-            continue
+    # --- PULLBACK ---
+    for ticker, row in ranked(table, "pullback", "score_pullback").iterrows():
+        pullback_picks[ticker] = {
+            "name": tickers_map[ticker], # Nom complet
+            "ticker": ticker,            # Ticker séparé
+            "score": round(float(row["score_pullback"]), 2),
+            "entry_price": round(float(row["price"]), 2),
+            "stop_loss": round(float(row["stop_pullback"]), 2),
+            "rsi": round(float(row["rsi"]), 1),
+            "trend_pct": round(float(row["trend"])*100, 2),
+            "history": frames[ticker]["Close"].tail(30).round(2).tolist(),
+        }
 
     # Tris
     breakout_sorted = dict(sorted(breakout_picks.items(), key=lambda x: x[1]["score"], reverse=True))
@@ -264,6 +444,9 @@ def analyze_market() -> Tuple[Dict, Dict]:
     # On ne garde que les 5 meilleurs scores pour le Pullback
     pullback_top5 = dict(list(pullback_sorted.items())[:5])
 
+    metrics.incr("sp500.eligible", int(table["eligible"].sum()))
+    metrics.incr("sp500.picks.breakout", len(breakout_sorted))
+    metrics.incr("sp500.picks.pullback", len(pullback_top5))
     logger.info(f"{len(breakout_sorted)} breakouts | {len(pullback_top5)} pullbacks (Top 5)")
     return pullback_top5, breakout_sorted # On renvoie le top 5
 
@@ -271,7 +454,7 @@ def analyze_market() -> Tuple[Dict, Dict]:
 if __name__ == "__main__":
     os.makedirs(DATA_DIR, exist_ok=True)
     pb_data, br_data = analyze_market()
-    today = pd.Timestamp.now().strftime("%d/%m/%Y")
+    today = fixtures.now().strftime("%d/%m/%Y")
 
     with open(PULLBACK_FILE, "w") as f:
         json.dump({"date_mise_a_jour": today, "picks": pb_data}, f, indent=4)
@@ -279,4 +462,5 @@ if __name__ == "__main__":
     with open(BREAKOUT_FILE, "w") as f:
         json.dump({"date_mise_a_jour": today, "picks": br_data}, f, indent=4)
 
-    logger.info("Fichiers sauvegardés.")
\ No newline at end of file
+    logger.info("Fichiers sauvegardés.")
+    metrics.save("sp500_scanner")
\ No newline at end of file
@@ -0,0 +1,177 @@
+# bots/breakdowns.py
+
+import os
+import json
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import metrics
+import trade_results
+import trade_stats
+
+# Découpages de la performance par stratégie (clé "<universe>_<strategy>") :
+# - "monthly" : stats des trades par mois de sortie
+# - "rolling" : stats des ROLLING_TRADES derniers trades clôturés
+#
+# Calcul incrémental : l'état (sommes trade_stats.TOTALS par mois, derniers trades par
+# stratégie) est conservé à côté de la table des trades et seuls les trades clôturés
+# depuis le run précédent y sont ajoutés.
+# data/cache/results/<résumé>.breakdowns.json
+ROLLING_TRADES = trade_stats.ROLLING_WINDOW
+
+logger = logging.getLogger("breakdowns")
+
+
+def state_path(out_path: str, root: str = trade_results.RESULTS_DIR) -> str:
+    name = os.path.splitext(os.path.basename(out_path))[0]
+    return os.path.join(root, f"{name}.breakdowns.json")
+
+
+class Breakdowns:
+    """
+    Sommes par (stratégie, mois de sortie) et derniers trades par stratégie, alimentées
+    par lots de trades (add). `trades` = nombre de lignes de table déjà intégrées.
+    """
+
+    def __init__(self, keys: List[str], window: int = ROLLING_TRADES):
+        self.keys = list(keys)
+        self.window = window
+        self.trades = 0
+        self.months: Dict[str, Dict[str, Dict[str, float]]] = {key: {} for key in self.keys}
+        # derniers trades par stratégie, triés par (date de sortie, id) : [date, id, R, be]
+        self.recent: Dict[str, List[list]] = {key: [] for key in self.keys}
+
+    def to_dict(self) -> Dict:
+        return {
+            "keys": self.keys,
+            "window": self.window,
+            "trades": self.trades,
+            "months": self.months,
+            "recent": self.recent,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Breakdowns":
+        state = cls(data["keys"], data["window"])
+        state.trades = data["trades"]
+        state.months = data["months"]
+        state.recent = data["recent"]
+        return state
+
+    def add(self, table: np.ndarray) -> bool:
+        """
+        Ajoute un lot de trades. Renvoie False (état inchangé) si un trade du lot est antérieur
+        aux derniers trades déjà retenus : la fenêtre glissante ne peut plus être exacte,
+        l'état doit être reconstruit depuis la table complète.
+        """
+        keys = np.char.add(np.char.add(table["universe"].astype(str), "_"), table["strategy"].astype(str))
+        R = np.asarray(table["R"], dtype=float)
+        days = table["exit_date"].astype("datetime64[D]")
+        valid = np.isfinite(R) & ~np.isnat(days) & np.isin(keys, self.keys)
+
+        keys, R, days, ids = keys[valid], R[valid], days[valid], table["id"][valid].astype(str)
+        be = table["exit_reason"][valid] == trade_stats.BE_LABEL
+        dates = days.astype(str)
+
+        # Fenêtre glissante : fusion des derniers trades connus et du lot, dans l'ordre de sortie
+        recent = {}
+        for key in self.keys:
+            mask = keys == key
+            batch = [[d, i, float(r), bool(b)] for d, i, r, b in zip(dates[mask], ids[mask], R[mask], be[mask])]
+            known = self.recent[key]
+            if batch and len(known) >= self.window and min((d, i) for d, i, _, _ in batch) < tuple(known[0][:2]):
+                return False
+            recent[key] = sorted(known + batch, key=lambda t: (t[0], t[1]))[-self.window:]
+
+        # Sommes par (stratégie, mois) du lot, en une passe groupée
+        months = days.astype("datetime64[M]").astype(str)
+        labels, group = np.unique(np.char.add(np.char.add(keys, "|"), months), return_inverse=True)
+        totals = trade_stats.group_totals(group.ravel(), len(labels), R, be)
+        for g, label in enumerate(labels):
+            key, month = str(label).split("|")
+            acc = self.months[key].setdefault(month, {field: 0.0 for field in trade_stats.TOTALS})
+            for field in trade_stats.TOTALS:
+                acc[field] += float(totals[field][g])
+
+        self.recent = recent
+        self.trades += len(table)
+        return True
+
+    def report(self) -> Dict[str, Dict]:
+        """{clé: {"monthly": {YYYY-MM: stats}, "rolling": stats des `window` derniers trades}}."""
+        report = {}
+        for key in self.keys:
+            recent = self.recent[key]
+            R = np.array([t[2] for t in recent], dtype=float)
+            be = np.array([t[3] for t in recent], dtype=bool)
+            totals = trade_stats.group_totals(np.zeros(len(R), dtype=int), 1, R, be)
+            report[key] = {
+                "monthly": {
+                    month: trade_stats.base_stats(acc) for month, acc in sorted(self.months[key].items())
+                },
+                "rolling": {
+                    "window": self.window,
+                    "from": recent[0][0] if recent else None,
+                    "to": recent[-1][0] if recent else None,
+                    **trade_stats.base_stats({field: values[0] for field, values in totals.items()}),
+                },
+            }
+        return report
+
+
+def load_state(path: str) -> Optional[Breakdowns]:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return Breakdowns.from_dict(json.load(f))
+    except Exception as e:
+        logger.warning(f"État des breakdowns illisible {path}: {e}")
+        return None
+
+
+def save_state(state: Breakdowns, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state.to_dict(), f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def update(
+    results: np.ndarray,
+    previous: Optional[np.ndarray],
+    path: str,
+    keys: List[str],
+    window: int = ROLLING_TRADES,
+    incremental: bool = True,
+) -> Dict[str, Dict]:
+    """
+    Breakdowns de la table `results`. `previous` est la table du run précédent : si l'état
+    stocké lui correspond et qu'elle est contenue dans `results` (trades CLOSED repris tels
+    quels), seuls les trades absents de `previous` sont ajoutés ; sinon tout est recalculé.
+    """
+    state = load_state(path) if incremental else None
+    new = None
+    if (
+        state is not None
+        and previous is not None
+        and state.keys == list(keys)
+        and state.window == window
+        and state.trades == len(previous)
+    ):
+        known = np.isin(results["id"], previous["id"])
+        if int(known.sum()) == len(previous):
+            new = results[~known]
+
+    if new is not None and state.add(new):
+        metrics.incr("breakdowns.incremental_trades", len(new))
+    else:
+        state = Breakdowns(keys, window)
+        state.add(results)
+        metrics.incr("breakdowns.rebuilds")
+
+    save_state(state, path)
+    return state.report()
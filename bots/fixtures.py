@@ -0,0 +1,155 @@
+# bots/fixtures.py
+
+import os
+import json
+import time
+import pickle
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import pandas as pd
+
+# Enregistrement / rejeu des sources externes (Wikipédia, CoinGecko, yfinance, Binance) :
+# - "off"    : appels réseau normaux (défaut, cron)
+# - "record" : appels réseau normaux, chaque réponse est aussi écrite dans FIXTURES_DIR
+# - "replay" : aucune requête, les réponses enregistrées sont resservies depuis la mémoire
+#
+#   MOMENTUM_FIXTURES=record python bots/bot_sp500_pro.py
+#   MOMENTUM_FIXTURES=replay python bots/bot_sp500_pro.py
+#
+# Une réponse est identifiée par (source, arguments de la requête) :
+# data/fixtures/<source>/<sha1 des arguments>.pkl
+# En rejeu, l'heure courante (now / time) est celle de l'enregistrement : les filtres de
+# fraîcheur des scanners donnent le même résultat qu'au moment de la capture.
+MODES = ("off", "record", "replay")
+MODE = os.environ.get("MOMENTUM_FIXTURES", "off")
+FIXTURES_DIR = os.environ.get("MOMENTUM_FIXTURES_DIR", os.path.join("data", "fixtures"))
+
+MANIFEST = "manifest.json"
+
+_lock = threading.Lock()
+_payloads: Dict[str, bytes] = {}        # réponses déjà lues (rejeu à vitesse mémoire)
+_recorded_at: Optional[float] = None
+
+
+class FixtureMissing(LookupError):
+    """Réponse absente du dossier de fixtures en mode replay."""
+
+
+def configure(mode: str = MODE, root: str = FIXTURES_DIR):
+    global MODE, FIXTURES_DIR, _recorded_at
+    if mode not in MODES:
+        raise ValueError(f"mode de fixtures inconnu '{mode}' (attendu : {', '.join(MODES)})")
+    with _lock:
+        MODE, FIXTURES_DIR = mode, root
+        _payloads.clear()
+        _recorded_at = None
+
+
+@contextmanager
+def session(mode: str, root: str = FIXTURES_DIR) -> Iterator[None]:
+    """Mode de fixtures temporaire (benchmarks, runs de non-régression)."""
+    saved = (MODE, FIXTURES_DIR)
+    configure(mode, root)
+    try:
+        yield
+    finally:
+        configure(*saved)
+
+
+def active() -> bool:
+    return MODE != "off"
+
+
+# =========================
+# HORLOGE
+# =========================
+
+def _manifest_path() -> str:
+    return os.path.join(FIXTURES_DIR, MANIFEST)
+
+
+def recorded_at() -> Optional[float]:
+    """Date (epoch) de l'enregistrement rejoué, None si aucun manifest."""
+    global _recorded_at
+    if _recorded_at is None:
+        try:
+            with open(_manifest_path(), "r") as f:
+                _recorded_at = float(json.load(f)["recorded_at"])
+        except Exception:
+            return None
+    return _recorded_at
+
+
+def time_now() -> float:
+    """time.time(), figé à la date d'enregistrement en mode replay."""
+    if MODE == "replay":
+        frozen = recorded_at()
+        if frozen is not None:
+            return frozen
+    return time.time()
+
+
+def now() -> pd.Timestamp:
+    """pd.Timestamp.now() (heure locale naïve), figé à la date d'enregistrement en mode replay."""
+    if MODE == "replay":
+        frozen = recorded_at()
+        if frozen is not None:
+            return pd.Timestamp.fromtimestamp(frozen)
+    return pd.Timestamp.now()
+
+
+# =========================
+# RÉPONSES
+# =========================
+
+def fixture_path(source: str, key: Any) -> str:
+    digest = hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return os.path.join(FIXTURES_DIR, source, f"{digest}.pkl")
+
+
+def _write(path: str, payload: bytes):
+    global _recorded_at
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+    os.replace(tmp, path)
+
+    # Horloge de l'enregistrement : posée à la première réponse de la session
+    with _lock:
+        _payloads[path] = payload
+        if _recorded_at is None:
+            _recorded_at = time.time()
+            with open(_manifest_path(), "w") as f:
+                json.dump({"recorded_at": _recorded_at}, f)
+
+
+def recorded(source: str, key: Any, fetch: Callable[[], Any]) -> Any:
+    """
+    Réponse de `fetch()` pour la requête `key` de `source`, selon MODE :
+    appel direct, appel + enregistrement, ou rejeu (FixtureMissing si jamais enregistrée).
+    Chaque rejeu renvoie une copie indépendante (désérialisée depuis la mémoire).
+    """
+    if MODE == "off":
+        return fetch()
+
+    path = fixture_path(source, key)
+
+    if MODE == "record":
+        result = fetch()
+        _write(path, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL))
+        return result
+
+    with _lock:
+        payload = _payloads.get(path)
+    if payload is None:
+        if not os.path.exists(path):
+            raise FixtureMissing(f"{source}: aucune réponse enregistrée pour {key!r} ({path})")
+        with open(path, "rb") as f:
+            payload = f.read()
+        with _lock:
+            _payloads[path] = payload
+    return pickle.loads(payload)
@@ -2,7 +2,7 @@
 
 import os
 import json
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, Iterator, List, Tuple
 
 import pandas as pd
 
@@ -18,6 +18,11 @@ CSV_CONFIG: Dict[Tuple[str, str], str] = {
     ("crypto", "pullback"): "data/backtest_crypto_pullback.csv",
 }
 
+# Lecture des CSV par blocs de CHUNK_SIZE lignes : le parsing texte reste borné, mais les
+# signaux nettoyés (colonnes typées) sont tous gardés pour le tri global, donc la mémoire
+# croît avec le nombre de signaux valides.
+CHUNK_SIZE = 50_000
+
 # On attend au minimum ces colonnes dans chaque CSV :
 # - date_signal
 # - ticker
@@ -25,21 +30,6 @@ CSV_CONFIG: Dict[Tuple[str, str], str] = {
 # - stop_loss
 
 
-def load_csv_safe(path: str) -> pd.DataFrame:
-    """Charge un CSV ou renvoie un DataFrame vide si problème."""
-    if not os.path.exists(path):
-        print(f"[WARN] Fichier introuvable : {path}")
-        return pd.DataFrame()
-
-    try:
-        df = pd.read_csv(path)
-    except Exception as e:
-        print(f"[WARN] Erreur de lecture CSV {path}: {e}")
-        return pd.DataFrame()
-
-    return df
-
-
 def normalize_columns(df: pd.DataFrame, path: str) -> pd.DataFrame:
     """
     S'assure que le DataFrame possède les colonnes attendues.
@@ -95,100 +85,151 @@ def normalize_columns(df: pd.DataFrame, path: str) -> pd.DataFrame:
     return df_norm
 
 
-def build_backtest_log() -> List[Dict]:
+def iter_csv_chunks(path: str) -> Iterator[pd.DataFrame]:
+    """Lit un CSV par blocs de CHUNK_SIZE lignes (rien si fichier absent ou illisible)."""
+    if not os.path.exists(path):
+        print(f"[WARN] Fichier introuvable : {path}")
+        return
+
+    try:
+        for chunk in pd.read_csv(path, chunksize=CHUNK_SIZE):
+            yield chunk
+    except Exception as e:
+        print(f"[WARN] Erreur de lecture CSV {path}: {e}")
+
+
+def clean_signals(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Construit la liste des entrées de log à partir des 4 CSV.
-    Format de sortie compatible avec log_signals.py / perf_summary.py.
+    Typage et filtrage vectorisés d'un bloc normalisé :
+    dates ISO, tickers en majuscules, prix numériques > 0. Les lignes invalides sont écartées.
+    Format de date déterminé ligne par ligne (format="mixed") : le résultat ne dépend ni de
+    la 1re ligne du bloc ni du découpage en blocs.
     """
-    all_entries: List[Dict] = []
+    dates = pd.to_datetime(df["date_signal"], format="mixed", errors="coerce")
+    entry_price = pd.to_numeric(df["entry_price"], errors="coerce")
+    stop_loss = pd.to_numeric(df["stop_loss"], errors="coerce")
 
-    for (universe, strategy), path in CSV_CONFIG.items():
-        df = load_csv_safe(path)
-        if df.empty:
-            print(f"[INFO] {path}: DataFrame vide, on skip.")
-            continue
+    ok = dates.notna() & df["ticker"].notna() & (entry_price > 0) & (stop_loss > 0)
+
+    return pd.DataFrame(
+        {
+            "date_signal": dates[ok].dt.strftime("%Y-%m-%d"),
+            "ticker": df.loc[ok, "ticker"].astype(str).str.strip().str.upper(),
+            "entry_price": entry_price[ok].astype("float64"),
+            "stop_loss": stop_loss[ok].astype("float64"),
+        }
+    )
 
+
+def build_backtest_frame() -> pd.DataFrame:
+    """
+    Signaux des 4 CSV sous forme colonnaire (une ligne par signal),
+    triés par date / univers / stratégie / ticker.
+    """
+    parts: List[pd.DataFrame] = []
+
+    for (universe, strategy), path in CSV_CONFIG.items():
+        n_rows = 0
+        n_dropped = 0
         try:
-            df = normalize_columns(df, path)
+            for chunk in iter_csv_chunks(path):
+                clean = clean_signals(normalize_columns(chunk, path))
+                clean["universe"] = universe
+                clean["strategy"] = strategy
+                parts.append(clean)
+                n_rows += len(clean)
+                n_dropped += len(chunk) - len(clean)
         except ValueError as e:
             print(f"[ERROR] {e}")
             continue
 
-        # Normalisation des types
-        df["date_signal"] = pd.to_datetime(df["date_signal"])
-        df = df.dropna(subset=["date_signal", "ticker", "entry_price", "stop_loss"])
-
-        # Boucle sur les lignes
-        for _, row in df.iterrows():
-            date_iso = row["date_signal"].date().isoformat()
-            ticker = str(row["ticker"]).strip().upper()
-
-            try:
-                entry_price = float(row["entry_price"])
-                stop_loss = float(row["stop_loss"])
-            except Exception:
-                # ligne pourrie → on skip
-                continue
-
-            if entry_price <= 0 or stop_loss <= 0:
-                continue
-
-            _id = f"{universe}_{strategy}_{ticker}_{date_iso}"
-
-            entry = {
-                "id": _id,
-                "date_signal": date_iso,
-                "ticker": ticker,
-                "universe": universe,
-                "strategy": strategy,
-                "initial_data": {
-                    "close_j": entry_price,
-                    "stop_loss_technical": stop_loss,
-                },
-                "trade_status": "PENDING",
-                "execution": {
-                    "entry_price": None,
-                    "entry_date": None,
-                    "exit_price": None,
-                    "exit_date": None,
-                    "exit_reason": None,  # "SL", "BE", "TIME"
-                    "breakeven_activated": False,
-                    "slippage": {
-                        "entry_factor": 1.001,
-                        "exit_factor": 0.999,
-                    },
-                },
-            }
-
-            all_entries.append(entry)
+        if n_rows == 0:
+            print(f"[INFO] {path}: DataFrame vide ({n_dropped} lignes invalides écartées), on skip.")
+            continue
 
         print(
-            f"[INFO] {path}: ajout de {len(df)} signaux "
-            f"pour {universe}_{strategy}"
+            f"[INFO] {path}: ajout de {n_rows} signaux "
+            f"pour {universe}_{strategy} ({n_dropped} lignes invalides écartées)"
         )
 
-    # Tri pour avoir un fichier propre / stable
-    all_entries_sorted = sorted(
-        all_entries,
-        key=lambda e: (
-            e.get("date_signal", ""),
-            e.get("universe", ""),
-            e.get("strategy", ""),
-            e.get("ticker", ""),
-        ),
+    columns = ["date_signal", "universe", "strategy", "ticker", "entry_price", "stop_loss"]
+    if not parts:
+        return pd.DataFrame(columns=columns)
+
+    frame = pd.concat(parts, ignore_index=True)[columns]
+
+    # Tri stable pour avoir un fichier propre / stable
+    return frame.sort_values(["date_signal", "universe", "strategy", "ticker"], kind="mergesort", ignore_index=True)
+
+
+def iter_log_entries(frame: pd.DataFrame) -> Iterator[Dict]:
+    """
+    Entrées de log construites une à une à partir du tableau colonnaire.
+    Format de sortie compatible avec log_signals.py / perf_summary.py.
+    """
+    columns = zip(
+        frame["date_signal"].tolist(),
+        frame["ticker"].tolist(),
+        frame["universe"].tolist(),
+        frame["strategy"].tolist(),
+        frame["entry_price"].tolist(),
+        frame["stop_loss"].tolist(),
     )
 
-    return all_entries_sorted
+    for date_iso, ticker, universe, strategy, entry_price, stop_loss in columns:
+        yield {
+            "id": f"{universe}_{strategy}_{ticker}_{date_iso}",
+            "date_signal": date_iso,
+            "ticker": ticker,
+            "universe": universe,
+            "strategy": strategy,
+            "initial_data": {
+                "close_j": entry_price,
+                "stop_loss_technical": stop_loss,
+            },
+            "trade_status": "PENDING",
+            "execution": {
+                "entry_price": None,
+                "entry_date": None,
+                "exit_price": None,
+                "exit_date": None,
+                "exit_reason": None,  # "SL", "BE", "TIME"
+                "breakeven_activated": False,
+                "slippage": {
+                    "entry_factor": 1.001,
+                    "exit_factor": 0.999,
+                },
+            },
+        }
+
+
+def build_backtest_log() -> List[Dict]:
+    """Liste complète des entrées de log (pour usage en librairie ; main() écrit en streaming)."""
+    return list(iter_log_entries(build_backtest_frame()))
+
+
+def write_json_stream(entries: Iterable[Dict], path: str) -> int:
+    """
+    Écrit la liste JSON entrée par entrée, octet pour octet comme json.dump(log, f, indent=2),
+    sans jamais garder toutes les entrées en mémoire. Renvoie le nombre d'entrées.
+    """
+    count = 0
+    with open(path, "w") as f:
+        for entry in entries:
+            body = json.dumps(entry, indent=2).replace("\n", "\n  ")
+            f.write(("[\n  " if count == 0 else ",\n  ") + body)
+            count += 1
+        f.write("\n]" if count else "[]")
+    return count
 
 
 def main():
-    log = build_backtest_log()
+    frame = build_backtest_frame()
 
     os.makedirs(os.path.dirname(OUT_PATH), exist_ok=True)
-    with open(OUT_PATH, "w") as f:
-        json.dump(log, f, indent=2)
+    count = write_json_stream(iter_log_entries(frame), OUT_PATH)
 
-    print(f"[OK] Backtest log généré : {OUT_PATH} ({len(log)} signaux)")
+    print(f"[OK] Backtest log généré : {OUT_PATH} ({count} signaux)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,660 @@
+# bots/indicator_state.py
+
+import os
+import json
+import math
+import logging
+import argparse
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from ohlcv_store import index_to_ns
+
+# État incrémental des indicateurs, un par (univers, ticker), persisté à côté du store OHLCV :
+# data/cache/indicators/<universe>.json -> {ticker: état}
+# Chaque run n'applique que les bougies arrivées depuis le run précédent, en O(1) par bougie.
+# La dernière bougie (éventuellement incomplète : bougie du jour Binance) n'est jamais
+# intégrée à l'état : elle est évaluée à part (peek), puis intégrée au run suivant.
+#
+# `window_bars` (crypto : HISTORY_LIMIT du scanner) : les indicateurs suivent compute_indicators
+# appliqué aux `window_bars` dernières bougies seulement, comme dans le scanner. Les fenêtres
+# glissantes n'en dépendent pas ; les EMA (et le RSI de Wilder) sont ré-ancrées sur le début
+# de la fenêtre (WindowedEma), en accord à VERIFY_RTOL près (écarts d'arrondi flottant).
+STORE_DIR = os.path.join("data", "cache", "indicators")
+
+# Vérification : chaque résultat incrémental est comparé au recalcul complet
+VERIFY = os.environ.get("MOMENTUM_VERIFY_INDICATORS", "") == "1"
+VERIFY_RTOL = 1e-8
+VERIFY_ATOL = 1e-8
+
+logger = logging.getLogger("indicator_state")
+
+# (nom, type, colonne source, fenêtre) ; mêmes définitions que compute_indicators des bots
+# - sma         : moyenne glissante (rolling(window).mean())
+# - sma_200_90  : SMA 200, ou SMA 90 tant que moins de 200 bougies (règle du scanner crypto)
+# - ema         : ewm(span=window, adjust=False)
+# - rsi         : RSI à moyennes simples (S&P 500)
+# - rsi_wilder  : RSI lissé de Wilder, ewm(alpha=1/window, adjust=False) (crypto)
+# - max         : maximum glissant (rolling(window).max())
+Spec = List[Tuple[str, str, str, int]]
+
+SPECS: Dict[str, Spec] = {
+    "sp500": [
+        ("SMA_200", "sma", "Close", 200),
+        ("SMA_50", "sma", "Close", 50),
+        ("RSI", "rsi", "Close", 14),
+        ("Vol_Avg", "sma", "Volume", 20),
+        ("DollarVol_Avg20", "sma", "DollarVol", 20),
+        ("High_20", "max", "High", 20),
+    ],
+    "crypto": [
+        ("SMA_200", "sma_200_90", "Close", 200),
+        ("EMA_13", "ema", "Close", 13),
+        ("EMA_21", "ema", "Close", 21),
+        ("EMA_50", "ema", "Close", 50),
+        ("RSI", "rsi_wilder", "Close", 14),
+        ("Vol_Avg", "sma", "Volume", 20),
+        ("DollarVol_Avg20", "sma", "DollarVol", 20),
+        ("High_20", "max", "High", 20),
+    ],
+}
+
+BAR_FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+# =========================
+# PRIMITIVES (push = intègre une valeur, peek = valeur si on l'intégrait)
+# =========================
+
+class RollingMean:
+    """
+    rolling(window).mean() : somme glissante + tampon des `window` dernières valeurs.
+    NaN dès qu'une valeur de la fenêtre est NaN. La somme est recalculée exactement (fsum)
+    à chaque tour complet du tampon : O(1) amorti, sans dérive d'arrondi.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.buf: deque = deque()
+        self.total = 0.0
+        self.nans = 0
+        self.pushes = 0
+
+    def _leaving(self) -> float:
+        return self.buf[0] if len(self.buf) == self.window else 0.0
+
+    def peek(self, x: float) -> float:
+        if len(self.buf) + 1 < self.window:
+            return math.nan
+        out = self._leaving()
+        nans = self.nans + math.isnan(x) - (len(self.buf) == self.window and math.isnan(out))
+        if nans:
+            return math.nan
+        return (self.total - (0.0 if math.isnan(out) else out) + x) / self.window
+
+    def push(self, x: float):
+        if len(self.buf) == self.window:
+            out = self.buf.popleft()
+            if math.isnan(out):
+                self.nans -= 1
+            else:
+                self.total -= out
+        self.buf.append(x)
+        if math.isnan(x):
+            self.nans += 1
+        else:
+            self.total += x
+        self.pushes += 1
+        if self.pushes % self.window == 0:
+            self.total = math.fsum(v for v in self.buf if not math.isnan(v))
+
+    def value(self) -> float:
+        if len(self.buf) < self.window or self.nans:
+            return math.nan
+        return self.total / self.window
+
+    def to_dict(self) -> Dict:
+        return {"buf": list(self.buf), "pushes": self.pushes}
+
+    @classmethod
+    def from_dict(cls, window: int, data: Dict) -> "RollingMean":
+        obj = cls(window)
+        obj.buf = deque(data["buf"])
+        obj.nans = sum(math.isnan(v) for v in obj.buf)
+        obj.total = math.fsum(v for v in obj.buf if not math.isnan(v))
+        obj.pushes = data["pushes"]
+        return obj
+
+
+class RollingMax:
+    """rolling(window).max() : deque monotone décroissante de (position, valeur)."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.dq: deque = deque()
+        self.nan_pos: deque = deque()      # positions des NaN encore dans la fenêtre
+        self.n = 0
+
+    def _front(self, start: int) -> float:
+        # maximum des valeurs de position >= start (deque décroissante : au plus 2 éléments lus)
+        for pos, v in self.dq:
+            if pos >= start:
+                return v
+        return -math.inf
+
+    def peek(self, x: float) -> float:
+        if self.n + 1 < self.window:
+            return math.nan
+        start = self.n + 1 - self.window
+        if math.isnan(x) or (self.nan_pos and self.nan_pos[-1] >= start):
+            return math.nan
+        return max(self._front(start), x)
+
+    def push(self, x: float):
+        pos = self.n
+        self.n += 1
+        start = self.n - self.window
+        if math.isnan(x):
+            self.nan_pos.append(pos)
+        else:
+            while self.dq and self.dq[-1][1] <= x:
+                self.dq.pop()
+            self.dq.append((pos, x))
+        while self.dq and self.dq[0][0] < start:
+            self.dq.popleft()
+        while self.nan_pos and self.nan_pos[0] < start:
+            self.nan_pos.popleft()
+
+    def value(self) -> float:
+        if self.n < self.window or self.nan_pos:
+            return math.nan
+        return self.dq[0][1]
+
+    def to_dict(self) -> Dict:
+        return {"dq": [list(item) for item in self.dq], "nan_pos": list(self.nan_pos), "n": self.n}
+
+    @classmethod
+    def from_dict(cls, window: int, data: Dict) -> "RollingMax":
+        obj = cls(window)
+        obj.dq = deque((int(p), v) for p, v in data["dq"])
+        obj.nan_pos = deque(data["nan_pos"])
+        obj.n = data["n"]
+        return obj
+
+
+class Ema:
+    """ewm(alpha, adjust=False).mean() sur une série sans NaN."""
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.y = math.nan
+
+    def peek(self, x: float) -> float:
+        if math.isnan(self.y):
+            return x
+        return (1.0 - self.alpha) * self.y + self.alpha * x
+
+    def push(self, x: float):
+        self.y = self.peek(x)
+
+    def value(self) -> float:
+        return self.y
+
+    def to_dict(self) -> Dict:
+        return {"y": self.y}
+
+    @classmethod
+    def from_dict(cls, alpha: float, data: Dict) -> "Ema":
+        obj = cls(alpha)
+        obj.y = data["y"]
+        return obj
+
+
+class WindowedEma:
+    """
+    ewm(alpha, adjust=False) sur les `window_bars` dernières bougies seulement, en O(1), à l'arrondi
+    flottant près (les derniers bits diffèrent du recalcul pandas).
+    L'EMA complète y et l'EMA de la fenêtre ne diffèrent que par leur point de départ s :
+        y_fenêtre(t) = y(t) + (1 - alpha)^(t - s) * (graine(s) - y(s))
+    avec graine(s) = x(s), ou 0 pour les gains / pertes du RSI (1er delta de la fenêtre NaN).
+    """
+
+    def __init__(self, alpha: float, window_bars: int, zero_seed: bool = False):
+        self.full = Ema(alpha)
+        self.window_bars = window_bars
+        self.zero_seed = zero_seed
+        self.decay = (1.0 - alpha) ** (window_bars - 1)
+        self.hist: deque = deque(maxlen=window_bars)     # (x, y) des dernières bougies intégrées
+        self.count = 0
+
+    def _anchored(self, y: float, start: Tuple[float, float]) -> float:
+        x_s, y_s = start
+        seed = 0.0 if self.zero_seed else x_s
+        return y + self.decay * (seed - y_s)
+
+    def peek(self, x: float) -> float:
+        y = self.full.peek(x)
+        if self.count + 1 <= self.window_bars:
+            return y
+        return self._anchored(y, self.hist[len(self.hist) + 1 - self.window_bars])
+
+    def push(self, x: float):
+        self.full.push(x)
+        self.hist.append((x, self.full.y))
+        self.count += 1
+
+    def value(self) -> float:
+        if self.count <= self.window_bars:
+            return self.full.value()
+        return self._anchored(self.full.y, self.hist[0])
+
+    def to_dict(self) -> Dict:
+        return {"y": self.full.y, "hist": [list(item) for item in self.hist], "count": self.count}
+
+    @classmethod
+    def from_dict(cls, alpha: float, window_bars: int, zero_seed: bool, data: Dict) -> "WindowedEma":
+        obj = cls(alpha, window_bars, zero_seed)
+        obj.full.y = data["y"]
+        obj.hist.extend(tuple(item) for item in data["hist"])
+        obj.count = data["count"]
+        return obj
+
+
+def _ema(alpha: float, window_bars: Optional[int], zero_seed: bool = False):
+    return WindowedEma(alpha, window_bars, zero_seed) if window_bars else Ema(alpha)
+
+
+def _load_ema(alpha: float, window_bars: Optional[int], data: Dict, zero_seed: bool = False):
+    if window_bars:
+        return WindowedEma.from_dict(alpha, window_bars, zero_seed, data)
+    return Ema.from_dict(alpha, data)
+
+
+def _rsi(gain: float, loss: float) -> float:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = np.float64(gain) / np.float64(loss)
+        return float(100 - (100 / (1 + rs)))
+
+
+class Rsi:
+    """
+    RSI sur moyennes simples (simple=True) ou de Wilder : le 1er delta (NaN) compte
+    comme gain = perte = 0, comme delta.where(delta > 0, 0) dans les bots.
+    """
+
+    def __init__(self, window: int, simple: bool, window_bars: Optional[int] = None):
+        self.simple = simple
+        self.gain = RollingMean(window) if simple else _ema(1 / window, window_bars, zero_seed=True)
+        self.loss = RollingMean(window) if simple else _ema(1 / window, window_bars, zero_seed=True)
+        self.prev_close = math.nan
+
+    def _split(self, close: float) -> Tuple[float, float]:
+        delta = close - self.prev_close
+        return (delta if delta > 0 else 0.0), (-delta if delta < 0 else 0.0)
+
+    def peek(self, close: float) -> float:
+        g, l = self._split(close)
+        return _rsi(self.gain.peek(g), self.loss.peek(l))
+
+    def push(self, close: float):
+        g, l = self._split(close)
+        self.gain.push(g)
+        self.loss.push(l)
+        self.prev_close = close
+
+    def value(self) -> float:
+        return _rsi(self.gain.value(), self.loss.value())
+
+    def to_dict(self) -> Dict:
+        return {"gain": self.gain.to_dict(), "loss": self.loss.to_dict(), "prev_close": self.prev_close}
+
+    @classmethod
+    def from_dict(cls, window: int, simple: bool, data: Dict, window_bars: Optional[int] = None) -> "Rsi":
+        obj = cls(window, simple, window_bars)
+        if simple:
+            obj.gain = RollingMean.from_dict(window, data["gain"])
+            obj.loss = RollingMean.from_dict(window, data["loss"])
+        else:
+            obj.gain = _load_ema(1 / window, window_bars, data["gain"], zero_seed=True)
+            obj.loss = _load_ema(1 / window, window_bars, data["loss"], zero_seed=True)
+        obj.prev_close = data["prev_close"]
+        return obj
+
+
+class SmaLongShort:
+    """SMA `window` dès que `window` bougies ont été vues, SMA 90 avant (règle du scanner crypto)."""
+
+    SHORT = 90
+
+    def __init__(self, window: int):
+        self.window = window
+        self.long = RollingMean(window)
+        self.short = RollingMean(self.SHORT)
+        self.count = 0
+
+    def peek(self, x: float) -> float:
+        return (self.long if self.count + 1 >= self.window else self.short).peek(x)
+
+    def push(self, x: float):
+        self.long.push(x)
+        self.short.push(x)
+        self.count += 1
+
+    def value(self) -> float:
+        return (self.long if self.count >= self.window else self.short).value()
+
+    def to_dict(self) -> Dict:
+        return {"long": self.long.to_dict(), "short": self.short.to_dict(), "count": self.count}
+
+    @classmethod
+    def from_dict(cls, window: int, data: Dict) -> "SmaLongShort":
+        obj = cls(window)
+        obj.long = RollingMean.from_dict(window, data["long"])
+        obj.short = RollingMean.from_dict(cls.SHORT, data["short"])
+        obj.count = data["count"]
+        return obj
+
+
+def _make(kind: str, window: int, window_bars: Optional[int] = None):
+    if kind == "sma":
+        return RollingMean(window)
+    if kind == "sma_200_90":
+        return SmaLongShort(window)
+    if kind == "ema":
+        return _ema(2 / (window + 1), window_bars)
+    if kind in ("rsi", "rsi_wilder"):
+        return Rsi(window, simple=kind == "rsi", window_bars=window_bars)
+    if kind == "max":
+        return RollingMax(window)
+    raise ValueError(f"indicateur inconnu : {kind}")
+
+
+def _load(kind: str, window: int, data: Dict, window_bars: Optional[int] = None):
+    if kind == "sma":
+        return RollingMean.from_dict(window, data)
+    if kind == "sma_200_90":
+        return SmaLongShort.from_dict(window, data)
+    if kind == "ema":
+        return _load_ema(2 / (window + 1), window_bars, data)
+    if kind in ("rsi", "rsi_wilder"):
+        return Rsi.from_dict(window, kind == "rsi", data, window_bars)
+    if kind == "max":
+        return RollingMax.from_dict(window, data)
+    raise ValueError(f"indicateur inconnu : {kind}")
+
+
+# =========================
+# ÉTAT D'UN TICKER
+# =========================
+
+def _inputs(bar: Dict[str, float]) -> Dict[str, float]:
+    return {**bar, "DollarVol": bar["Close"] * bar["Volume"]}
+
+
+class IndicatorState:
+    """
+    Indicateurs d'un ticker après sa dernière bougie intégrée (`last_ts`, ns epoch),
+    calculés sur les `window_bars` dernières bougies (None = tout l'historique fourni).
+    """
+
+    def __init__(self, spec: Spec, window_bars: Optional[int] = None):
+        self.spec = spec
+        self.window_bars = window_bars
+        self.items = {name: _make(kind, window, window_bars) for name, kind, _, window in spec}
+        self.last_ts: Optional[int] = None
+        self.last_close = math.nan
+
+    def push(self, ts: int, bar: Dict[str, float]):
+        """Intègre une bougie complète, en O(1)."""
+        values = _inputs(bar)
+        for name, _, source, _ in self.spec:
+            self.items[name].push(values[source])
+        self.last_ts = ts
+        self.last_close = bar["Close"]
+
+    def peek(self, bar: Dict[str, float]) -> Dict[str, float]:
+        """Ligne d'indicateurs si `bar` était intégrée (l'état n'est pas modifié), en O(1)."""
+        values = _inputs(bar)
+        row = dict(values)
+        for name, _, source, _ in self.spec:
+            row[name] = self.items[name].peek(values[source])
+        return row
+
+    def values(self) -> Dict[str, float]:
+        return {name: self.items[name].value() for name, _, _, _ in self.spec}
+
+    def to_dict(self) -> Dict:
+        return {
+            "window_bars": self.window_bars,
+            "last_ts": self.last_ts,
+            "last_close": self.last_close,
+            "items": {name: item.to_dict() for name, item in self.items.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, spec: Spec, data: Dict, window_bars: Optional[int] = None) -> "IndicatorState":
+        if data.get("window_bars") != window_bars:
+            raise ValueError(f"état sur {data.get('window_bars')} bougies, {window_bars} attendues")
+        obj = cls(spec, window_bars)
+        obj.items = {name: _load(kind, window, data["items"][name], window_bars) for name, kind, _, window in spec}
+        obj.last_ts = data["last_ts"]
+        obj.last_close = data["last_close"]
+        return obj
+
+
+def bar_axis(df: pd.DataFrame, index_col: Optional[str] = None) -> np.ndarray:
+    """Axe des bougies en ns epoch : index daté, ou colonne `index_col` en ms (frames Binance)."""
+    if index_col:
+        return df[index_col].to_numpy(dtype="int64") * 1_000_000
+    return index_to_ns(pd.DatetimeIndex(df.index))
+
+
+def advance(
+    state: Optional[IndicatorState],
+    spec: Spec,
+    df: pd.DataFrame,
+    index_col: Optional[str] = None,
+    window_bars: Optional[int] = None,
+) -> Tuple[IndicatorState, Dict[str, float], Dict[str, float], int]:
+    """
+    Met l'état à jour avec toutes les bougies de `df` sauf la dernière, puis évalue la dernière.
+    L'état est reconstruit depuis le début de `df` s'il est absent ou ne colle plus à l'historique
+    (bougie de reprise disparue ou modifiée). Renvoie (état, ligne courante, ligne précédente,
+    nombre de bougies intégrées). Avec `window_bars`, la ligne précédente porte les indicateurs de la
+    fenêtre finissant à cette bougie (le scoring n'en lit que Close / Low).
+    """
+    ts = bar_axis(df, index_col)
+    bars = {f: df[f].to_numpy(dtype="float64") for f in BAR_FIELDS}
+
+    start = 0
+    if state is not None and state.last_ts is not None:
+        pos = int(np.searchsorted(ts, state.last_ts))
+        if pos < len(ts) - 1 and ts[pos] == state.last_ts and bars["Close"][pos] == state.last_close:
+            start = pos + 1
+        else:
+            state = None
+    if state is None:
+        state = IndicatorState(spec, window_bars)
+        metrics.incr("indicators.rebuilds")
+
+    for i in range(start, len(ts) - 1):
+        state.push(int(ts[i]), {f: float(bars[f][i]) for f in BAR_FIELDS})
+
+    prev = {f: float(bars[f][-2]) for f in BAR_FIELDS} if len(ts) > 1 else {f: math.nan for f in BAR_FIELDS}
+    prev.update(state.values())
+    curr = state.peek({f: float(bars[f][-1]) for f in BAR_FIELDS})
+    return state, curr, prev, len(ts) - 1 - start
+
+
+# =========================
+# STORE
+# =========================
+
+class IndicatorStore:
+    """États incrémentaux d'un univers : un fichier JSON {ticker: état}."""
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+
+    def path(self, universe: str) -> str:
+        return os.path.join(self.root, f"{universe}.json")
+
+    def load(self, universe: str, window_bars: Optional[int] = None) -> Dict[str, IndicatorState]:
+        path = self.path(universe)
+        if not os.path.exists(path):
+            return {}
+        spec = SPECS[universe]
+        try:
+            with open(path, "r") as f:
+                raw = json.load(f)
+            return {ticker: IndicatorState.from_dict(spec, data, window_bars) for ticker, data in raw.items()}
+        except Exception as e:
+            logger.warning(f"États d'indicateurs illisibles {path}: {e}. Reconstruction.")
+            return {}
+
+    def save(self, universe: str, states: Dict[str, IndicatorState]):
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(universe)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({ticker: state.to_dict() for ticker, state in states.items()}, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+
+def _mismatches(row: Dict[str, float], ref: pd.Series, names: List[str]) -> List[str]:
+    bad = []
+    for name in names:
+        a, b = row[name], float(ref[name])
+        if not (np.isnan(a) and np.isnan(b)) and not np.isclose(a, b, rtol=VERIFY_RTOL, atol=VERIFY_ATOL):
+            bad.append(f"{name} {a!r} != {b!r}")
+    return bad
+
+
+def cross_sections(
+    universe: str,
+    frames: Dict[str, pd.DataFrame],
+    compute_single: Callable[[pd.DataFrame], pd.DataFrame],
+    index_col: Optional[str] = None,
+    store: Optional[IndicatorStore] = None,
+    verify: bool = VERIFY,
+    window_bars: Optional[int] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Équivalent incrémental de panel.indicator_cross_sections : (dernière bougie, bougie précédente)
+    par ticker, dans l'ordre de `frames`, à partir des états persistés.
+    Un historique avec des Close manquants est recalculé en entier avec `compute_single`.
+    `window_bars` : longueur des frames du scanner (ses EMA partent de la 1re bougie de la frame).
+    verify=True compare chaque ligne au recalcul complet (écarts logués et comptés).
+    """
+    if not frames:
+        return pd.DataFrame(), pd.DataFrame()
+
+    store = store or IndicatorStore(STORE_DIR)
+    spec = SPECS[universe]
+    names = [name for name, _, _, _ in spec]
+    states = store.load(universe, window_bars)
+
+    curr_rows, prev_rows = {}, {}
+    for ticker, df in frames.items():
+        if len(df) == 0:
+            continue
+        if df["Close"].isna().any():
+            full = compute_single(df)
+            curr_rows[ticker] = full.iloc[-1]
+            if len(full) > 1:
+                prev_rows[ticker] = full.iloc[-2]
+            states.pop(ticker, None)
+            metrics.incr("indicators.full_recomputes")
+            continue
+
+        state, curr, prev, applied = advance(states.get(ticker), spec, df, index_col, window_bars)
+        states[ticker] = state
+        curr_rows[ticker], prev_rows[ticker] = curr, prev
+        metrics.incr("indicators.bars_applied", applied)
+
+        if verify:
+            bad = _mismatches(curr, compute_single(df).iloc[-1], names)
+            if bad:
+                logger.warning(f"{universe}/{ticker}: indicateurs incrémentaux divergents ({'; '.join(bad)})")
+                metrics.incr("indicators.verify_mismatches")
+
+    store.save(universe, states)
+
+    order = list(frames)
+    curr = pd.DataFrame.from_dict(curr_rows, orient="index")
+    prev = pd.DataFrame.from_dict(prev_rows, orient="index")
+    return curr.reindex(order), prev.reindex(order)
+
+
+# =========================
+# VÉRIFICATION HORS LIGNE
+# =========================
+
+def verify_history(
+    universe: str,
+    df: pd.DataFrame,
+    compute_single: Callable[[pd.DataFrame], pd.DataFrame],
+    index_col: Optional[str] = None,
+    window_bars: Optional[int] = None,
+) -> List[str]:
+    """
+    Rejoue `df` bougie par bougie (un run par bougie, état sérialisé entre deux runs) et compare
+    chaque ligne au recalcul complet sur la frame du run : tout l'historique jusqu'à la bougie,
+    ou ses `window_bars` dernières bougies (frame glissante du scanner crypto). Renvoie les écarts.
+    """
+    spec = SPECS[universe]
+    names = [name for name, _, _, _ in spec]
+    full = compute_single(df) if window_bars is None else None
+    state = None
+    errors = []
+    for end in range(2, len(df) + 1):
+        if state is not None:
+            state = IndicatorState.from_dict(spec, json.loads(json.dumps(state.to_dict())), window_bars)
+        frame = df.iloc[:end] if window_bars is None else df.iloc[max(0, end - window_bars):end]
+        state, curr, _, _ = advance(state, spec, frame, index_col, window_bars)
+        if window_bars is None:
+            # la SMA 200/90 crypto dépend de la longueur totale : seule la dernière bougie est comparable
+            if universe == "crypto" and end < len(df):
+                continue
+            ref = full.iloc[end - 1]
+        else:
+            ref = compute_single(frame).iloc[-1]
+        errors += [f"bougie {end - 1}: {e}" for e in _mismatches(curr, ref, names)]
+    return errors
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Vérifie les indicateurs incrémentaux contre le recalcul complet.")
+    parser.add_argument("--universe", choices=sorted(SPECS), default="sp500")
+    parser.add_argument("--limit", type=int, default=20, help="nombre de tickers stockés vérifiés")
+    args = parser.parse_args(argv)
+
+    from ohlcv_store import OhlcvStore
+    if args.universe == "sp500":
+        import bot_sp500_pro as bot
+    else:
+        import bot_crypto_pro as bot
+
+    store = OhlcvStore()
+    tickers = store.tickers(args.universe)[:args.limit]
+    # mêmes frames que le scanner : fenêtre de HISTORY_LIMIT bougies côté crypto
+    window_bars = bot.HISTORY_LIMIT if args.universe == "crypto" else None
+    failures = 0
+    for ticker in tickers:
+        df = store.load(args.universe, ticker)
+        if df is None or len(df) < 2 or df["Close"].isna().any():
+            continue
+        errors = verify_history(args.universe, df, bot.compute_indicators, window_bars=window_bars)
+        if errors:
+            failures += 1
+            logger.warning(f"{ticker}: {len(errors)} écarts, ex. {errors[0]}")
+    logger.info(f"{args.universe}: {len(tickers) - failures}/{len(tickers)} tickers conformes.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    main()
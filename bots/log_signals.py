@@ -4,7 +4,12 @@ import json
 import os
 import pandas as pd
 
-LOG_PATH = "data/signals_log.json"
+import metrics
+from signals_store import PartitionedSignalLog
+
+# Log partitionné par univers et par mois, append-only : seuls les nouveaux signaux
+# sont écrits, dans la partition de leur mois (voir signals_store)
+LOG_PATH = "data/signals_log"
 
 SOURCES = [
     ("data/sp500_breakout_pro.json", "sp500", "phoenix"),
@@ -24,38 +29,9 @@ def load_json_safe(path: str):
         return None
 
 
-def load_signals_log():
-    if not os.path.exists(LOG_PATH):
-        return []
-    try:
-        with open(LOG_PATH, "r") as f:
-            data = json.load(f)
-            return data if isinstance(data, list) else []
-    except Exception:
-        return []
-
-
-def save_signals_log(log):
-    # tri pour garder un truc propre
-    log_sorted = sorted(
-        log,
-        key=lambda e: (
-            e.get("date_signal", ""),
-            e.get("universe", ""),
-            e.get("strategy", ""),
-            e.get("ticker", ""),
-        ),
-    )
-    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
-    with open(LOG_PATH, "w") as f:
-        json.dump(log_sorted, f, indent=2)
-
-
 def main():
-    log = load_signals_log()
-
-    existing_ids = {entry.get("id") for entry in log if "id" in entry}
-    new_entries = 0
+    signal_log = PartitionedSignalLog(LOG_PATH)
+    new_log_entries = []
 
     for path, universe, strategy in SOURCES:
         data = load_json_safe(path)
@@ -76,6 +52,9 @@ def main():
         if not isinstance(picks, dict):
             continue
 
+        # ids déjà loggés lus depuis l'index de la seule partition du jour, sans charger le log
+        existing_ids = signal_log.ids([universe], date_iso, date_iso)
+
         for ticker, info in picks.items():
             close_j = info.get("entry_price")
             stop_loss = info.get("stop_loss")
@@ -112,13 +91,15 @@ def main():
                 },
             }
 
-            log.append(entry)
+            new_log_entries.append(entry)
             existing_ids.add(_id)
-            new_entries += 1
 
-    save_signals_log(log)
-    print(f"Signals log updated. New entries: {new_entries}")
+    with metrics.stage("append"):
+        signal_log.append(new_log_entries)
+    metrics.incr("log.new_entries", len(new_log_entries))
+    print(f"Signals log updated. New entries: {len(new_log_entries)}")
 
 
 if __name__ == "__main__":
     main()
+    metrics.save("log_signals")
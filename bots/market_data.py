@@ -0,0 +1,343 @@
+# bots/market_data.py
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import ccxt
+import pandas as pd
+import yfinance as yf
+
+import fixtures
+import metrics
+from ohlcv_store import OhlcvStore, normalize_ohlcv
+
+# =========================
+# CONFIG
+# =========================
+
+# Cache mémoire LRU (par process), borné en octets
+MEMORY_BUDGET_BYTES = 256 * 1024 * 1024
+
+# Tier disque (store OHLCV) : partagé entre les scripts du pipeline
+USE_DISK_TIER = True
+
+# Une série topée il y a moins de FRESHNESS_SECONDS est servie depuis le disque
+# sans appel réseau : chaque série n'est téléchargée qu'une fois par run du pipeline.
+FRESHNESS_SECONDS = 6 * 3600
+
+# Historique complet demandé quand le ticker n'est pas encore stocké
+SP500_PERIOD = "2y"
+CRYPTO_LIMIT = 200
+CRYPTO_TOPUP_LIMIT = 1000       # max Binance pour un fetch incrémental
+
+SP500_BATCH_SIZE = 100
+
+# Fetch concurrent Binance
+CRYPTO_MAX_WORKERS = 8
+MAX_RETRIES = 3                 # ré-essais sur erreur réseau transitoire
+RETRY_BACKOFF = 0.5             # secondes, doublé à chaque ré-essai
+
+logger = logging.getLogger("market_data")
+
+exchange_binance = ccxt.binance({"enableRateLimit": True})
+
+# lookback : nombre de bougies (int), durée (DateOffset / Timedelta) ou None = tout l'historique
+Lookback = Union[int, pd.DateOffset, pd.Timedelta, None]
+
+
+class RateLimiter:
+    """
+    Espacement minimal entre deux requêtes, partagé par tous les threads
+    (le throttle interne de ccxt n'est pas prévu pour un usage concurrent).
+    """
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._next_slot > now:
+                time.sleep(self._next_slot - now)
+                now = self._next_slot
+            self._next_slot = now + self.min_interval
+
+
+rate_limiter = RateLimiter(exchange_binance.rateLimit / 1000)
+
+
+# =========================
+# SOURCES
+# =========================
+
+def yf_download(tickers, since: Optional[pd.Timestamp] = None, **kwargs) -> pd.DataFrame:
+    """Historique complet (SP500_PERIOD) si since est None, sinon à partir de since inclus."""
+    if since is None:
+        kwargs["period"] = SP500_PERIOD
+    else:
+        kwargs["start"] = since.strftime("%Y-%m-%d")
+    return fixtures.recorded("yfinance", {"tickers": tickers, **kwargs}, lambda: _yf_download_live(tickers, kwargs))
+
+
+def _yf_download_live(tickers, kwargs: Dict) -> pd.DataFrame:
+    metrics.incr("yfinance.requests")
+    df = yf.download(tickers, interval="1d", auto_adjust=False, progress=False, **kwargs)
+    if df is not None:
+        metrics.incr("yfinance.bytes", int(df.memory_usage(index=True, deep=True).sum()))
+    return df
+
+
+def split_batch(raw: pd.DataFrame, ticker: str, batch: List[str]) -> Optional[pd.DataFrame]:
+    """
+    Extrait l'OHLCV d'un ticker d'un DataFrame MultiIndex (ticker, champ) téléchargé pour `batch`.
+    Les lignes entièrement vides (dates où le ticker ne cotait pas) sont retirées
+    pour retrouver exactement ce que renverrait un download unitaire.
+    Colonnes simples : le DataFrame n'est attribuable que si `batch` se réduit à ce ticker.
+    """
+    if raw is None or raw.empty:
+        return None
+    if not isinstance(raw.columns, pd.MultiIndex):
+        return raw.copy() if list(batch) == [ticker] else None
+    if ticker not in raw.columns.get_level_values(0):
+        return None
+
+    df = raw[ticker].copy()
+    df.columns.name = None
+    return df.dropna(how="all")
+
+
+def _prepare_yf(df: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    if df is None or df.empty:
+        return None
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = df.columns.get_level_values(0)
+    if "Close" not in df.columns and "Adj Close" in df.columns:
+        df = df.copy()
+        df["Close"] = df["Adj Close"]
+    return df
+
+
+def fetch_sp500(ticker: str, since: Optional[pd.Timestamp]) -> Optional[pd.DataFrame]:
+    return _prepare_yf(yf_download(ticker, since, threads=False))
+
+
+def _fetch_binance_raw(pair: str, since: Optional[int] = None) -> List[List[float]]:
+    """
+    Appel Binance avec respect du rate limit et ré-essais (backoff exponentiel)
+    sur les erreurs transitoires (timeout, DDoSProtection, exchange indisponible...).
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        rate_limiter.wait()
+        metrics.incr("binance.requests")
+        try:
+            if since is None:
+                ohlcv = exchange_binance.fetch_ohlcv(pair, timeframe="1d", limit=CRYPTO_LIMIT)
+            else:
+                ohlcv = exchange_binance.fetch_ohlcv(pair, timeframe="1d", since=since, limit=CRYPTO_TOPUP_LIMIT)
+            # 6 valeurs (timestamp + OHLCV) de 8 octets par bougie
+            metrics.incr("binance.bytes", 48 * len(ohlcv or []))
+            return ohlcv
+        except ccxt.NetworkError as e:
+            if attempt == MAX_RETRIES:
+                raise
+            metrics.incr("binance.retries")
+            delay = RETRY_BACKOFF * (2 ** attempt)
+            logger.debug(f"{pair}: {type(e).__name__}, nouvel essai dans {delay:.1f}s")
+            time.sleep(delay)
+    return []
+
+
+def fetch_crypto(symbol: str, since: Optional[pd.Timestamp]) -> Optional[pd.DataFrame]:
+    """OHLCV Binance {symbol}/USDT indexé par date, à partir de since inclus."""
+    since_ms = None if since is None else int(since.value // 1_000_000)
+    pair = f"{symbol}/USDT"
+    ohlcv = fixtures.recorded("binance", {"pair": pair, "since": since_ms}, lambda: _fetch_binance_raw(pair, since_ms))
+    if not ohlcv:
+        return None
+
+    df = pd.DataFrame(ohlcv, columns=["timestamp", "Open", "High", "Low", "Close", "Volume"])
+    df.index = pd.to_datetime(df["timestamp"], unit="ms")
+    return df.drop(columns="timestamp")
+
+
+# fetch(ticker, since) par univers
+SOURCES: Dict[str, Callable[[str, Optional[pd.Timestamp]], Optional[pd.DataFrame]]] = {
+    "sp500": fetch_sp500,
+    "crypto": fetch_crypto,
+}
+
+
+# =========================
+# PROVIDER
+# =========================
+
+class MarketData:
+    """
+    Point d'accès unique à l'historique OHLCV (scanners et perf_summary) :
+    cache mémoire LRU borné en octets, puis store disque optionnel, puis réseau.
+    """
+
+    def __init__(
+        self,
+        store: Optional[OhlcvStore] = None,
+        memory_budget: int = MEMORY_BUDGET_BYTES,
+        freshness: float = FRESHNESS_SECONDS,
+    ):
+        self.store = store
+        self.memory_budget = memory_budget
+        self.freshness = freshness
+        self._cache: "OrderedDict[Tuple[str, str], pd.DataFrame]" = OrderedDict()
+        self._sizes: Dict[Tuple[str, str], int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    # --- cache mémoire ---
+
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[pd.DataFrame]:
+        with self._lock:
+            df = self._cache.get(key)
+            if df is not None:
+                self._cache.move_to_end(key)
+            return df
+
+    def _cache_put(self, key: Tuple[str, str], df: pd.DataFrame):
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        with self._lock:
+            if key in self._cache:
+                self._bytes -= self._sizes.pop(key)
+                del self._cache[key]
+            self._cache[key] = df
+            self._sizes[key] = size
+            self._bytes += size
+            while self._bytes > self.memory_budget and len(self._cache) > 1:
+                old_key, _ = self._cache.popitem(last=False)
+                self._bytes -= self._sizes.pop(old_key)
+
+    # --- chargement ---
+
+    def _disk(self) -> Optional[OhlcvStore]:
+        # Enregistrement / rejeu de fixtures : store disque ignoré, pour que les requêtes
+        # (et donc les fixtures) ne dépendent pas de l'état du store
+        return None if fixtures.active() else self.store
+
+    def _is_fresh(self, universe: str, ticker: str) -> bool:
+        fetched_at = self.store.fetched_at(universe, ticker)
+        return fetched_at is not None and (time.time() - fetched_at) < self.freshness
+
+    def _load(self, universe: str, ticker: str) -> Optional[pd.DataFrame]:
+        fetch = SOURCES[universe]
+        store = self._disk()
+
+        if store is None:
+            metrics.incr(f"{universe}.full_fetches")
+            df = fetch(ticker, None)
+            return None if df is None or df.empty else normalize_ohlcv(df)
+
+        if self._is_fresh(universe, ticker):
+            metrics.incr(f"{universe}.disk_hits")
+            return store.load(universe, ticker)
+
+        metrics.incr(f"{universe}.topups")
+        return store.topup(universe, ticker, lambda since: fetch(ticker, since))
+
+    def get_history(self, universe: str, ticker: str, lookback: Lookback = None) -> Optional[pd.DataFrame]:
+        """
+        Historique OHLCV daily (index DatetimeIndex naïf) de `ticker`,
+        limité aux `lookback` dernières bougies (int) ou à la durée `lookback`.
+        """
+        key = (universe, ticker)
+        df = self._cache_get(key)
+        if df is None:
+            metrics.incr(f"{universe}.cache_misses")
+            try:
+                df = self._load(universe, ticker)
+            except Exception as e:
+                logger.warning(f"Erreur historique {universe}/{ticker}: {e}")
+                metrics.incr(f"{universe}.fetch_errors.{type(e).__name__}")
+                df = None
+            if df is None or df.empty:
+                metrics.incr(f"{universe}.fetch_errors.empty")
+                return None
+            self._cache_put(key, df)
+        else:
+            metrics.incr(f"{universe}.cache_hits")
+
+        if lookback is None:
+            return df
+        if isinstance(lookback, int):
+            return df.iloc[-lookback:]
+        start = fixtures.now().normalize() - lookback
+        return df[df.index >= start]
+
+    # --- préchargement groupé ---
+
+    def prefetch(self, universe: str, tickers: List[str], **kwargs):
+        """
+        Charge tout un univers en mémoire en minimisant les appels réseau :
+        yf.download multi-tickers pour le S&P 500, pool de threads borné pour Binance.
+        """
+        todo = [t for t in tickers if self._cache_get((universe, t)) is None]
+        if universe == "sp500":
+            self._prefetch_sp500(todo, kwargs.get("chunk_size", SP500_BATCH_SIZE))
+        else:
+            max_workers = max(1, kwargs.get("max_workers", CRYPTO_MAX_WORKERS))
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                list(pool.map(lambda t: self.get_history(universe, t), todo))
+
+    def _prefetch_sp500(self, tickers: List[str], chunk_size: int):
+        # tickers regroupés par point de reprise : un download groupé par date de départ
+        store = self._disk()
+        by_start: Dict[Optional[pd.Timestamp], List[str]] = {}
+        for ticker in tickers:
+            if store is not None and self._is_fresh("sp500", ticker):
+                self.get_history("sp500", ticker)
+                continue
+            since = store.resume_timestamp("sp500", ticker) if store is not None else None
+            by_start.setdefault(since, []).append(ticker)
+
+        for since, group in by_start.items():
+            for start in range(0, len(group), chunk_size):
+                chunk = group[start:start + chunk_size]
+                try:
+                    raw = yf_download(chunk, since, threads=True, group_by="ticker")
+                except Exception as e:
+                    logger.warning(f"⚠️ Échec download groupé ({len(chunk)} tickers): {e}. Mode unitaire.")
+                    metrics.incr(f"sp500.fetch_errors.batch_{type(e).__name__}")
+                    continue
+
+                for ticker in chunk:
+                    try:
+                        self._ingest_sp500(ticker, _prepare_yf(split_batch(raw, ticker, chunk)))
+                    except Exception as e:
+                        logger.warning(f"Erreur historique sp500/{ticker}: {e}")
+
+    def _ingest_sp500(self, ticker: str, new: Optional[pd.DataFrame]):
+        if new is None or new.empty:
+            return
+        store = self._disk()
+        if store is None:
+            df = normalize_ohlcv(new)
+        else:
+            df = store.update("sp500", ticker, new, lambda: fetch_sp500(ticker, None))
+            if df is None:
+                return
+        self._cache_put(("sp500", ticker), df)
+
+
+# Provider partagé par tous les modules d'un même process
+_default = MarketData(store=OhlcvStore() if USE_DISK_TIER else None)
+
+
+def get_history(universe: str, ticker: str, lookback: Lookback = None) -> Optional[pd.DataFrame]:
+    return _default.get_history(universe, ticker, lookback)
+
+
+def prefetch(universe: str, tickers: List[str], **kwargs):
+    _default.prefetch(universe, tickers, **kwargs)
@@ -0,0 +1,79 @@
+# bots/metrics.py
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+import pandas as pd
+
+# Métriques du run, une section par script du pipeline (écrasée à chaque exécution) :
+# data/run_metrics.json -> {"last_update": ..., "runs": {script: {date, wall_seconds, stages, counters}}}
+# - stages   : secondes passées par étape (fetch, indicators, scoring, simulate...)
+# - counters : compteurs (cache hits/misses, ré-essais, échecs par raison, octets téléchargés...)
+METRICS_PATH = "data/run_metrics.json"
+
+_lock = threading.Lock()
+_stages: Dict[str, float] = {}
+_counters: Dict[str, int] = {}
+_started = time.perf_counter()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Ajoute au temps de l'étape `name` la durée du bloc (cumulé si l'étape se répète)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _stages[name] = _stages.get(name, 0.0) + elapsed
+
+
+def incr(name: str, n: int = 1):
+    """Compteur partagé par tous les threads du process."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def reset():
+    global _started
+    with _lock:
+        _stages.clear()
+        _counters.clear()
+        _started = time.perf_counter()
+
+
+def snapshot() -> Dict:
+    with _lock:
+        return {
+            "date": pd.Timestamp.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "wall_seconds": round(time.perf_counter() - _started, 3),
+            "stages": {name: round(sec, 3) for name, sec in _stages.items()},
+            "counters": dict(sorted(_counters.items())),
+        }
+
+
+def save(script: str, path: str = METRICS_PATH) -> Dict:
+    """Écrit (ou remplace) la section `script` du fichier de métriques ; renvoie cette section."""
+    section = snapshot()
+
+    runs: Dict = {}
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                runs = json.load(f).get("runs") or {}
+        except Exception:
+            runs = {}
+    runs[script] = section
+    data = {"last_update": pd.Timestamp.utcnow().strftime("%Y-%m-%d"), "runs": runs}
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+    return section
@@ -0,0 +1,180 @@
+# bots/ohlcv_store.py
+
+import os
+import logging
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Stockage local : un fichier .npy (tableau structuré, lu en memory-map) par (univers, ticker)
+# data/cache/ohlcv/<universe>/<ticker>.npy
+STORE_DIR = os.path.join("data", "cache", "ohlcv")
+
+FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+DTYPE = np.dtype([("ts", "<i8")] + [(f, "<f8") for f in FIELDS])
+
+# Nombre de bougies déjà stockées re-téléchargées à chaque top-up (contrôle de cohérence)
+OVERLAP_BARS = 5
+
+# Écart relatif toléré sur les bougies de recouvrement avant de considérer
+# l'historique stocké comme obsolète (split, révision de données...)
+OVERLAP_TOLERANCE = 1e-4
+
+logger = logging.getLogger("ohlcv_store")
+
+# fetch(since) -> OHLCV à partir de `since` inclus (None = historique complet)
+FetchFn = Callable[[Optional[pd.Timestamp]], Optional[pd.DataFrame]]
+
+
+def index_to_ns(index: pd.DatetimeIndex) -> np.ndarray:
+    """Timestamps en nanosecondes epoch, quelle que soit la résolution de l'index."""
+    return index.values.astype("datetime64[ns]").astype("int64")
+
+
+def normalize_ohlcv(df: pd.DataFrame) -> pd.DataFrame:
+    """Index DatetimeIndex naïf trié sans doublon, colonnes FIELDS en float."""
+    df = df.copy()
+    if isinstance(df.columns, pd.MultiIndex):
+        df.columns = df.columns.get_level_values(0)
+    df.index = pd.to_datetime(df.index)
+    if df.index.tz is not None:
+        df.index = df.index.tz_localize(None)
+    for col in FIELDS:
+        if col not in df.columns:
+            df[col] = np.nan
+    df = df[FIELDS].astype("float64")
+    df = df[~df.index.duplicated(keep="last")].sort_index()
+    df.index.name = None
+    return df
+
+
+class OhlcvStore:
+    """
+    Historique OHLCV persistant, clé (univers, ticker).
+    Permet de ne télécharger que les bougies postérieures au dernier timestamp stocké.
+    """
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+
+    def path(self, universe: str, ticker: str) -> str:
+        safe = ticker.replace("/", "_")
+        return os.path.join(self.root, universe, f"{safe}.npy")
+
+    def tickers(self, universe: str) -> List[str]:
+        """Tickers stockés pour un univers (ordre alphabétique des fichiers)."""
+        folder = os.path.join(self.root, universe)
+        if not os.path.isdir(folder):
+            return []
+        return [name[:-4] for name in sorted(os.listdir(folder)) if name.endswith(".npy")]
+
+    def load(self, universe: str, ticker: str) -> Optional[pd.DataFrame]:
+        path = self.path(universe, ticker)
+        if not os.path.exists(path):
+            return None
+        try:
+            arr = np.load(path, mmap_mode="r")
+        except Exception as e:
+            logger.warning(f"Store illisible {path}: {e}")
+            return None
+        if len(arr) == 0:
+            return None
+
+        index = pd.to_datetime(np.asarray(arr["ts"]), unit="ns")
+        return pd.DataFrame({f: np.asarray(arr[f]) for f in FIELDS}, index=index)
+
+    def last_timestamp(self, universe: str, ticker: str, offset: int = 1) -> Optional[pd.Timestamp]:
+        """Timestamp de la `offset`-ième bougie stockée en partant de la fin (1 = la dernière)."""
+        path = self.path(universe, ticker)
+        if not os.path.exists(path):
+            return None
+        try:
+            arr = np.load(path, mmap_mode="r")
+        except Exception:
+            return None
+        if len(arr) == 0:
+            return None
+        return pd.Timestamp(int(arr["ts"][-min(offset, len(arr))]), unit="ns")
+
+    def fetched_at(self, universe: str, ticker: str) -> Optional[float]:
+        """
+        Date (epoch) du dernier téléchargement réussi, None si jamais stocké :
+        le fichier n'est réécrit que lorsque de nouvelles bougies ont été fusionnées.
+        """
+        path = self.path(universe, ticker)
+        return os.path.getmtime(path) if os.path.exists(path) else None
+
+    def resume_timestamp(self, universe: str, ticker: str) -> Optional[pd.Timestamp]:
+        """Point de reprise d'un top-up : quelques bougies avant la fin pour pouvoir comparer."""
+        return self.last_timestamp(universe, ticker, offset=OVERLAP_BARS)
+
+    def save(self, universe: str, ticker: str, df: pd.DataFrame):
+        df = normalize_ohlcv(df)
+        arr = np.empty(len(df), dtype=DTYPE)
+        arr["ts"] = index_to_ns(df.index)
+        for f in FIELDS:
+            arr[f] = df[f].to_numpy()
+
+        path = self.path(universe, ticker)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, arr)
+        os.replace(tmp, path)
+
+    def merge(self, universe: str, ticker: str, new: pd.DataFrame) -> Optional[pd.DataFrame]:
+        """
+        Ajoute `new` à l'historique stocké (les bougies de `new` remplacent celles de même date).
+        Renvoie None si les bougies de recouvrement ne collent pas : l'historique doit être refait.
+        """
+        new = normalize_ohlcv(new)
+        old = self.load(universe, ticker)
+
+        if old is None:
+            merged = new
+        else:
+            # la dernière bougie stockée pouvait être incomplète : on ne compare que les précédentes
+            stable = old.index.intersection(new.index)[:-1]
+            if len(stable) > 0:
+                ref = old.loc[stable, "Close"].to_numpy()
+                cur = new.loc[stable, "Close"].to_numpy()
+                if not np.allclose(ref, cur, rtol=OVERLAP_TOLERANCE, equal_nan=True):
+                    return None
+            merged = pd.concat([old[~old.index.isin(new.index)], new]).sort_index()
+
+        self.save(universe, ticker, merged)
+        return merged
+
+    def update(
+        self,
+        universe: str,
+        ticker: str,
+        new: Optional[pd.DataFrame],
+        refetch: Callable[[], Optional[pd.DataFrame]],
+    ) -> Optional[pd.DataFrame]:
+        """
+        Fusionne des bougies fraîchement téléchargées. Si elles contredisent l'historique
+        stocké, `refetch()` doit renvoyer l'historique complet qui remplace le stock.
+        """
+        if new is None or new.empty:
+            return self.load(universe, ticker)
+
+        merged = self.merge(universe, ticker, new)
+        if merged is not None:
+            return merged
+
+        logger.info(f"{universe}/{ticker}: historique stocké incohérent, rechargement complet.")
+        full = refetch()
+        if full is None or full.empty:
+            return None
+        self.save(universe, ticker, full)
+        return self.load(universe, ticker)
+
+    def topup(self, universe: str, ticker: str, fetch: FetchFn) -> Optional[pd.DataFrame]:
+        """
+        Complète l'historique stocké avec les bougies manquantes :
+        fetch(point de reprise) si le ticker est connu, fetch(None) sinon.
+        """
+        new = fetch(self.resume_timestamp(universe, ticker))
+        return self.update(universe, ticker, new, lambda: fetch(None))
@@ -0,0 +1,134 @@
+# bots/panel.py
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Panel = {champ: DataFrame dates × tickers}. Un ticker absent à une date vaut NaN.
+Panel = Dict[str, pd.DataFrame]
+
+FIELDS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def build_panel(
+    frames: Dict[str, pd.DataFrame],
+    fields: List[str] = FIELDS,
+    index_col: Optional[str] = None,
+) -> Panel:
+    """
+    Aligne les OHLCV de plusieurs tickers sur un axe de dates commun.
+    `index_col` : colonne servant d'axe (ex. "timestamp" pour les frames Binance), sinon l'index.
+    """
+    if not frames:
+        return {field: pd.DataFrame() for field in fields}
+
+    parts = {}
+    for ticker, df in frames.items():
+        sub = df.set_index(index_col) if index_col else df
+        parts[ticker] = sub[fields]
+
+    wide = pd.concat(parts, axis=1).sort_index()
+    tickers = list(frames)
+    return {field: wide.xs(field, axis=1, level=1)[tickers] for field in fields}
+
+
+def contiguous_columns(close: pd.DataFrame) -> pd.Index:
+    """
+    Tickers dont l'historique est un bloc continu de l'axe (pas de trou en milieu de série).
+    Pour ceux-là, les fenêtres glissantes du panel sont exactement celles du calcul par ticker.
+    """
+    valid = close.notna().to_numpy()
+    n = len(close)
+    first = np.argmax(valid, axis=0)
+    last = n - 1 - np.argmax(valid[::-1], axis=0)
+    count = valid.sum(axis=0)
+    ok = (count > 0) & (count == last - first + 1)
+    return close.columns[ok]
+
+
+def patch_gapped(
+    ind: Panel,
+    panel: Panel,
+    frames: Dict[str, pd.DataFrame],
+    compute_panel: Callable[[Panel], Panel],
+    index_col: Optional[str] = None,
+) -> Panel:
+    """
+    Indicateurs `ind` du panel où les tickers à historique troué sont recalculés sur leurs
+    seules bougies : sur l'axe commun, une bougie manquante rend NaN toutes les fenêtres
+    glissantes qui la couvrent, alors que le calcul par ticker l'enjambe.
+    """
+    contiguous = set(contiguous_columns(panel["Close"]))
+    gapped = [ticker for ticker in panel["Close"].columns if ticker not in contiguous]
+    if not gapped:
+        return ind
+
+    out = {name: frame.copy() for name, frame in ind.items()}
+    for ticker in gapped:
+        # panel d'un seul ticker : son propre axe, donc contigu
+        own = compute_panel(build_panel({ticker: frames[ticker]}, index_col=index_col))
+        for name, frame in own.items():
+            if name in out:
+                out[name][ticker] = frame[ticker].reindex(out[name].index)
+    return out
+
+
+def cross_section(panel: Panel, offset: int = 0) -> pd.DataFrame:
+    """
+    Coupe transversale tickers × champs : valeur de chaque ticker à sa propre dernière
+    bougie (offset=0, équivalent de df.iloc[-1]) ou `offset` bougies avant (offset=1 : df.iloc[-2]).
+    """
+    close = panel["Close"]
+    valid = close.notna().to_numpy()
+    n = len(close)
+    last = n - 1 - np.argmax(valid[::-1], axis=0)
+    pos = last - offset
+    ok = valid.any(axis=0) & (pos >= 0)
+
+    cols = np.arange(close.shape[1])[ok]
+    rows = pos[ok]
+    data = {field: frame.to_numpy()[rows, cols] for field, frame in panel.items()}
+    return pd.DataFrame(data, index=close.columns[ok])
+
+
+def indicator_cross_sections(
+    frames: Dict[str, pd.DataFrame],
+    compute_panel: Callable[[Panel], Panel],
+    compute_single: Callable[[pd.DataFrame], pd.DataFrame],
+    index_col: Optional[str] = None,
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Indicateurs de tout l'univers en une passe, réduits à (dernière bougie, bougie précédente)
+    par ticker, dans l'ordre de `frames`. Les rares tickers à historique troué sont calculés
+    un par un avec `compute_single` pour garder exactement les mêmes valeurs.
+    """
+    if not frames:
+        return pd.DataFrame(), pd.DataFrame()
+
+    pn = build_panel(frames, index_col=index_col)
+    ind = compute_panel(pn)
+    curr = cross_section(ind)
+    prev = cross_section(ind, offset=1)
+
+    contiguous = set(contiguous_columns(pn["Close"]))
+    for ticker, df in frames.items():
+        if ticker in contiguous:
+            continue
+        full = compute_single(df)
+        curr.loc[ticker] = full.iloc[-1][curr.columns]
+        if len(full) > 1:
+            prev.loc[ticker] = full.iloc[-2][prev.columns]
+
+    order = list(frames)
+    return curr.reindex(order), prev.reindex(order)
+
+
+def ranked(table: pd.DataFrame, mask_col: str, score_col: str, decimals: Optional[int] = 2) -> pd.DataFrame:
+    """
+    Lignes retenues par `mask_col`, triées par score décroissant. Le tri est stable et porte
+    sur le score arrondi à `decimals` (None = score brut), exactement comme le tri des picks.
+    """
+    sub = table[table[mask_col]]
+    key = sub[score_col] if decimals is None else sub[score_col].map(lambda s: round(float(s), decimals))
+    return sub.loc[key.sort_values(ascending=False, kind="mergesort").index]
@@ -0,0 +1,268 @@
+# bots/param_sweep.py
+
+import os
+import itertools
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import bot_sp500_pro
+import perf_summary
+import trade_stats
+from ohlcv_store import OhlcvStore, index_to_ns
+from panel import build_panel, patch_gapped
+from backtest_engine import previous_bars, top_per_date, SP500_PULLBACK_TOP
+
+# =========================
+# CONFIG
+# =========================
+
+OUT_PATH = "data/param_sweep_sp500.csv"
+
+# Nombre de process (None = nombre de cœurs)
+MAX_WORKERS: Optional[int] = None
+
+# Fenêtre des signaux évalués (None = tout l'historique stocké)
+START_DATE: Optional[str] = None
+END_DATE: Optional[str] = None
+
+# Grille des seuils de scoring, par stratégie (les autres clés gardent SCORING_PARAMS)
+GRID: Dict[str, Dict[str, list]] = {
+    "phoenix": {
+        "breakout_vol_ratio": [1.5, 2.0, 2.5, 3.0],
+        "breakout_trend_range": [(0.03, 0.4), (0.0, 0.3), (0.05, 0.6)],
+        "breakout_stop_factor": [0.93, 0.95, 0.97],
+    },
+    "pullback": {
+        "pullback_band": [0.02, 0.03, 0.05],
+        "pullback_rsi_max": [50, 60, 70],
+        "pullback_trend_range": [(0.05, 0.4), (0.0, 0.3)],
+        "pullback_stop_factor": [0.93, 0.95, 0.97],
+    },
+}
+
+# Grille des règles de sortie (simulate_bars) : évaluée pour chaque point de GRID
+EXIT_GRID: Dict[str, list] = {
+    "breakeven_r": [0.5, 1.0, 1.5, None],
+    "time_stop_bars": [5, 10, 20],
+}
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("param_sweep")
+
+# Indicateurs calculés une seule fois, puis partagés (shared memory) entre les workers :
+# chaque point de grille ne refait que filtres, scores, sélection et simulation.
+CURR_FIELDS = ["Close", "Volume", "SMA_200", "SMA_50", "RSI", "Vol_Avg", "DollarVol_Avg20", "High_20"]
+PREV_FIELDS = ["Close", "Low"]
+BAR_FIELDS = ["Open", "High", "Low", "Close"]
+
+
+# =========================
+# PRÉPARATION (process principal)
+# =========================
+
+def load_cached_frames(universe: str = "sp500") -> Dict[str, pd.DataFrame]:
+    """Historique déjà stocké sur disque : aucun appel réseau."""
+    store = OhlcvStore()
+    frames = {}
+    for ticker in store.tickers(universe):
+        df = store.load(universe, ticker)
+        if df is not None and not df.empty:
+            frames[ticker] = df
+    logger.info(f"{universe}: {len(frames)} historiques en cache.")
+    return frames
+
+
+def prepare_arrays(frames: Dict[str, pd.DataFrame]) -> Dict[str, np.ndarray]:
+    """
+    Tableaux à partager :
+    - une ligne par (date, ticker) éligible : indicateurs du jour, bougie précédente,
+      date, rang dans l'univers, position de la bougie dans les barres à plat ;
+    - les barres OHLC de tous les tickers mises bout à bout (ticker par ticker).
+    """
+    pn = build_panel(frames)
+    # tickers à historique troué : indicateurs calculés sur leurs propres bougies
+    ind = patch_gapped(bot_sp500_pro.compute_indicators_panel(pn), pn, frames, bot_sp500_pro.compute_indicators_panel)
+    prev = previous_bars(pn)
+
+    present = pn["Close"].notna().to_numpy()
+    nobs = present.cumsum(axis=0)
+
+    # barres à plat : ticker après ticker, dates croissantes
+    by_ticker = present.T
+    bars = np.stack([pn[f].to_numpy().T[by_ticker] for f in BAR_FIELDS])
+    counts = present.sum(axis=0)
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    sel = present & (nobs >= bot_sp500_pro.MIN_CANDLES)
+    rows, cols = np.nonzero(sel)
+
+    arrays = {f"curr_{f}": ind[f].to_numpy()[rows, cols] for f in CURR_FIELDS}
+    arrays.update({f"prev_{f}": prev[f].to_numpy()[rows, cols] for f in PREV_FIELDS})
+    arrays["date"] = index_to_ns(pn["Close"].index)[rows]
+    arrays["rank"] = cols.astype("int64")
+    arrays["pos"] = (offsets[cols] + nobs[rows, cols] - 1).astype("int64")
+    arrays["end"] = (offsets + counts)[cols].astype("int64")
+    arrays["bars"] = np.ascontiguousarray(bars, dtype="float64")
+    return arrays
+
+
+# (nom du bloc, shape, dtype) par tableau
+SharedSpec = Dict[str, Tuple[str, tuple, str]]
+
+
+def share(arrays: Dict[str, np.ndarray]) -> Tuple[List[shared_memory.SharedMemory], SharedSpec]:
+    """Copie chaque tableau dans un bloc de mémoire partagée."""
+    blocks, spec = [], {}
+    for name, arr in arrays.items():
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        blocks.append(shm)
+        spec[name] = (shm.name, arr.shape, arr.dtype.str)
+    return blocks, spec
+
+
+# =========================
+# WORKERS
+# =========================
+
+_blocks: List[shared_memory.SharedMemory] = []
+_data: Dict[str, np.ndarray] = {}
+_curr: Optional[pd.DataFrame] = None
+_prev: Optional[pd.DataFrame] = None
+
+
+def _init_worker(spec: SharedSpec, start: Optional[str], end: Optional[str]):
+    """Rattache les blocs partagés (sans copie) et prépare les coupes transversales."""
+    global _curr, _prev
+    for name, (shm_name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _blocks.append(shm)
+        _data[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+    dates = pd.to_datetime(_data["date"], unit="ns")
+    keep = np.ones(len(dates), dtype=bool)
+    if start is not None:
+        keep &= dates >= pd.Timestamp(start)
+    if end is not None:
+        keep &= dates <= pd.Timestamp(end)
+    _data["keep"] = np.nonzero(keep)[0]
+
+    k = _data["keep"]
+    index = pd.MultiIndex.from_arrays([dates[k], _data["rank"][k]], names=["date", "ticker"])
+    _curr = pd.DataFrame({f: _data[f"curr_{f}"][k] for f in CURR_FIELDS}, index=index)
+    _prev = pd.DataFrame({f: _data[f"prev_{f}"][k] for f in PREV_FIELDS}, index=index)
+
+
+def sweep_stats(R: np.ndarray, reason: np.ndarray) -> Dict:
+    """
+    Stats de base des trades d'un point de grille, calculées par trade_stats (base_stats) :
+    mêmes définitions que performance_summary.json, trades sans R fini exclus.
+    """
+    valid = np.isfinite(R)
+    R, be = R[valid], reason[valid] == perf_summary.REASON_BE
+    totals = trade_stats.group_totals(np.zeros(len(R), dtype=int), 1, R, be)
+    return trade_stats.base_stats({name: values[0] for name, values in totals.items()})
+
+
+def evaluate(strategy: str, overrides: Dict) -> List[Dict]:
+    """Un point de la grille de scoring, décliné sur toute la grille de sortie."""
+    params = dict(bot_sp500_pro.SCORING_PARAMS, **overrides)
+    table = bot_sp500_pro.score_universe(_curr, _prev, params)
+    table["rank_in_universe"] = table.index.get_level_values("ticker")
+    table["row"] = _data["keep"]
+
+    if strategy == "phoenix":
+        picks = table[table["breakout"]]
+        stop = picks["stop_breakout"]
+    else:
+        picks = top_per_date(table[table["pullback"]], "score_pullback", SP500_PULLBACK_TOP, 2)
+        stop = picks["stop_pullback"]
+
+    # stop arrondi comme dans les JSON de picks ; entrée à l'open de la bougie suivante
+    stop = stop.round(2).to_numpy(dtype="float64")
+    row = picks["row"].to_numpy()
+    entry = _data["pos"][row] + 1
+    end = _data["end"][row]
+    opens, highs, lows, closes = _data["bars"]
+
+    results = []
+    exit_keys = list(EXIT_GRID)
+    for values in itertools.product(*EXIT_GRID.values()):
+        exit_params = dict(zip(exit_keys, values))
+        sim = perf_summary.simulate_bars(opens, highs, lows, closes, entry, end, stop, **exit_params)
+        closed = sim["live"] & sim["done"]
+        stats = sweep_stats(sim["R"][closed], sim["reason"][closed])
+        results.append({"strategy": strategy, **overrides, **exit_params, "nb_signals": len(picks), **stats})
+    return results
+
+
+def _evaluate_task(task: Tuple[str, Dict]) -> List[Dict]:
+    return evaluate(*task)
+
+
+# =========================
+# MAIN
+# =========================
+
+def grid_tasks() -> List[Tuple[str, Dict]]:
+    tasks = []
+    for strategy, grid in GRID.items():
+        keys = list(grid)
+        for values in itertools.product(*grid.values()):
+            tasks.append((strategy, dict(zip(keys, values))))
+    return tasks
+
+
+def run_sweep(
+    frames: Dict[str, pd.DataFrame],
+    max_workers: Optional[int] = MAX_WORKERS,
+    start: Optional[str] = START_DATE,
+    end: Optional[str] = END_DATE,
+) -> pd.DataFrame:
+    """Table classée (par stratégie, expectancy_R décroissante) de tous les points de grille."""
+    arrays = prepare_arrays(frames)
+    blocks, spec = share(arrays)
+    del arrays
+
+    tasks = grid_tasks()
+    logger.info(f"{len(tasks)} configurations de scoring × {len(list(itertools.product(*EXIT_GRID.values())))} règles de sortie.")
+
+    rows: List[Dict] = []
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(spec, start, end)) as pool:
+            for result in pool.map(_evaluate_task, tasks, chunksize=4):
+                rows.extend(result)
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    table = pd.DataFrame(rows)
+    return table.sort_values(
+        ["strategy", "expectancy_R", "winrate"], ascending=[True, False, False], kind="mergesort", ignore_index=True
+    )
+
+
+def main():
+    frames = load_cached_frames("sp500")
+    if not frames:
+        logger.info("Aucun historique en cache (lancer d'abord le scanner). Rien à faire.")
+        return
+
+    table = run_sweep(frames)
+
+    os.makedirs(os.path.dirname(OUT_PATH), exist_ok=True)
+    table.to_csv(OUT_PATH, index=False)
+
+    for strategy, sub in table.groupby("strategy", sort=False):
+        logger.info(f"Top {strategy}:\n{sub.head(5).to_string(index=False)}")
+    logger.info(f"✅ Sweep sauvegardé : {OUT_PATH} ({len(table)} lignes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,89 +1,90 @@
+import argparse
 import json
 import os
-from typing import Dict, Optional
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
-import yfinance as yf
-import ccxt
 import logging
 
-LOG_PATH = "data/signals_log.json"
+import breakdowns
+import market_data
+import metrics
+import trade_results
+import trade_stats
+from ohlcv_store import index_to_ns
+from signals_store import PartitionedSignalLog, open_log
+
+# Paires (log de signaux, résumé de performance) ; plusieurs paires peuvent être
+# traitées dans un même run (historique et simulation partagés par ticker).
+# Le log de production est partitionné par univers / mois (voir signals_store) :
+# seules les partitions dont un signal change sont réécrites et, en incrémental, seules
+# celles ayant encore des trades ouverts sont relues (mois clos repris de trade_results).
+LOG_PATH = "data/signals_log"
 OUT_PATH = "data/performance_summary.json"
+BACKTEST_LOG_PATH = "data/signals_log_backtest.json"
+BACKTEST_OUT_PATH = "data/performance_backtest.json"
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-logger = logging.getLogger("perf_summary")
+DEFAULT_PAIRS = [(LOG_PATH, OUT_PATH)]
 
-# caches pour éviter de refetch en boucle
-_sp500_cache: Dict[str, pd.DataFrame] = {}
-_crypto_cache: Dict[str, pd.DataFrame] = {}
+# Stratégies suivies (clé "<universe>_<strategy>")
+STRATEGY_KEYS = ["sp500_phoenix", "sp500_pullback", "crypto_phoenix", "crypto_pullback"]
 
-exchange_binance = ccxt.binance({"enableRateLimit": True})
+# Mode incrémental : les trades CLOSED sont repris de leur bloc `execution`
+# sans re-simulation ni téléchargement (False = tout re-simuler).
+INCREMENTAL = True
 
+# Process de simulation (signaux répartis par ticker) ; 1 = tout dans le process courant
+WORKERS = 1
 
-# =========================
-# UTILITAIRES
-# =========================
+# Format des equity curves des résumés :
+# - "full"    : {"dates": [...], "equity_pct": [...]} par courbe
+# - "compact" : axe de dates commun à toutes les courbes, encodé en écarts de jours,
+#               sous-échantillonné (LTTB) à EQUITY_MAX_POINTS points au plus
+#   {"format": "compact", "start": "YYYY-MM-DD", "days": [0, 2, 1, ...],
+#    "equity_pct": {courbe: [valeur ou null, ...]}}
+EQUITY_FORMAT = "compact"
+EQUITY_FORMATS = ("full", "compact")
+EQUITY_MAX_POINTS = 500     # 0 = pas de sous-échantillonnage
 
-def load_signals_log():
-    if not os.path.exists(LOG_PATH):
-        return []
-    try:
-        with open(LOG_PATH, "r") as f:
-            data = json.load(f)
-            return data if isinstance(data, list) else []
-    except Exception:
-        return []
+# Règles de sortie du trader mode (paramètres de simulate_bars)
+BREAKEVEN_R = 1.0       # stop remonté à l'entrée dès +1R
+TIME_STOP_BARS = 10     # sortie au close de la 10e bougie
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger("perf_summary")
 
+# L'historique vient de market_data (cache mémoire + store disque partagé avec les scanners) :
+# chaque série n'est téléchargée qu'une fois par run du pipeline.
 
-def save_signals_log(log):
-    with open(LOG_PATH, "w") as f:
-        json.dump(log, f, indent=2)
 
+# =========================
+# UTILITAIRES
+# =========================
 
-def save_perf_summary(summary: Dict):
-    os.makedirs(os.path.dirname(OUT_PATH), exist_ok=True)
-    with open(OUT_PATH, "w") as f:
-        json.dump(summary, f, indent=2)
+def save_perf_summary(summary: Dict, path: str = OUT_PATH):
+    # Indenté pour les stats, mais chaque liste de scalaires (dates, points d'equity) sur une ligne
+    text = json.dumps(summary, indent=2)
+    text = re.sub(r"\[\n\s*([^\[\]{}]*?)\n\s*\]", lambda m: "[" + re.sub(r",\n\s*", ", ", m.group(1)) + "]", text)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(text)
 
 
 def get_sp500_history(ticker: str) -> Optional[pd.DataFrame]:
-    if ticker in _sp500_cache:
-        return _sp500_cache[ticker]
-
-    try:
-        df = yf.download(ticker, period="2y", interval="1d", auto_adjust=False, progress=False)
-        if df.empty:
-            return None
-
-        df = df[["Open", "High", "Low", "Close"]].copy()
-        df.index = pd.to_datetime(df.index).tz_localize(None)
-        _sp500_cache[ticker] = df
-        return df
-    except Exception as e:
-        logger.warning(f"Erreur yfinance pour {ticker}: {e}")
+    df = market_data.get_history("sp500", ticker)
+    if df is None or df.empty:
         return None
+    return df[["Open", "High", "Low", "Close"]]
 
 
 def get_crypto_history(symbol: str) -> Optional[pd.DataFrame]:
-    if symbol in _crypto_cache:
-        return _crypto_cache[symbol]
-
-    pair = f"{symbol}/USDT"
-    try:
-        ohlcv = exchange_binance.fetch_ohlcv(pair, timeframe="1d", limit=200)
-        if not ohlcv:
-            return None
-
-        df = pd.DataFrame(ohlcv, columns=["timestamp", "Open", "High", "Low", "Close", "Volume"])
-        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
-        df.set_index("timestamp", inplace=True)
-        df.index = df.index.tz_localize(None)
-        df = df[["Open", "High", "Low", "Close"]]
-        _crypto_cache[symbol] = df
-        return df
-    except Exception as e:
-        logger.warning(f"Erreur ccxt pour {symbol}/USDT: {e}")
+    df = market_data.get_history("crypto", symbol)
+    if df is None or df.empty:
         return None
+    return df[["Open", "High", "Low", "Close"]]
 
 
 # =========================
@@ -98,161 +99,324 @@ def simulate_trade(df: pd.DataFrame, date_signal: pd.Timestamp, stop_loss_initia
     - Breakeven : dès que High >= Entry + 1R (en brut), stop déplacé à l'entry brut
     - Time stop : close de la 10e bougie après l’entrée si aucun stop touché
     - Sortie avec slippage/frais -0.1%
+    Pour plusieurs signaux d'un même sous-jacent, préparer la série une fois
+    (prepare_series) et appeler simulate_series.
     """
     if stop_loss_initial is None or stop_loss_initial <= 0:
         return None
+    return simulate_series(prepare_series(df), [date_signal], [stop_loss_initial])[0]
 
-    df = df.sort_index()
 
-    # bougies strictement après la date du signal
-    df_after = df[df.index.date > date_signal.date()]
-    if df_after.empty:
-        # Pas encore de J+1 disponible
-        return {"status": "PENDING"}
+# Codes de sortie de la version vectorisée
+REASON_NONE, REASON_SL, REASON_BE, REASON_TIME = 0, 1, 2, 3
+REASON_LABELS = {REASON_SL: "SL", REASON_BE: "BE", REASON_TIME: "TIME"}
 
-    # Bougie d'entrée = première bougie après date_signal
-    entry_idx = df_after.index[0]
-    entry_row = df_after.loc[entry_idx]
-    entry_open_raw = float(entry_row["Open"])
 
-    # Entrée invalide si open <= 0 ou stop au-dessus de l’open
-    if entry_open_raw <= 0 or stop_loss_initial >= entry_open_raw:
-        return None
+def simulate_bars(
+    opens: np.ndarray,
+    highs: np.ndarray,
+    lows: np.ndarray,
+    closes: np.ndarray,
+    entry: np.ndarray,
+    end: np.ndarray,
+    stop: np.ndarray,
+    breakeven_r: Optional[float] = BREAKEVEN_R,
+    time_stop_bars: int = TIME_STOP_BARS,
+) -> Dict[str, np.ndarray]:
+    """
+    Cœur vectorisé du trader mode, sur des tableaux de bougies :
+    chaque signal entre à l'open de la bougie `entry` et dispose des bougies [entry, end).
+    `stop` vaut NaN pour un signal sans stop. breakeven_r=None désactive le breakeven.
+    Renvoie des tableaux par signal (pending, live, done, breakeven, exit_pos, reason, prix, R...).
+    """
+    n_sig = len(entry)
+    invalid = np.isnan(stop) | (stop <= 0)
+    pending = ~invalid & (entry >= end)
 
-    # Prix simulés avec slippage/frais
+    e = np.where(entry < end, entry, 0)
+    entry_open_raw = opens[e]
     entry_price = entry_open_raw * 1.001
-    risk_per_unit = entry_price - stop_loss_initial
-    if risk_per_unit <= 0:
-        return None
+    risk_per_unit = entry_price - stop
+
+    # Entrée invalide si open <= 0, stop au-dessus de l'open ou risque négatif
+    live = ~invalid & ~pending
+    live &= ~((entry_open_raw <= 0) | (stop >= entry_open_raw))
+    live &= ~(risk_per_unit <= 0)
+
+    # breakeven_r × 1R en brut pour déclencher le BE
+    if breakeven_r is None:
+        be_trigger_raw = np.full(n_sig, np.inf)
+    else:
+        be_trigger_raw = entry_open_raw + breakeven_r * (entry_open_raw - stop)
+
+    nb_bars = np.minimum(end - entry, time_stop_bars)
+    current_stop = stop.copy()
+    breakeven = np.zeros(n_sig, dtype=bool)
+    done = np.zeros(n_sig, dtype=bool)
+    exit_pos = np.full(n_sig, -1)
+    exit_raw = np.full(n_sig, np.nan)
+    reason = np.full(n_sig, REASON_NONE)
+
+    for k in range(time_stop_bars):
+        active = live & ~done & (k < nb_bars)
+        if not active.any():
+            break
 
-    # 1R en brut pour déclencher le BE
-    risk_raw = entry_open_raw - stop_loss_initial
-    be_trigger_raw = entry_open_raw + risk_raw
-
-    current_stop = stop_loss_initial  # brut
-    breakeven_activated = False
-
-    exit_idx = None
-    exit_raw_price = None
-    exit_reason = None  # "SL", "BE", "TIME"
-
-    trade_df = df_after.loc[entry_idx:]
-    rows = list(trade_df.iloc[:10].iterrows())
-    if not rows:
-        # Entrée mais pas (encore) de barres après : trade actif
-        return {
-            "status": "ACTIVE",
-            "entry_price": entry_price,
-            "entry_date": entry_idx.date().isoformat(),
-            "breakeven_activated": breakeven_activated,
-        }
+        pos = np.where(active, entry + k, 0)
+        o, h, l, c = opens[pos], highs[pos], lows[pos], closes[pos]
+        stop_reason = np.where(breakeven & (current_stop >= entry_open_raw), REASON_BE, REASON_SL)
+
+        # 1. GAP sous le stop actuel / 2. Stop intraday
+        gap = active & (o <= current_stop)
+        intraday = active & ~gap & (l <= current_stop)
+        hit = gap | intraday
+        exit_raw = np.where(gap, o, np.where(intraday, current_stop, exit_raw))
+        reason = np.where(hit, stop_reason, reason)
+        exit_pos = np.where(hit, pos, exit_pos)
+        done |= hit
+
+        # 3. Passage au breakeven si l'objectif est atteint (en brut)
+        running = active & ~hit
+        trigger = running & ~breakeven & (h >= be_trigger_raw)
+        breakeven |= trigger
+        current_stop = np.where(trigger, entry_open_raw, current_stop)
+
+        # 4. Time stop à la dernière bougie autorisée
+        if k == time_stop_bars - 1:
+            exit_raw = np.where(running, c, exit_raw)
+            reason = np.where(running, REASON_TIME, reason)
+            exit_pos = np.where(running, pos, exit_pos)
+            done |= running
 
-    for i, (idx, row) in enumerate(rows, start=1):
-        o = float(row["Open"])
-        h = float(row["High"])
-        l = float(row["Low"])
-        c = float(row["Close"])
-
-        # 1. GAP sous le stop actuel
-        if o <= current_stop:
-            exit_idx = idx
-            exit_raw_price = o
-            exit_reason = "BE" if breakeven_activated and current_stop >= entry_open_raw else "SL"
-            break
+    # Sortie avec slippage / frais
+    exit_price = exit_raw * 0.999
+    with np.errstate(divide="ignore", invalid="ignore"):
+        perf_pct = (exit_price / entry_price - 1.0) * 100.0
+        R = (exit_price - entry_price) / risk_per_unit
 
-        # 2. Stop intraday
-        if l <= current_stop:
-            exit_idx = idx
-            exit_raw_price = current_stop
-            exit_reason = "BE" if breakeven_activated and current_stop >= entry_open_raw else "SL"
-            break
+    return {
+        "pending": pending,
+        "live": live,
+        "done": done,
+        "breakeven": breakeven,
+        "exit_pos": exit_pos,
+        "reason": reason,
+        "entry_price": entry_price,
+        "exit_price": exit_price,
+        "perf_pct": perf_pct,
+        "R": R,
+    }
+
+
+def prepare_series(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Historique d'un sous-jacent préparé une seule fois pour tous ses signaux :
+    tri, tableaux OHLC float64 et jours des bougies (ns, triés) pour la recherche
+    dichotomique de la bougie d'entrée.
+    """
+    df = df.sort_index()
+    return {
+        "dates": df.index,
+        "day": index_to_ns(df.index.normalize()),
+        "open": df["Open"].to_numpy(dtype="float64"),
+        "high": df["High"].to_numpy(dtype="float64"),
+        "low": df["Low"].to_numpy(dtype="float64"),
+        "close": df["Close"].to_numpy(dtype="float64"),
+    }
+
+
+def simulate_trades(
+    df: pd.DataFrame,
+    date_signals: List[pd.Timestamp],
+    stops: List[Optional[float]],
+) -> List[Optional[Dict]]:
+    """Tous les signaux d'un même historique (voir simulate_series)."""
+    if not date_signals:
+        return []
+    return simulate_series(prepare_series(df), date_signals, stops)
 
-        # 3. Passage au breakeven si +1R atteint (en brut)
-        if (not breakeven_activated) and (h >= be_trigger_raw):
-            breakeven_activated = True
-            current_stop = entry_open_raw
-
-        # 4. Time stop à la 10e bougie
-        is_last_bar = (i == len(rows))
-        if is_last_bar and i >= 10:
-            exit_idx = idx
-            exit_raw_price = c
-            exit_reason = "TIME"
-            break
 
-    # Si aucun exit trouvé et moins de 10 barres → trade toujours actif
-    if exit_idx is None:
-        return {
-            "status": "ACTIVE",
-            "entry_price": entry_price,
-            "entry_date": entry_idx.date().isoformat(),
-            "breakeven_activated": breakeven_activated,
+def simulate_series(
+    series: Dict[str, np.ndarray],
+    date_signals: List[pd.Timestamp],
+    stops: List[Optional[float]],
+) -> List[Optional[Dict]]:
+    """
+    Simulation vectorisée de tous les signaux d'une série préparée (prepare_series) :
+    la bougie d'entrée de chaque signal est trouvée par recherche dichotomique (O(log n),
+    sans copie du DataFrame), puis les règles (gap sous le stop, stop intraday, breakeven
+    à +1R, time stop à la 10e bougie) sont évaluées bougie par bougie sur des tableaux
+    NumPy couvrant tous les signaux à la fois.
+    Renvoie, dans l'ordre des signaux, le résultat de simulate_trade pour chacun
+    (None si le signal n'est pas simulable).
+    """
+    n_sig = len(date_signals)
+    results: List[Optional[Dict]] = [None] * n_sig
+    if n_sig == 0:
+        return results
+
+    bar_dates = series["dates"]
+
+    # Bougie d'entrée = première bougie dont la date est strictement après la date du signal
+    sig_days = index_to_ns(pd.DatetimeIndex(date_signals).normalize())
+    entry = np.searchsorted(series["day"], sig_days, side="right")
+
+    sim = simulate_bars(
+        series["open"],
+        series["high"],
+        series["low"],
+        series["close"],
+        entry,
+        np.full(n_sig, len(bar_dates)),
+        np.array([np.nan if s is None else s for s in stops], dtype="float64"),
+    )
+    pending, live, done, breakeven = sim["pending"], sim["live"], sim["done"], sim["breakeven"]
+    exit_pos, reason = sim["exit_pos"], sim["reason"]
+    entry_price, exit_price, perf_pct, R = sim["entry_price"], sim["exit_price"], sim["perf_pct"], sim["R"]
+
+    for i in range(n_sig):
+        if pending[i]:
+            results[i] = {"status": "PENDING"}
+            continue
+        if not live[i]:
+            continue
+
+        entry_date = bar_dates[entry[i]].date().isoformat()
+        if not done[i]:
+            results[i] = {
+                "status": "ACTIVE",
+                "entry_price": float(entry_price[i]),
+                "entry_date": entry_date,
+                "breakeven_activated": bool(breakeven[i]),
+            }
+            continue
+
+        results[i] = {
+            "status": "CLOSED",
+            "entry_price": float(entry_price[i]),
+            "entry_date": entry_date,
+            "exit_price": float(exit_price[i]),
+            "exit_date": bar_dates[exit_pos[i]].date().isoformat(),
+            "exit_reason": REASON_LABELS[int(reason[i])],
+            "breakeven_activated": bool(breakeven[i]),
+            "perf_pct": float(perf_pct[i]),
+            "R": float(R[i]),
+            "slippage": {
+                "entry_factor": 1.001,
+                "exit_factor": 0.999,
+            },
         }
 
-    # Sortie avec slippage / frais
-    exit_price = exit_raw_price * 0.999
+    return results
 
-    perf_pct = (exit_price / entry_price - 1.0) * 100.0
-    R = (exit_price - entry_price) / risk_per_unit
+
+def closed_trade_from_execution(entry: Dict) -> Optional[Dict]:
+    """
+    Résultat d'un trade déjà CLOSED reconstruit depuis son bloc `execution`,
+    au même format que simulate_trade. R et perf_pct sont recalculés avec les mêmes
+    formules, donc à l'identique. None si le bloc est incomplet (il faut re-simuler).
+    """
+    if entry.get("trade_status") != "CLOSED":
+        return None
+
+    exec_block = entry.get("execution") or {}
+    entry_price = exec_block.get("entry_price")
+    exit_price = exec_block.get("exit_price")
+    if entry_price is None or exit_price is None or not exec_block.get("exit_date"):
+        return None
+
+    stop_loss_initial = float(entry.get("initial_data", {}).get("stop_loss_technical", 0.0))
+    entry_price = float(entry_price)
+    exit_price = float(exit_price)
+    risk_per_unit = entry_price - stop_loss_initial
+    if risk_per_unit <= 0:
+        return None
 
     return {
         "status": "CLOSED",
         "entry_price": entry_price,
-        "entry_date": entry_idx.date().isoformat(),
+        "entry_date": exec_block.get("entry_date"),
         "exit_price": exit_price,
-        "exit_date": exit_idx.date().isoformat(),
-        "exit_reason": exit_reason,
-        "breakeven_activated": breakeven_activated,
-        "perf_pct": perf_pct,
-        "R": R,
-        "slippage": {
-            "entry_factor": 1.001,
-            "exit_factor": 0.999,
-        },
+        "exit_date": exec_block.get("exit_date"),
+        "exit_reason": exec_block.get("exit_reason", "SL"),
+        "breakeven_activated": exec_block.get("breakeven_activated", False),
+        "perf_pct": (exit_price / entry_price - 1.0) * 100.0,
+        "R": (exit_price - entry_price) / risk_per_unit,
+        "slippage": exec_block.get("slippage"),
     }
 
 
+def simulate_ticker(job: Tuple[str, str, List[tuple]]) -> List[Tuple[tuple, Dict]]:
+    """
+    Tous les signaux (clé, date_signal, stop) d'un sous-jacent : historique chargé une fois,
+    une simulation vectorisée. Renvoie [(clé, résultat)] pour les signaux simulables.
+    """
+    universe, ticker, items = job
+    try:
+        # Historique du sous-jacent
+        if universe == "sp500":
+            df = get_sp500_history(ticker)
+        else:
+            df = get_crypto_history(ticker)
+
+        if df is None or df.empty:
+            return []
+
+        results = simulate_trades(df, [d for _, d, _ in items], [s for _, _, s in items])
+        return [(tag, sim) for (tag, _, _), sim in zip(items, results) if sim is not None]
+
+    except Exception as e:
+        logger.warning(f"Erreur de simulation sur {universe}/{ticker}: {e}")
+        return []
+
+
+def simulate_jobs(jobs: Dict[tuple, List[tuple]], workers: int = WORKERS) -> Dict[tuple, Dict]:
+    """
+    Simulation de tous les sous-jacents, dans le process courant ou répartie par ticker
+    sur `workers` process. Les historiques ont été préchargés dans le store disque :
+    les workers les relisent sans appel réseau. Résultat indexé par la clé de chaque signal
+    (log, position dans le log), donc indépendant de l'ordre d'exécution.
+    """
+    tasks = [(universe, ticker, items) for (universe, ticker), items in jobs.items()]
+    sims: Dict[tuple, Dict] = {}
+
+    if workers <= 1 or len(tasks) <= 1:
+        for result in map(simulate_ticker, tasks):
+            sims.update(result)
+        return sims
+
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(simulate_ticker, tasks, chunksize=chunksize):
+            sims.update(result)
+    return sims
+
+
 # =========================
-# MAIN + AGRÉGATION
+# AGRÉGATION
 # =========================
 
-def main():
-    signals = load_signals_log()
-    if not signals:
-        logger.info("Aucun signal dans le log. Rien à faire.")
-        save_perf_summary(
-            {
-                "last_update": pd.Timestamp.utcnow().strftime("%Y-%m-%d"),
-                "sp500_phoenix": {},
-                "sp500_pullback": {},
-                "crypto_phoenix": {},
-                "crypto_pullback": {},
-                "equity_curve": {
-                    "global": {"dates": [], "equity_pct": []},
-                    "sp500_phoenix": {"dates": [], "equity_pct": []},
-                    "sp500_pullback": {"dates": [], "equity_pct": []},
-                    "crypto_phoenix": {"dates": [], "equity_pct": []},
-                    "crypto_pullback": {"dates": [], "equity_pct": []},
-                },
-            }
-        )
-        return
-
-    # On suit pour chaque stratégie :
-    # - liste de R
-    # - raisons de sortie
-    # - trades pour l'equity curve (date + perf_pct)
-    groups = {
-        "sp500_phoenix": {"R": [], "exit_reasons": [], "equity_trades": []},
-        "sp500_pullback": {"R": [], "exit_reasons": [], "equity_trades": []},
-        "crypto_phoenix": {"R": [], "exit_reasons": [], "equity_trades": []},
-        "crypto_pullback": {"R": [], "exit_reasons": [], "equity_trades": []},
+def empty_summary(equity_format: str = EQUITY_FORMAT) -> Dict:
+    curves = {
+        "global": {"dates": [], "equity_pct": []},
+        **{key: {"dates": [], "equity_pct": []} for key in STRATEGY_KEYS},
+    }
+    return {
+        "last_update": pd.Timestamp.utcnow().strftime("%Y-%m-%d"),
+        **{key: {} for key in STRATEGY_KEYS},
+        "equity_curve": compact_equity_curves(curves) if equity_format == "compact" else curves,
+        "breakdowns": breakdowns.Breakdowns(STRATEGY_KEYS).report(),
     }
 
-    updated_signals = []
-    global_equity_trades = []
 
-    for entry in signals:
+def collect_jobs(signals: List[Dict], log_idx: int, jobs: Dict[tuple, List[tuple]], incremental: bool) -> Dict[tuple, Dict]:
+    """
+    Validation des signaux d'un log et regroupement par sous-jacent dans `jobs`
+    (clé de signal = (log_idx, position)). En incrémental, les trades CLOSED sont repris
+    tels quels : ils sont renvoyés directement, sans simulation.
+    """
+    sims: Dict[tuple, Dict] = {}
+    for pos, entry in enumerate(signals):
         try:
             date_signal_str = entry.get("date_signal")
             universe = entry.get("universe")
@@ -260,37 +424,49 @@ def main():
             ticker = entry.get("ticker")
 
             if not (date_signal_str and universe and strategy and ticker):
-                updated_signals.append(entry)
                 continue
 
             key = f"{universe}_{strategy}"
-            if key not in groups:
-                updated_signals.append(entry)
+            if key not in STRATEGY_KEYS:
                 continue
 
             initial_data = entry.get("initial_data", {})
             stop_loss_initial = float(initial_data.get("stop_loss_technical", 0.0))
             if stop_loss_initial <= 0:
-                updated_signals.append(entry)
                 continue
 
+            if incremental:
+                closed = closed_trade_from_execution(entry)
+                if closed is not None:
+                    sims[(log_idx, pos)] = closed
+                    continue
+
             date_signal = pd.to_datetime(date_signal_str)
+            jobs.setdefault((universe, ticker), []).append(((log_idx, pos), date_signal, stop_loss_initial))
 
-            # Historique du sous-jacent
-            if universe == "sp500":
-                df = get_sp500_history(ticker)
-            else:
-                df = get_crypto_history(ticker)
+        except Exception as e:
+            logger.warning(f"Erreur sur un signal {entry.get('id')}: {e}")
+            continue
 
-            if df is None or df.empty:
-                updated_signals.append(entry)
-                continue
+    return sims
 
-            sim = simulate_trade(df, date_signal, stop_loss_initial)
-            if sim is None:
-                updated_signals.append(entry)
-                continue
 
+def apply_results(signals: List[Dict], sims: Dict[int, Dict]) -> Tuple[List[Dict], np.ndarray]:
+    """
+    Mise à jour des signaux (bloc execution, trade_status) dans l'ordre du log et
+    table des trades CLOSED des stratégies suivies (trade_results : une ligne par trade).
+    """
+    updated_signals = []
+    closed_rows = []
+
+    for pos, entry in enumerate(signals):
+        sim = sims.get(pos)
+        if sim is None:
+            updated_signals.append(entry)
+            continue
+
+        try:
+            key = f"{entry.get('universe')}_{entry.get('strategy')}"
             status = sim.get("status", "PENDING")
 
             exec_block = entry.get("execution", {}) or {}
@@ -312,22 +488,23 @@ def main():
             entry["execution"] = exec_block
             entry["trade_status"] = status
 
-            if status == "CLOSED":
-                R_val = sim.get("R")
-                exit_reason = sim.get("exit_reason", "SL")
-                perf_pct = sim.get("perf_pct")
-
-                if R_val is not None:
-                    groups[key]["R"].append(R_val)
-                    groups[key]["exit_reasons"].append(exit_reason)
-
-                if perf_pct is not None and exec_block.get("exit_date"):
-                    trade_point = {
-                        "exit_date": exec_block["exit_date"],
-                        "perf_pct": float(perf_pct),
+            if status == "CLOSED" and key in STRATEGY_KEYS:
+                closed_rows.append(
+                    {
+                        "id": entry.get("id"),
+                        "universe": entry.get("universe"),
+                        "strategy": entry.get("strategy"),
+                        "ticker": entry.get("ticker"),
+                        "date_signal": entry.get("date_signal"),
+                        "entry_date": exec_block.get("entry_date"),
+                        "entry_price": exec_block.get("entry_price"),
+                        "exit_date": exec_block.get("exit_date"),
+                        "exit_price": exec_block.get("exit_price"),
+                        "R": sim.get("R"),
+                        "perf_pct": sim.get("perf_pct"),
+                        "exit_reason": sim.get("exit_reason", "SL"),
                     }
-                    global_equity_trades.append(trade_point)
-                    groups[key]["equity_trades"].append(trade_point)
+                )
 
             updated_signals.append(entry)
 
@@ -336,86 +513,286 @@ def main():
             updated_signals.append(entry)
             continue
 
-    # Sauvegarde du log enrichi
-    save_signals_log(updated_signals)
+    return updated_signals, trade_results.build(closed_rows)
 
-    summary = {
-        "last_update": pd.Timestamp.utcnow().strftime("%Y-%m-%d"),
+
+def build_equity_curve(trades) -> Dict:
+    """Equity cumulée par jour de sortie ; `trades` : liste ou DataFrame (exit_date, perf_pct)."""
+    if len(trades) == 0:
+        return {"dates": [], "equity_pct": []}
+
+    df_eq = pd.DataFrame(trades)
+    df_eq["exit_date"] = pd.to_datetime(df_eq["exit_date"])
+    df_eq = df_eq.sort_values("exit_date")
+    df_eq["date"] = df_eq["exit_date"].dt.date
+
+    daily = df_eq.groupby("date")["perf_pct"].sum().reset_index()
+    daily["equity_pct"] = daily["perf_pct"].cumsum()
+
+    return {
+        "dates": [d.strftime("%Y-%m-%d") for d in daily["date"]],
+        "equity_pct": [round(v, 2) for v in daily["equity_pct"]],
     }
 
-    # Agrégation par stratégie
-    for key, data in groups.items():
-        R_list = data["R"]
-        exit_reasons = data["exit_reasons"]
-        n = len(R_list)
-
-        if n == 0:
-            summary[key] = {
-                "nb_trades": 0,
-                "avg_R": 0.0,
-                "winrate": 0.0,
-                "breakeven_rate": 0.0,
-                "expectancy_R": 0.0,
-                "avg_win_R": 0.0,
-                "avg_loss_R": 0.0,
-            }
-            continue
 
-        be_count = sum(1 for r in exit_reasons if r == "BE")
-        be_rate = be_count / n * 100.0
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets : indices des `n_out` points qui conservent le mieux
+    la forme de la courbe (premier et dernier point toujours gardés). Dans chaque bucket,
+    le point retenu maximise l'aire du triangle formé avec le point retenu précédent
+    et la moyenne du bucket suivant.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = x.astype(float)
+    y = y.astype(float)
+    # n_out - 2 buckets entre le premier et le dernier point
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(int) + 1
+    edges[-1] = n - 1
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def compact_equity_curves(curves: Dict[str, Dict], max_points: int = EQUITY_MAX_POINTS) -> Dict:
+    """
+    Courbes au format "full" -> format "compact" : un seul axe de dates (union des dates
+    des courbes), encodé en écarts de jours depuis `start`, et une valeur par date et par
+    courbe. Entre deux sorties, une courbe garde sa dernière valeur (equity inchangée) ;
+    avant sa première sortie, elle vaut null.
+    Au-delà de `max_points` dates, chaque courbe est réduite par LTTB (budget partagé) et
+    l'axe ne garde que l'union des dates retenues : taille bornée quel que soit l'historique.
+    """
+    days = {key: np.array(curve["dates"], dtype="datetime64[D]").astype(np.int64) for key, curve in curves.items()}
+    values = {key: np.asarray(curve["equity_pct"], dtype=float) for key, curve in curves.items()}
+
+    axis = np.unique(np.concatenate([np.empty(0, dtype=np.int64), *days.values()]))
+    if len(axis) == 0:
+        return {"format": "compact", "start": None, "days": [], "equity_pct": {key: [] for key in curves}}
+
+    if max_points and len(axis) > max_points:
+        non_empty = [key for key in curves if len(days[key])]
+        budget = max(3, max_points // len(non_empty))
+        keep = [axis[[0, -1]]]
+        for key in non_empty:
+            keep.append(days[key][lttb_indices(days[key], values[key], budget)])
+        axis = np.unique(np.concatenate(keep))
+
+    series = {}
+    for key in curves:
+        if len(days[key]) == 0:
+            series[key] = [None] * len(axis)
+            continue
+        pos = np.searchsorted(days[key], axis, side="right") - 1
+        filled = np.where(pos >= 0, values[key][np.maximum(pos, 0)], np.nan)
+        series[key] = [None if np.isnan(v) else round(float(v), 2) for v in filled]
 
-        R_and_reason = list(zip(R_list, exit_reasons))
-        wins = [R for R, reason in R_and_reason if R > 0 and reason != "BE"]
-        losses = [R for R, reason in R_and_reason if R < 0 and reason != "BE"]
+    return {
+        "format": "compact",
+        "start": str(axis[0].astype("datetime64[D]")),
+        "days": np.diff(axis, prepend=axis[0]).tolist(),
+        "equity_pct": series,
+    }
 
-        winrate = (len(wins) / n * 100.0) if n > 0 else 0.0
-        lossrate = (len(losses) / n * 100.0) if n > 0 else 0.0
 
-        avg_win_R = sum(wins) / len(wins) if wins else 0.0
-        avg_loss_R_abs = -sum(losses) / len(losses) if losses else 0.0
+def build_summary(
+    results: np.ndarray,
+    equity_format: str = EQUITY_FORMAT,
+    max_points: int = EQUITY_MAX_POINTS,
+) -> Dict:
+    """Résumé de performance (stats par stratégie, equity curves) depuis la table des trades CLOSED."""
+    summary = {
+        "last_update": pd.Timestamp.utcnow().strftime("%Y-%m-%d"),
+        **trade_stats.strategy_stats(results, STRATEGY_KEYS),
+    }
 
-        expectancy_R = (winrate / 100.0) * avg_win_R - (lossrate / 100.0) * avg_loss_R_abs
-        avg_R_global = sum(R_list) / n
+    trades = trade_results.to_frame(results)
+    trades["key"] = trades["universe"] + "_" + trades["strategy"]
 
-        summary[key] = {
-            "nb_trades": n,
-            "avg_R": round(avg_R_global, 3),
-            "winrate": round(winrate, 1),
-            "breakeven_rate": round(be_rate, 1),
-            "expectancy_R": round(expectancy_R, 3),
-            "avg_win_R": round(avg_win_R, 3),
-            "avg_loss_R": round(avg_loss_R_abs, 3),
-        }
+    # Trades écartés des stats (R non fini) et des equity curves (perf_pct ou date de sortie
+    # absents) ; un perf_pct NaN, autrefois gardé, rendait la courbe NaN jusqu'au bout
+    metrics.incr("perf.trades_without_R", int((~np.isfinite(results["R"])).sum()))
+    metrics.incr("perf.trades_without_perf", int((trades["perf_pct"].isna() | trades["exit_date"].isna()).sum()))
 
     # === Construction des equity curves ===
-    def build_equity_curve(trades):
-        if not trades:
-            return {"dates": [], "equity_pct": []}
+    equity = trades[trades["perf_pct"].notna() & trades["exit_date"].notna()]
+    curves = {
+        "global": build_equity_curve(equity),
+        **{key: build_equity_curve(equity[equity["key"] == key]) for key in STRATEGY_KEYS},
+    }
+    summary["equity_curve"] = compact_equity_curves(curves, max_points) if equity_format == "compact" else curves
+    return summary
 
-        df_eq = pd.DataFrame(trades)
-        df_eq["exit_date"] = pd.to_datetime(df_eq["exit_date"])
-        df_eq = df_eq.sort_values("exit_date")
-        df_eq["date"] = df_eq["exit_date"].dt.date
 
-        daily = df_eq.groupby("date")["perf_pct"].sum().reset_index()
-        daily["equity_pct"] = daily["perf_pct"].cumsum()
+# =========================
+# MOTEUR
+# =========================
 
-        return {
-            "dates": [d.strftime("%Y-%m-%d") for d in daily["date"]],
-            "equity_pct": [round(v, 2) for v in daily["equity_pct"]],
-        }
+def load_signals(log, previous: Optional[np.ndarray], incremental: bool) -> Tuple[List[Dict], Optional[np.ndarray]]:
+    """
+    (signaux à traiter, trades déjà connus). Pour un log partitionné en incrémental, seules les
+    partitions ayant encore des trades ouverts (manifest) sont lues : les trades des mois clos sont
+    repris de la table du run précédent `previous` (ids lus dans les index des partitions).
+    Sans table exploitable, tout le log est lu.
+    """
+    if (
+        not incremental
+        or not isinstance(log, PartitionedSignalLog)
+        or previous is None
+        or "date_signal" not in previous.dtype.names
+    ):
+        return log.load(), None
+
+    open_keys = log.partitions(open_only=True)
+    closed_keys = [key for key in log.partitions() if key not in set(open_keys)]
+    closed_ids = np.array(sorted(log.ids(keys=closed_keys)), dtype=str)
+    known = np.asarray(previous[np.isin(previous["id"], closed_ids)])
+    metrics.incr("perf.partitions_skipped", len(closed_keys))
+    return log.load(keys=open_keys), known
+
+
+def run(
+    pairs: List[Tuple[str, str]] = DEFAULT_PAIRS,
+    incremental: bool = INCREMENTAL,
+    workers: int = WORKERS,
+    equity_format: str = EQUITY_FORMAT,
+    equity_points: int = EQUITY_MAX_POINTS,
+) -> List[Dict]:
+    """
+    Met à jour chaque log de signaux et écrit son résumé de performance
+    (equity curves au format `equity_format`, cf. EQUITY_FORMAT).
+    Tous les logs sont traités ensemble : chaque sous-jacent est chargé une fois
+    et simulé en une passe pour l'ensemble de ses signaux, quel que soit le log.
+    Renvoie les résumés, dans l'ordre de `pairs`.
+    """
+    # 1. Lecture des logs, validation et regroupement par sous-jacent
+    with metrics.stage("load"):
+        logs = [open_log(log_path) for log_path, _ in pairs]
+        previous = [trade_results.load(trade_results.results_path(out_path)) for _, out_path in pairs]
+        loaded = [load_signals(log, prev, incremental) for log, prev in zip(logs, previous)]
+        all_signals = [signals for signals, _ in loaded]
+
+        jobs: Dict[tuple, List[tuple]] = {}
+        sims: Dict[tuple, Dict] = {}
+        for log_idx, signals in enumerate(all_signals):
+            sims.update(collect_jobs(signals, log_idx, jobs, incremental))
+
+    metrics.incr("perf.signals", sum(len(signals) for signals in all_signals))
+    metrics.incr("perf.closed_reused", len(sims))
+    metrics.incr("perf.simulated", sum(len(v) for v in jobs.values()))
+    metrics.incr("perf.tickers", len(jobs))
+
+    logger.info(
+        f"{len(pairs)} log(s) : {len(sims)} trades CLOSED repris, "
+        f"{sum(len(v) for v in jobs.values())} signaux à simuler sur {len(jobs)} sous-jacents."
+    )
+
+    # Préchargement groupé de l'historique des seuls sous-jacents à simuler
+    with metrics.stage("fetch"):
+        for universe in ("sp500", "crypto"):
+            tickers = sorted({t for (u, t) in jobs if u == universe})
+            if tickers:
+                market_data.prefetch(universe, tickers)
+
+    # 2. Simulation vectorisée : un passage par sous-jacent pour tous ses signaux
+    with metrics.stage("simulate"):
+        sims.update(simulate_jobs(jobs, workers))
+
+    # 3. Par log : mise à jour des signaux dans l'ordre du log, agrégats, sauvegarde
+    summaries = []
+    for log_idx, ((log_path, out_path), log, (signals, known)) in enumerate(zip(pairs, logs, loaded)):
+        if not signals and known is None:
+            logger.info(f"Aucun signal dans {log_path}. Rien à faire.")
+            summary = empty_summary(equity_format)
+            save_perf_summary(summary, out_path)
+            summaries.append(summary)
+            continue
 
-    summary["equity_curve"] = {
-        "global": build_equity_curve(global_equity_trades),
-        "sp500_phoenix": build_equity_curve(groups["sp500_phoenix"]["equity_trades"]),
-        "sp500_pullback": build_equity_curve(groups["sp500_pullback"]["equity_trades"]),
-        "crypto_phoenix": build_equity_curve(groups["crypto_phoenix"]["equity_trades"]),
-        "crypto_pullback": build_equity_curve(groups["crypto_pullback"]["equity_trades"]),
-    }
+        with metrics.stage("aggregate"):
+            log_sims = {pos: sim for (idx, pos), sim in sims.items() if idx == log_idx}
+            updated_signals, results = apply_results(signals, log_sims)
+            if known is not None:
+                metrics.incr("perf.closed_from_table", len(known))
+                results = trade_results.merge([known, results])
+            summary = build_summary(results, equity_format, equity_points)
+
+            # Stats par mois et sur les derniers trades : seuls les trades absents de la table
+            # du run précédent sont ajoutés à l'état persisté
+            results_path = trade_results.results_path(out_path)
+            summary["breakdowns"] = breakdowns.update(
+                results,
+                previous[log_idx],
+                breakdowns.state_path(out_path),
+                STRATEGY_KEYS,
+                incremental=incremental,
+            )
 
-    save_perf_summary(summary)
-    logger.info("Performance summary updated.")
-    logger.info(json.dumps(summary, indent=2))
+        # Sauvegarde de la table des trades, du log enrichi et du résumé. La table d'abord :
+        # une partition ne passe close (et n'est plus relue) qu'une fois ses trades dans la table.
+        with metrics.stage("save"):
+            trade_results.save(results, results_path)
+            log.save(updated_signals)
+            save_perf_summary(summary, out_path)
+        logger.info(f"Performance summary updated: {out_path}")
+        logger.info(json.dumps(summary, indent=2))
+        summaries.append(summary)
+
+    return summaries
+
+
+def parse_pair(value: str) -> Tuple[str, str]:
+    log_path, sep, out_path = value.partition(":")
+    if not sep or not log_path or not out_path:
+        raise argparse.ArgumentTypeError(f"paire attendue LOG:OUT, reçu '{value}'")
+    return log_path, out_path
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Simulation des signaux loggés et résumés de performance.")
+    parser.add_argument(
+        "--pair", action="append", type=parse_pair, metavar="LOG:OUT",
+        help=f"log de signaux et résumé à produire (répétable ; défaut {LOG_PATH}:{OUT_PATH})",
+    )
+    parser.add_argument(
+        "--backtest", action="store_true",
+        help=f"ajoute la paire {BACKTEST_LOG_PATH}:{BACKTEST_OUT_PATH}",
+    )
+    parser.add_argument("--full", action="store_true", help="re-simule aussi les trades CLOSED")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="process de simulation")
+    parser.add_argument(
+        "--equity-format", choices=EQUITY_FORMATS, default=EQUITY_FORMAT,
+        help=f"format des equity curves (défaut {EQUITY_FORMAT})",
+    )
+    parser.add_argument(
+        "--equity-points", type=int, default=EQUITY_MAX_POINTS,
+        help=f"points max du format compact, 0 = tous (défaut {EQUITY_MAX_POINTS})",
+    )
+    args = parser.parse_args(argv)
+
+    pairs = list(args.pair or ([] if args.backtest else DEFAULT_PAIRS))
+    if args.backtest:
+        pairs.append((BACKTEST_LOG_PATH, BACKTEST_OUT_PATH))
+
+    run(
+        pairs,
+        incremental=not args.full,
+        workers=args.workers,
+        equity_format=args.equity_format,
+        equity_points=args.equity_points,
+    )
+    metrics.save("perf_summary")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,482 @@
+# bots/signals_store.py
+
+import json
+import os
+import sys
+import logging
+from typing import Dict, List, Optional
+
+# Log des signaux en JSON Lines : une ligne = l'état complet d'un signal.
+# Un nouveau signal ou un changement de statut = une ligne ajoutée en fin de fichier ;
+# à la lecture, la dernière ligne d'un id l'emporte.
+#
+# data/signals_log.jsonl        -> log append-only
+# data/signals_log.index.json   -> {id: [trade_status, offset de la dernière ligne]}
+#
+# Un chemin en .json garde l'ancien format (liste JSON réécrite en entier),
+# utilisé par le log de backtest.
+#
+# Un chemin sans extension (log de production) désigne un log partitionné par univers
+# et par mois de signal : un log JSONL (et son index) par partition, plus un manifest.
+#
+# data/signals_log/manifest.json                 -> {partition: {signals, open, lines, size}}
+# data/signals_log/<universe>/<YYYY-MM>.jsonl    -> log append-only de la partition
+#
+# Les lecteurs ne chargent que les partitions utiles (trades ouverts, période, univers) ;
+# les écrivains ne touchent que les partitions modifiées (diff git du run limité au mois courant).
+
+# Compaction automatique quand le fichier contient plus de COMPACT_RATIO lignes par signal
+COMPACT_RATIO = 2.0
+
+MANIFEST = "manifest.json"
+
+logger = logging.getLogger("signals_store")
+
+
+def sort_key(entry: Dict):
+    return (
+        entry.get("date_signal", ""),
+        entry.get("universe", ""),
+        entry.get("strategy", ""),
+        entry.get("ticker", ""),
+    )
+
+
+def _dump_line(entry: Dict) -> str:
+    return json.dumps(entry, separators=(",", ":"), ensure_ascii=False) + "\n"
+
+
+def _canonical(entry: Dict) -> str:
+    return json.dumps(entry, sort_keys=True)
+
+
+def partition_key(entry: Dict) -> str:
+    """Partition d'un signal : "<universe>/<YYYY-MM>" (mois de date_signal)."""
+    universe = entry.get("universe") or "other"
+    month = (entry.get("date_signal") or "")[:7] or "undated"
+    return f"{universe}/{month}"
+
+
+def _replace_atomic(path: str, write):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class SignalLog:
+    """
+    Accès au log des signaux, même schéma qu'avant (liste de dicts triée par
+    date / univers / stratégie / ticker). load() mémorise l'état lu : save() n'ajoute
+    ensuite que les signaux nouveaux ou modifiés.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.jsonl = path.endswith(".jsonl")
+        self.index_path = f"{os.path.splitext(path)[0]}.index.json"
+        self._seen: Dict[str, str] = {}
+
+    # --- index ---
+
+    def _read_index(self) -> Optional[Dict]:
+        if not os.path.exists(self.index_path):
+            return None
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except Exception:
+            return None
+        # index périmé si le log a bougé depuis son écriture (run interrompu, édition manuelle)
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if not isinstance(index, dict) or index.get("size") != size:
+            return None
+        return index
+
+    def _write_index(self, index: Dict):
+        _replace_atomic(self.index_path, lambda f: json.dump(index, f, separators=(",", ":")))
+
+    def _scan(self) -> Dict:
+        """Relit tout le log pour reconstruire l'index."""
+        ids: Dict[str, List] = {}
+        lines = 0
+        offset = 0
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                for raw in f:
+                    line_offset = offset
+                    offset += len(raw)
+                    if not raw.strip():
+                        continue
+                    try:
+                        entry = json.loads(raw)
+                    except Exception:
+                        logger.warning(f"Ligne illisible ignorée dans {self.path} (offset {line_offset})")
+                        continue
+                    lines += 1
+                    if entry.get("id") is not None:
+                        ids[entry["id"]] = [entry.get("trade_status"), line_offset]
+        return {"size": offset, "lines": lines, "ids": ids}
+
+    def index(self) -> Dict:
+        """Index {id: [trade_status, offset]} à jour (reconstruit si besoin)."""
+        index = self._read_index()
+        if index is None:
+            index = self._scan()
+            self._write_index(index)
+        return index
+
+    def ids(self) -> set:
+        if not self.jsonl:
+            return {e.get("id") for e in self.load() if "id" in e}
+        self._migrate_legacy()
+        return set(self.index()["ids"])
+
+    def statuses(self) -> Dict[str, Optional[str]]:
+        """trade_status par id, sans lire le log."""
+        if not self.jsonl:
+            return {e.get("id"): e.get("trade_status") for e in self.load() if "id" in e}
+        self._migrate_legacy()
+        return {_id: status for _id, (status, _) in self.index()["ids"].items()}
+
+    # --- lecture ---
+
+    def _migrate_legacy(self):
+        """Premier passage en JSONL : reprend l'ancien signals_log.json s'il existe."""
+        legacy = f"{os.path.splitext(self.path)[0]}.json"
+        if os.path.exists(self.path) or not os.path.exists(legacy):
+            return
+        try:
+            with open(legacy, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Ancien log {legacy} illisible: {e}")
+            return
+        if isinstance(data, list):
+            logger.info(f"Migration de {legacy} vers {self.path} ({len(data)} signaux).")
+            self._rewrite(data)
+
+    def load(self) -> List[Dict]:
+        if not self.jsonl:
+            if not os.path.exists(self.path):
+                return []
+            try:
+                with open(self.path, "r") as f:
+                    data = json.load(f)
+            except Exception:
+                return []
+            if not isinstance(data, list):
+                return []
+            self._seen = {e["id"]: _canonical(e) for e in data if e.get("id") is not None}
+            return data
+
+        self._migrate_legacy()
+        if not os.path.exists(self.path):
+            return []
+
+        latest: Dict[str, Dict] = {}
+        anonymous: List[Dict] = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except Exception:
+                    continue
+                if entry.get("id") is None:
+                    anonymous.append(entry)
+                else:
+                    latest[entry["id"]] = entry
+
+        self._seen = {_id: _canonical(e) for _id, e in latest.items()}
+        return sorted(list(latest.values()) + anonymous, key=sort_key)
+
+    # --- écriture ---
+
+    def append(self, entries: List[Dict]):
+        """Ajoute (ou remplace, à id égal) des signaux : une ligne par signal."""
+        if not entries:
+            return
+        if not self.jsonl:
+            merged = {e.get("id"): e for e in self.load()}
+            merged.update({e.get("id"): e for e in entries})
+            self._rewrite(list(merged.values()))
+            return
+
+        self._migrate_legacy()
+        index = self.index()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            for entry in entries:
+                raw = _dump_line(entry).encode("utf-8")
+                f.write(raw)
+                if entry.get("id") is not None:
+                    index["ids"][entry["id"]] = [entry.get("trade_status"), offset]
+                    self._seen[entry["id"]] = _canonical(entry)
+                offset += len(raw)
+        index["size"] = offset
+        index["lines"] = index.get("lines", 0) + len(entries)
+        self._write_index(index)
+
+        if index["lines"] > COMPACT_RATIO * max(len(index["ids"]), 1):
+            self.compact()
+
+    def changed(self, entries: List[Dict]) -> List[Dict]:
+        """Signaux nouveaux ou modifiés depuis load()."""
+        return [
+            e for e in entries
+            if e.get("id") is None or self._seen.get(e["id"]) != _canonical(e)
+        ]
+
+    def save(self, entries: List[Dict]):
+        """
+        Enregistre l'état complet du log : en JSONL, seuls les signaux nouveaux ou
+        modifiés depuis load() sont ajoutés ; en JSON, le fichier est réécrit.
+        """
+        if not self.jsonl:
+            self._rewrite(entries)
+            return
+        changed = self.changed(entries)
+        self.append(changed)
+        logger.info(f"{self.path}: {len(changed)} signaux ajoutés ou mis à jour.")
+
+    def _rewrite(self, entries: List[Dict]):
+        if not self.jsonl:
+            _replace_atomic(self.path, lambda f: json.dump(entries, f, indent=2))
+            self._seen = {e["id"]: _canonical(e) for e in entries if e.get("id") is not None}
+            return
+
+        latest: Dict[str, Dict] = {}
+        anonymous = []
+        for e in entries:
+            if e.get("id") is None:
+                anonymous.append(e)
+            else:
+                latest[e["id"]] = e
+        ordered = sorted(list(latest.values()) + anonymous, key=sort_key)
+
+        _replace_atomic(self.path, lambda f: f.writelines(_dump_line(e) for e in ordered))
+        self._seen = {_id: _canonical(e) for _id, e in latest.items()}
+        self._write_index(self._scan())
+
+    def compact(self):
+        """Réécrit le log avec une seule ligne (la dernière) par signal."""
+        if not self.jsonl:
+            return
+        entries = self.load()
+        before = self.index().get("lines", 0)
+        self._rewrite(entries)
+        logger.info(f"Compaction {self.path}: {before} -> {len(entries)} lignes.")
+
+
+class PartitionedSignalLog:
+    """
+    Log des signaux découpé par univers et par mois (un SignalLog JSONL par partition).
+    Même interface que SignalLog ; load() / ids() / statuses() acceptent en plus des
+    filtres (univers, période, trades ouverts) qui ne lisent que les partitions concernées.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST)
+        self._logs: Dict[str, SignalLog] = {}
+
+    def _log(self, key: str) -> SignalLog:
+        if key not in self._logs:
+            self._logs[key] = SignalLog(os.path.join(self.root, f"{key}.jsonl"))
+        return self._logs[key]
+
+    # --- manifest ---
+
+    def _keys_on_disk(self) -> List[str]:
+        keys = []
+        if not os.path.isdir(self.root):
+            return keys
+        for universe in sorted(os.listdir(self.root)):
+            folder = os.path.join(self.root, universe)
+            if not os.path.isdir(folder):
+                continue
+            keys += [f"{universe}/{name[:-6]}" for name in sorted(os.listdir(folder)) if name.endswith(".jsonl")]
+        return keys
+
+    def _describe(self, key: str) -> Dict:
+        index = self._log(key).index()
+        statuses = [status for status, _ in index["ids"].values()]
+        return {
+            "signals": len(statuses),
+            "open": sum(1 for s in statuses if s != "CLOSED"),
+            "lines": index.get("lines", 0),
+            "size": index["size"],
+        }
+
+    def _write_manifest(self, partitions: Dict[str, Dict]):
+        data = {"partition_by": "universe/month", "partitions": dict(sorted(partitions.items()))}
+        _replace_atomic(self.manifest_path, lambda f: json.dump(data, f, indent=2))
+
+    def manifest(self) -> Dict[str, Dict]:
+        """
+        {partition: {signals, open, lines, size}}. Une partition dont la taille ne correspond
+        plus au manifest (run interrompu, édition manuelle) est re-décrite depuis son index.
+        """
+        self._migrate_legacy()
+        stored: Dict[str, Dict] = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    stored = json.load(f).get("partitions") or {}
+            except Exception:
+                stored = {}
+
+        partitions = {}
+        for key in self._keys_on_disk():
+            info = stored.get(key)
+            if info is None or info.get("size") != os.path.getsize(os.path.join(self.root, f"{key}.jsonl")):
+                info = self._describe(key)
+            partitions[key] = info
+        if partitions != stored:
+            self._write_manifest(partitions)
+        return partitions
+
+    def partitions(
+        self,
+        universes: Optional[List[str]] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        open_only: bool = False,
+    ) -> List[str]:
+        """Partitions pouvant contenir des signaux de `universes` datés entre `start` et `end` (YYYY-MM-DD)."""
+        selected = []
+        for key, info in self.manifest().items():
+            universe, month = key.split("/", 1)
+            if universes is not None and universe not in universes:
+                continue
+            if (start or end) and month == "undated":
+                continue
+            if (start and month < start[:7]) or (end and month > end[:7]):
+                continue
+            if open_only and not info.get("open"):
+                continue
+            selected.append(key)
+        return selected
+
+    def _migrate_legacy(self):
+        """Premier passage en partitions : découpe l'ancien log unique (.jsonl ou .json) s'il existe."""
+        if os.path.exists(self.manifest_path) or self._keys_on_disk():
+            return
+        for legacy in (f"{self.root}.jsonl", f"{self.root}.json"):
+            if os.path.exists(legacy):
+                entries = SignalLog(legacy).load()
+                logger.info(f"Migration de {legacy} vers {self.root}/ ({len(entries)} signaux).")
+                for key, group in self._group(entries).items():
+                    self._log(key)._rewrite(group)
+                return
+
+    # --- lecture ---
+
+    def load(
+        self,
+        universes: Optional[List[str]] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        open_only: bool = False,
+        keys: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        """
+        Signaux des partitions sélectionnées (tous par défaut, ou les partitions `keys`),
+        filtrés et triés comme SignalLog.load().
+        """
+        entries = []
+        for key in self.partitions(universes, start, end, open_only) if keys is None else keys:
+            entries += self._log(key).load()
+        if start:
+            entries = [e for e in entries if e.get("date_signal", "") >= start]
+        if end:
+            entries = [e for e in entries if e.get("date_signal", "") <= end]
+        if open_only:
+            entries = [e for e in entries if e.get("trade_status") != "CLOSED"]
+        return sorted(entries, key=sort_key)
+
+    def ids(
+        self,
+        universes: Optional[List[str]] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        keys: Optional[List[str]] = None,
+    ) -> set:
+        """ids des partitions sélectionnées (ou des partitions `keys`), lus depuis leurs index."""
+        ids = set()
+        for key in self.partitions(universes, start, end) if keys is None else keys:
+            ids |= self._log(key).ids()
+        return ids
+
+    def statuses(
+        self, universes: Optional[List[str]] = None, start: Optional[str] = None, end: Optional[str] = None
+    ) -> Dict[str, Optional[str]]:
+        statuses: Dict[str, Optional[str]] = {}
+        for key in self.partitions(universes, start, end):
+            statuses.update(self._log(key).statuses())
+        return statuses
+
+    # --- écriture ---
+
+    def _group(self, entries: List[Dict]) -> Dict[str, List[Dict]]:
+        groups: Dict[str, List[Dict]] = {}
+        for entry in entries:
+            groups.setdefault(partition_key(entry), []).append(entry)
+        return groups
+
+    def append(self, entries: List[Dict]):
+        """Ajoute des signaux, chacun dans sa partition ; seules ces partitions sont écrites."""
+        if not entries:
+            return
+        partitions = self.manifest()
+        for key, group in self._group(entries).items():
+            self._log(key).append(group)
+            partitions[key] = self._describe(key)
+        self._write_manifest(partitions)
+
+    def save(self, entries: List[Dict]):
+        """
+        Enregistre l'état des signaux fournis : par partition, seuls les signaux nouveaux
+        ou modifiés depuis load() sont ajoutés ; les partitions inchangées ne sont pas écrites.
+        """
+        partitions = self.manifest()
+        total = 0
+        for key, group in self._group(entries).items():
+            log = self._log(key)
+            if key in partitions and not log._seen:
+                log.load()      # partition non chargée : état de référence pour le diff
+            changed = log.changed(group)
+            if not changed:
+                continue
+            log.append(changed)
+            partitions[key] = self._describe(key)
+            total += len(changed)
+            logger.info(f"{log.path}: {len(changed)} signaux ajoutés ou mis à jour.")
+        if total:
+            self._write_manifest(partitions)
+
+    def compact(self):
+        """Compacte chaque partition (une seule ligne par signal)."""
+        for key in self.manifest():
+            self._log(key).compact()
+        self._write_manifest({key: self._describe(key) for key in self._keys_on_disk()})
+
+
+def open_log(path: str):
+    """SignalLog pour un fichier (.jsonl, .json), PartitionedSignalLog pour un chemin sans extension."""
+    if os.path.splitext(path)[1]:
+        return SignalLog(path)
+    return PartitionedSignalLog(path)
+
+
+if __name__ == "__main__":
+    # python bots/signals_store.py compact [data/signals_log]
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    if len(sys.argv) < 2 or sys.argv[1] != "compact":
+        print("Usage: python bots/signals_store.py compact [chemin du log : dossier partitionné ou .jsonl]")
+        sys.exit(1)
+    open_log(sys.argv[2] if len(sys.argv) > 2 else "data/signals_log").compact()
@@ -0,0 +1,98 @@
+# bots/trade_results.py
+
+import os
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Table des trades CLOSED en colonnes : un tableau structuré NumPy (.npy, lu en memory-map)
+# par résumé de performance, réécrit par perf_summary à chaque run.
+# data/cache/results/<résumé>.npy   (ex. performance_summary.npy, performance_backtest.npy)
+#
+#   table = trade_results.load(trade_results.results_path("data/performance_summary.json"))
+#   trade_results.to_frame(table).groupby("strategy")["R"].mean()
+#
+# Dates en jours (datetime64[D], NaT si absente) ; prix, R et perf_pct en float (NaN si absents).
+# date_signal reste une chaîne : avec universe / strategy / ticker, elle redonne l'ordre du log.
+RESULTS_DIR = os.path.join("data", "cache", "results")
+
+FIELDS = [
+    "id",
+    "universe",
+    "strategy",
+    "ticker",
+    "date_signal",
+    "entry_date",
+    "entry_price",
+    "exit_date",
+    "exit_price",
+    "R",
+    "perf_pct",
+    "exit_reason",
+]
+DATE_FIELDS = {"entry_date", "exit_date"}
+FLOAT_FIELDS = {"entry_price", "exit_price", "R", "perf_pct"}
+
+logger = logging.getLogger("trade_results")
+
+
+def results_path(out_path: str, root: str = RESULTS_DIR) -> str:
+    """Table associée à un résumé : même nom de fichier, extension .npy."""
+    name = os.path.splitext(os.path.basename(out_path))[0]
+    return os.path.join(root, f"{name}.npy")
+
+
+def build(rows: List[Dict]) -> np.ndarray:
+    """Trades {champ: valeur} -> tableau structuré (chaînes à largeur fixe ajustée au contenu)."""
+    columns = []
+    for field in FIELDS:
+        values = [row.get(field) for row in rows]
+        if field in DATE_FIELDS:
+            columns.append(np.array([v or "NaT" for v in values], dtype="datetime64[D]"))
+        elif field in FLOAT_FIELDS:
+            columns.append(np.array([np.nan if v is None else v for v in values], dtype="<f8"))
+        else:
+            columns.append(np.array(["" if v is None else str(v) for v in values], dtype=str))
+
+    table = np.empty(len(rows), dtype=[(field, col.dtype) for field, col in zip(FIELDS, columns)])
+    for field, col in zip(FIELDS, columns):
+        table[field] = col
+    return table
+
+
+def merge(tables: List[np.ndarray]) -> np.ndarray:
+    """
+    Concatène des tables (chaînes élargies au plus long) dans l'ordre du log des signaux :
+    tri stable sur (date_signal, universe, strategy, ticker).
+    """
+    dtype = [
+        (field, np.result_type(*[table.dtype[field] for table in tables]))
+        for field in tables[0].dtype.names
+    ]
+    table = np.concatenate([np.asarray(t).astype(dtype) for t in tables])
+    order = np.lexsort((table["ticker"], table["strategy"], table["universe"], table["date_signal"]))
+    return table[order]
+
+
+def to_frame(table: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame({field: table[field] for field in table.dtype.names})
+
+
+def save(table: np.ndarray, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, table)
+    os.replace(tmp, path)
+
+
+def load(path: str) -> Optional[np.ndarray]:
+    if not os.path.exists(path):
+        return None
+    try:
+        return np.load(path, mmap_mode="r")
+    except Exception as e:
+        logger.warning(f"Table de trades illisible {path}: {e}")
+        return None
@@ -0,0 +1,175 @@
+# bots/trade_stats.py
+
+from typing import Dict, List
+
+import numpy as np
+
+# Statistiques par stratégie sur la table des trades CLOSED (trade_results), en NumPy :
+# - comptes et sommes (trades, gains, pertes, BE, R) : une passe groupée (np.bincount)
+# - métriques de trajectoire (drawdown, séries, expectancy glissante) : trades triés
+#   par (stratégie, date de sortie), calculs vectorisés sur la tranche de chaque stratégie
+# Reste en O(n log n) (tri) pour des centaines de milliers de trades.
+
+# Fenêtre de l'expectancy glissante (derniers trades clôturés de la stratégie)
+ROLLING_WINDOW = 50
+
+# Sommes d'un groupe de trades : suffisent aux stats de base (base_stats) et s'additionnent
+# d'un groupe à l'autre (cumul incrémental, voir breakdowns)
+TOTALS = ["nb_trades", "nb_be", "nb_win", "nb_loss", "sum_R", "win_R", "loss_R"]
+
+# exit_reason des sorties au breakeven (ni gain ni perte)
+BE_LABEL = "BE"
+
+
+def empty_stats() -> Dict:
+    return {
+        "nb_trades": 0,
+        "avg_R": 0.0,
+        "winrate": 0.0,
+        "breakeven_rate": 0.0,
+        "expectancy_R": 0.0,
+        "avg_win_R": 0.0,
+        "avg_loss_R": 0.0,
+        "profit_factor": 0.0,
+        "max_drawdown_R": 0.0,
+        "max_win_streak": 0,
+        "max_loss_streak": 0,
+        "rolling_expectancy_R": 0.0,
+    }
+
+
+BASE_FIELDS = ["nb_trades", "avg_R", "winrate", "breakeven_rate", "expectancy_R", "avg_win_R", "avg_loss_R", "profit_factor"]
+
+
+def outcomes(R: np.ndarray, be: np.ndarray):
+    """Masques (gain, perte) : une sortie au breakeven n'est ni l'un ni l'autre."""
+    return (R > 0) & ~be, (R < 0) & ~be
+
+
+def group_totals(group: np.ndarray, size: int, R: np.ndarray, be: np.ndarray) -> Dict[str, np.ndarray]:
+    """TOTALS de chacun des `size` groupes, en une passe par somme (np.bincount)."""
+    win, loss = outcomes(R, be)
+    return {
+        "nb_trades": np.bincount(group, minlength=size).astype(float),
+        "nb_be": np.bincount(group, weights=be, minlength=size),
+        "nb_win": np.bincount(group, weights=win, minlength=size),
+        "nb_loss": np.bincount(group, weights=loss, minlength=size),
+        "sum_R": np.bincount(group, weights=R, minlength=size),
+        "win_R": np.bincount(group, weights=np.where(win, R, 0.0), minlength=size),
+        "loss_R": -np.bincount(group, weights=np.where(loss, R, 0.0), minlength=size),
+    }
+
+
+def base_stats(totals: Dict[str, float]) -> Dict:
+    """Stats d'un groupe de trades depuis ses TOTALS."""
+    count = int(totals["nb_trades"])
+    if count == 0:
+        return {field: value for field, value in empty_stats().items() if field in BASE_FIELDS}
+    wins, losses = int(totals["nb_win"]), int(totals["nb_loss"])
+
+    winrate = wins / count * 100.0
+    lossrate = losses / count * 100.0
+    avg_win_R = totals["win_R"] / wins if wins else 0.0
+    avg_loss_R_abs = totals["loss_R"] / losses if losses else 0.0
+    expectancy_R = (winrate / 100.0) * avg_win_R - (lossrate / 100.0) * avg_loss_R_abs
+
+    return {
+        "nb_trades": count,
+        "avg_R": round(float(totals["sum_R"] / count), 3),
+        "winrate": round(winrate, 1),
+        "breakeven_rate": round(float(totals["nb_be"] / count * 100.0), 1),
+        "expectancy_R": round(float(expectancy_R), 3),
+        "avg_win_R": round(float(avg_win_R), 3),
+        "avg_loss_R": round(float(avg_loss_R_abs), 3),
+        # somme des gains / somme des pertes ; None s'il n'y a aucune perte
+        "profit_factor": round(float(totals["win_R"] / totals["loss_R"]), 3) if losses else None,
+    }
+
+
+def longest_run(mask: np.ndarray) -> int:
+    """Plus longue suite de True consécutifs."""
+    if not mask.any():
+        return 0
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    return int((edges[1::2] - edges[::2]).max())
+
+
+def max_drawdown(R: np.ndarray) -> float:
+    """Plus forte baisse (en R) de la somme cumulée des R, depuis un plus haut (départ à 0)."""
+    equity = np.concatenate(([0.0], np.cumsum(R)))
+    return float((np.maximum.accumulate(equity) - equity).max())
+
+
+def rolling_expectancy(R: np.ndarray, be: np.ndarray, window: int = ROLLING_WINDOW) -> np.ndarray:
+    """
+    Expectancy des `window` derniers trades à chaque trade (moins au début de l'historique) :
+    winrate * gain moyen - lossrate * perte moyenne = somme des R hors BE / nombre de trades.
+    """
+    net = np.concatenate(([0.0], np.cumsum(np.where(be, 0.0, R))))
+    end = np.arange(1, len(R) + 1)
+    start = np.maximum(end - window, 0)
+    return (net[end] - net[start]) / (end - start)
+
+
+def group_stats(
+    group: np.ndarray,
+    names: List[str],
+    R: np.ndarray,
+    be: np.ndarray,
+    order: np.ndarray,
+    labels: List[str],
+    window: int = ROLLING_WINDOW,
+) -> Dict[str, Dict]:
+    """
+    Stats de chaque clé de `labels`. Un trade par ligne : `group` est l'indice de sa clé
+    dans `names`, `order` la clé de tri chronologique (date de sortie).
+    Les trades sans R fini sont exclus de tous les comptes (nb_trades, dénominateur du winrate,
+    séries). L'ancienne agrégation n'écartait que les R None : un R NaN y restait compté dans
+    nb_trades et le winrate, et rendait avg_R NaN. Dans la table, None et NaN sont confondus.
+    """
+    stats = {label: empty_stats() for label in labels}
+
+    valid = np.isfinite(R)
+    group, R, be, order = group[valid], R[valid], be[valid], order[valid]
+    if len(R) == 0:
+        return stats
+
+    totals = group_totals(group, len(names), R, be)
+    win, loss = outcomes(R, be)
+
+    # Trades regroupés par clé, dans l'ordre chronologique au sein de chaque clé
+    chrono = np.lexsort((order, group))
+    bounds = np.concatenate(([0], np.cumsum(totals["nb_trades"]).astype(int)))
+
+    for g, name in enumerate(names):
+        if name not in stats or totals["nb_trades"][g] == 0:
+            continue
+        rows = chrono[bounds[g]:bounds[g + 1]]
+        path_R, path_be = R[rows], be[rows]
+
+        stats[name] = {
+            **base_stats({field: values[g] for field, values in totals.items()}),
+            "max_drawdown_R": round(max_drawdown(path_R), 3),
+            "max_win_streak": longest_run(win[rows]),
+            "max_loss_streak": longest_run(loss[rows]),
+            "rolling_expectancy_R": round(float(rolling_expectancy(path_R, path_be, window)[-1]), 3),
+        }
+    return stats
+
+
+def strategy_stats(
+    results: np.ndarray,
+    labels: List[str],
+    window: int = ROLLING_WINDOW,
+) -> Dict[str, Dict]:
+    """Stats par clé "<universe>_<strategy>" de `labels` sur une table trade_results."""
+    # Clé encodée en entiers (univers x stratégie) : pas de concaténation de chaînes par trade
+    universes, u = np.unique(results["universe"], return_inverse=True)
+    strategies, s = np.unique(results["strategy"], return_inverse=True)
+    group = u.ravel() * len(strategies) + s.ravel()
+    names = [f"{universe}_{strategy}" for universe in universes for strategy in strategies]
+
+    be = results["exit_reason"] == BE_LABEL
+    # NaT (sortie inconnue) trié en tête : int64 minimal
+    order = results["exit_date"].astype("datetime64[D]").astype(np.int64)
+    return group_stats(group, names, np.asarray(results["R"], dtype=float), be, order, labels, window)
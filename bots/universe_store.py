@@ -0,0 +1,127 @@
+# bots/universe_store.py
+
+import os
+import json
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Union
+
+import pandas as pd
+
+import fixtures
+import metrics
+
+# Dernier univers connu par source, dans le même dossier que le store OHLCV
+# (restauré par le cache du workflow) :
+# data/cache/universe/<name>.json          -> {"fetched_at": epoch, "members": [...] ou {...}}
+# data/cache/universe/<name>.changes.jsonl -> une ligne {date, added, removed} par changement
+STORE_DIR = os.path.join("data", "cache", "universe")
+
+logger = logging.getLogger("universe_store")
+
+# Membres d'un univers : liste de tickers ou {ticker: nom}
+Members = Union[List[str], Dict[str, str]]
+
+
+def _keys(members: Members) -> List[str]:
+    return list(members.keys()) if isinstance(members, dict) else list(members)
+
+
+class UniverseStore:
+    """
+    Snapshot persistant de la composition d'un univers, avec durée de validité :
+    la source (Wikipédia, CoinGecko) n'est interrogée qu'à expiration, et une source
+    en panne est remplacée par le dernier snapshot valide.
+    """
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.json")
+
+    def changes_path(self, name: str) -> str:
+        return os.path.join(self.root, f"{name}.changes.jsonl")
+
+    def load(self, name: str) -> Optional[Dict]:
+        """{"fetched_at", "members"} du dernier snapshot, None si absent ou illisible."""
+        path = self.path(name)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except Exception as e:
+            logger.warning(f"Snapshot illisible {path}: {e}")
+            return None
+        if not snapshot.get("members"):
+            return None
+        return snapshot
+
+    def save(self, name: str, members: Members) -> Dict[str, List[str]]:
+        """
+        Remplace le snapshot et journalise les entrées / sorties par rapport au précédent.
+        Renvoie {"added": [...], "removed": [...]}.
+        """
+        previous = self.load(name)
+        old = set(_keys(previous["members"])) if previous else set()
+        new = _keys(members)
+        diff = {
+            "added": [t for t in new if t not in old] if previous else [],
+            "removed": sorted(old - set(new)),
+        }
+
+        os.makedirs(self.root, exist_ok=True)
+        if diff["added"] or diff["removed"]:
+            with open(self.changes_path(name), "a", encoding="utf-8") as f:
+                line = {"date": pd.Timestamp.utcnow().strftime("%Y-%m-%d"), **diff}
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+        path = self.path(name)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"fetched_at": time.time(), "members": members}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        return diff
+
+    def resolve(self, name: str, fetch: Callable[[], Members], ttl: float, fallback: Members) -> Members:
+        """
+        Composition de l'univers `name` :
+        - snapshot de moins de `ttl` secondes : servi tel quel, sans appel à la source ;
+        - sinon fetch(), snapshot mis à jour (et changements journalisés) ;
+        - source en échec : dernier snapshot, quel que soit son âge, puis `fallback`.
+        En mode fixtures, le snapshot est ignoré : la source est toujours (re)jouée.
+        """
+        snapshot = None if fixtures.active() else self.load(name)
+        if snapshot is not None and time.time() - snapshot["fetched_at"] < ttl:
+            metrics.incr(f"universe.{name}.snapshot_hits")
+            return snapshot["members"]
+
+        try:
+            members = fetch()
+            if not members:
+                raise ValueError("univers vide")
+        except Exception as e:
+            if snapshot is not None:
+                age = pd.Timedelta(seconds=int(time.time() - snapshot["fetched_at"]))
+                logger.warning(f"⚠️ Échec source {name}: {e}. Dernier snapshot ({age}).")
+                metrics.incr(f"universe.{name}.stale_snapshots")
+                return snapshot["members"]
+            logger.warning(f"⚠️ Échec source {name}: {e}. Fallback.")
+            metrics.incr(f"universe.{name}.fallbacks")
+            return fallback
+
+        metrics.incr(f"universe.{name}.refreshes")
+        if not fixtures.active():
+            diff = self.save(name, members)
+            if diff["added"] or diff["removed"]:
+                logger.info(f"Univers {name} : +{len(diff['added'])} / -{len(diff['removed'])}.")
+        return members
+
+
+# Store partagé par les scanners
+_default = UniverseStore()
+
+
+def resolve(name: str, fetch: Callable[[], Members], ttl: float, fallback: Members) -> Members:
+    return _default.resolve(name, fetch, ttl, fallback)